@@ -1,32 +1,207 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+
+from .tracing import TraceContextFilter
+
+# Records waiting for the writer thread; when it falls behind, further
+# records are dropped instead of blocking the caller
+QUEUE_SIZE = 10_000
+
+# Attributes every LogRecord has; anything else was passed in `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+}
+
+# Writer threads by service name
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line. Fields passed with
+    `extra=` are included, so `logger.info("Task stored", extra={"task_id":
+    task.id})` can be queried without parsing the message.
+    """
+
+    def __init__(self, service_name: str):
+        super().__init__()
+        self.service_name = service_name
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(
+                record.created, tz=timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": self.service_name,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DebugRateLimiter(logging.Filter):
+    """
+    Lets through a `sample` share of DEBUG records, and at most `rate` per
+    second from each line of code, so that debug logging can be enabled
+    on a busy service. Other levels are not limited.
+    """
+
+    def __init__(self, rate: float = 10.0, sample: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.sample = sample
+        self.dropped = 0
+        # (path, line) -> (available tokens, time of the last update)
+        self._buckets: Dict[Tuple[str, int], Tuple[float, float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.sample < 1.0 and random.random() >= self.sample:
+            self.dropped += 1
+            return False
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.rate, now))
+        tokens = min(self.rate, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.dropped += 1
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without formatting them. Messages
+    are built from their arguments in that thread, so loggers should be
+    called with %-style arguments rather than f-strings.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Tracebacks refer to live frames, so they are rendered right away
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_levels(value: str) -> Dict[str, str]:
+    """Parses "name=LEVEL,name=LEVEL" into a mapping."""
+    levels = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _stop_listeners() -> None:
+    for listener in _listeners.values():
+        listener.stop()
+    _listeners.clear()
 
 
 def setup_service_logging(service_name: str):
-    """Configures the application's logger."""
+    """
+    Configures the application's logger.
+
+    Records are put on a bounded queue and written to stdout and to
+    `<service_name>.log` by a background thread, so logging never blocks
+    the event loop on I/O. Configured with environment variables:
+
+    - LOG_LEVEL: level of the service logger (INFO).
+    - LOG_LEVELS: levels of other loggers, e.g.
+      "task_processor.llm=DEBUG,sqlalchemy.engine=INFO". Loggers outside
+      the service are routed through the same pipeline.
+    - LOG_FORMAT: "json" (default) or "text".
+    - LOG_FILE: path of the log file, empty to disable it.
+    - LOG_DEBUG_RATE, LOG_DEBUG_SAMPLE: see DebugRateLimiter.
+    """
     # Create a logger
     logger = logging.getLogger(service_name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    if service_name in _listeners:
+        return logger
 
-    # Create handlers
-    # Console handler
-    c_handler = logging.StreamHandler(sys.stdout)
-    # File handler
-    f_handler = logging.FileHandler(f"{service_name}.log")
-
-    c_handler.setLevel(logging.INFO)
-    f_handler.setLevel(logging.INFO)
+    # Create handlers, run by the writer thread
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = os.environ.get("LOG_FILE", f"{service_name}.log")
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
 
     # Create formatters and add it to handlers
-    log_format = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    if os.environ.get("LOG_FORMAT", "json").lower() == "text":
+        log_format = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        )
+    else:
+        log_format = JsonFormatter(service_name)
+    for handler in handlers:
+        handler.setFormatter(log_format)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(QUEUE_SIZE))
+    # Records carry the trace id of the request they were logged in
+    queue_handler.addFilter(TraceContextFilter())
+    queue_handler.addFilter(
+        DebugRateLimiter(
+            rate=float(os.environ.get("LOG_DEBUG_RATE", "10")),
+            sample=float(os.environ.get("LOG_DEBUG_SAMPLE", "1")),
+        )
+    )
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, *handlers, respect_handler_level=True
     )
-    c_handler.setFormatter(log_format)
-    f_handler.setFormatter(log_format)
+    listener.start()
+    if not _listeners:
+        # Write out what is still queued when the process exits
+        atexit.register(_stop_listeners)
+    _listeners[service_name] = listener
 
     # Add handlers to the logger
-    if not logger.handlers:
-        logger.addHandler(c_handler)
-        logger.addHandler(f_handler)
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+    for name, level in _parse_levels(os.environ.get("LOG_LEVELS", "")).items():
+        other = logging.getLogger(name)
+        other.setLevel(level)
+        if name != service_name and not name.startswith(f"{service_name}."):
+            other.handlers = [queue_handler]
+            other.propagate = False
 
     return logger
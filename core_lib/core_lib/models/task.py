@@ -1,5 +1,6 @@
+import enum
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -7,6 +8,22 @@ from pydantic import BaseModel, Field
 MAX_TASK_LEVEL = 25
 
 
+class TaskStatus(str, enum.Enum):
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+# Tasks that are done with; after a while they are moved to the archive
+FINISHED_STATUSES = (TaskStatus.COMPLETED, TaskStatus.CANCELLED)
+# Tasks that still need work, the ones read on the hot paths
+ACTIVE_STATUSES = tuple(
+    status for status in TaskStatus if status not in FINISHED_STATUSES
+)
+
+
 class TaskBase(BaseModel):
     """Base Pydantic model with shared fields."""
 
@@ -17,6 +34,7 @@ class TaskBase(BaseModel):
     priority: float = Field(default=0.0, ge=0.0, le=1.0)
     tags: List[str] = []
     parent_id: Optional[int] = None
+    status: TaskStatus = TaskStatus.PENDING
 
     estimated_duration: Optional[timedelta] = None
     start_time_execution: Optional[datetime] = None
@@ -40,6 +58,7 @@ class TaskUpdate(BaseModel):
     tags: Optional[List[str]] = None
     # parent_id can also be updated
     parent_id: Optional[int] = None
+    status: Optional[TaskStatus] = None
 
     start_time_execution: Optional[datetime] = None
     estimated_duration: Optional[timedelta] = None
@@ -60,6 +79,62 @@ class Task(TaskBase):
         from_attributes = True
 
 
+class TaskChanges(BaseModel):
+    """
+    The tasks of a user created or updated since a cursor of the change
+    feed, the ids of those deleted or archived, and the cursor to pass next.
+    Tasks are in their latest state; a task changed several times since the
+    cursor is listed once.
+    """
+
+    tasks: List[Task]
+    deleted: List[int]
+    cursor: str
+    # True if more changes are waiting; call again with the new cursor
+    has_more: bool
+
+
+class DeletedTask(BaseModel):
+    """A task that was deleted or archived, and when."""
+
+    id: int
+    user_id: int
+    deleted_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class TaskProgress(BaseModel):
+    """
+    Progress and effort of a task tree: the task and all its descendants,
+    archived ones included.
+    """
+
+    id: int
+    title: str
+    status: TaskStatus
+    total_tasks: int
+    completed_tasks: int
+    # completed_tasks / total_tasks
+    completion: float
+    # Sum of the estimated durations set in the tree
+    estimated_duration: timedelta
+    # Latest deadline in the tree
+    deadline: Optional[datetime] = None
+
+
+class TaskDashboard(BaseModel):
+    """The progress of every task tree of a user, and of all of them."""
+
+    user_id: int
+    trees: List[TaskProgress]
+    total_tasks: int
+    completed_tasks: int
+    completion: float
+    estimated_duration: timedelta
+
+
 class TaskWithSubtasks(Task):
     """
     A recursive model to represent a task with its entire subtree of subtasks.
@@ -71,6 +146,78 @@ class TaskWithSubtasks(Task):
 TaskWithSubtasks.model_rebuild()
 
 
+class TaskNode(Task):
+    """
+    A task of a flattened tree. `depth` is relative to the root of the tree,
+    which is the first node; its `parent_id` links to the node above.
+    """
+
+    depth: int = Field(default=0, ge=0)
+
+
+class FlatTaskTree(BaseModel):
+    """
+    A task with its subtree as a list of nodes in depth-first order, i.e.
+    every node comes after its parent and before its next sibling. Unlike
+    TaskWithSubtasks it is validated and serialized without recursion.
+    """
+
+    nodes: List[TaskNode]
+
+
+def build_task_tree(nodes: List[TaskNode]) -> TaskWithSubtasks:
+    """
+    Rebuilds the nested tree of a FlatTaskTree in O(n). Nodes were validated
+    with the flat tree, so they are not validated again.
+    """
+    if not nodes:
+        raise ValueError("A task tree has at least its root")
+    by_id: Dict[int, TaskWithSubtasks] = {}
+    root = None
+    for node in nodes:
+        fields = {name: getattr(node, name) for name in Task.model_fields}
+        task = TaskWithSubtasks.model_construct(**fields, subtasks=[])
+        by_id[node.id] = task
+        if root is None:
+            root = task
+        else:
+            parent = by_id.get(node.parent_id)
+            if parent is None:
+                raise ValueError(f"Task {node.id} comes before its parent")
+            parent.subtasks.append(task)
+    return root
+
+
+def flatten_task_tree(tree: TaskWithSubtasks) -> List[TaskNode]:
+    """The nodes of a nested tree in depth-first order, without recursion."""
+    nodes = []
+    stack = [(tree, 0)]
+    while stack:
+        task, depth = stack.pop()
+        fields = {name: getattr(task, name) for name in Task.model_fields}
+        nodes.append(TaskNode.model_construct(**fields, depth=depth))
+        stack.extend((child, depth + 1) for child in reversed(task.subtasks))
+    return nodes
+
+
+class TaskTreeNode(TaskBase):
+    """
+    A task without DB-generated fields that carries its own subtree.
+    Used to insert a whole decomposition in a single call.
+    """
+
+    subtasks: List["TaskTreeNode"] = []
+
+
+TaskTreeNode.model_rebuild()
+
+
+class TaskTreeCreate(TaskTreeNode):
+    """Model used for creating a new task together with its subtree."""
+
+    user_id: int
+
+
 # Also update the request model for the processor
 class TaskProcessRequest(BaseModel):
     goal: str = Field(
@@ -28,6 +28,13 @@ class UserCreate(UserBase):
     )  # Password should be hashed before saving
 
 
+class UserLogin(BaseModel):
+    """Pydantic model for checking a user's credentials."""
+
+    login: str = Field(..., description="Username or email")
+    password: str
+
+
 class UserUpdate(BaseModel):
     """Pydantic model for updating user data. All fields are optional for partial updates."""
 
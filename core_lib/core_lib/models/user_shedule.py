@@ -1,8 +1,195 @@
-from pydantic import BaseModel
+from datetime import datetime, time, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel, Field, field_serializer, field_validator
+
+# The week is split into slots of SLOT_MINUTES, starting on Monday 00:00.
+SLOT_MINUTES = 15
+SLOT = timedelta(minutes=SLOT_MINUTES)
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+FULL_WEEK = (1 << SLOTS_PER_WEEK) - 1
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Returns `moment` as an aware UTC datetime; naive ones are UTC."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def slot_floor(moment: datetime) -> datetime:
+    """Rounds a moment down to the start of its slot."""
+    return moment.replace(
+        minute=moment.minute - moment.minute % SLOT_MINUTES,
+        second=0,
+        microsecond=0,
+    )
+
+
+def slot_ceil(moment: datetime) -> datetime:
+    """Rounds a moment up to the start of the next slot, unless aligned."""
+    floor = slot_floor(moment)
+    return floor if floor == moment else floor + SLOT
+
+
+def week_slot(moment: datetime) -> int:
+    """Index of the slot containing `moment` within its week."""
+    return (
+        moment.weekday() * SLOTS_PER_DAY
+        + (moment.hour * 60 + moment.minute) // SLOT_MINUTES
+    )
+
+
+def _range_mask(first: int, last: int) -> int:
+    """Mask with bits [first, last) set."""
+    return ((1 << (last - first)) - 1) << first
+
+
+class TimeSlot(BaseModel):
+    """A continuous free interval."""
+
+    start: datetime
+    end: datetime
+
+
+class SheduleException(BaseModel):
+    """Overrides the weekly availability between `start` and `end`."""
+
+    start: datetime
+    end: datetime
+    available: bool = False
+
+    @field_validator("start", "end")
+    @classmethod
+    def _to_utc(cls, value: datetime) -> datetime:
+        return as_utc(value)
 
 
 class UserShedule(BaseModel):
-    pass
+    """
+    Weekly availability of a user as a bitmap of 15-minute slots.
+
+    Bit i of `weekly` is set when the user is free during slot i of the
+    week, counting from Monday 00:00. `exceptions` override the weekly
+    pattern for concrete periods (a day off, a trip). The week is read in
+    UTC: naive datetimes are taken as UTC and aware ones are converted, so
+    naive and aware arguments can be mixed; results keep the timezone of
+    the arguments. Queries work on Python ints as bitsets, so a whole
+    planning horizon is handled with a few big-int operations instead of
+    lists of intervals.
+    """
+
+    weekly: int = Field(default=0, ge=0, le=FULL_WEEK)
+    exceptions: List[SheduleException] = []
+
+    @field_validator("weekly", mode="before")
+    @classmethod
+    def _parse_weekly(cls, value):
+        # Stored and sent as a hex string to stay compact and JSON-safe
+        if isinstance(value, str):
+            return int(value, 16)
+        return value
+
+    @field_serializer("weekly")
+    def _serialize_weekly(self, value: int) -> str:
+        return format(value, "x")
+
+    @classmethod
+    def from_weekly_ranges(
+        cls, ranges: Iterable[Tuple[int, time, time]]
+    ) -> "UserShedule":
+        """
+        Builds a schedule from (weekday, start, end) ranges, weekday 0 being
+        Monday. An end of 00:00 means midnight at the end of the day.
+        """
+        weekly = 0
+        for weekday, start, end in ranges:
+            first = (start.hour * 60 + start.minute) // SLOT_MINUTES
+            last = -(-(end.hour * 60 + end.minute) // SLOT_MINUTES)
+            if end == time(0):
+                last = SLOTS_PER_DAY
+            day = weekday * SLOTS_PER_DAY
+            weekly |= _range_mask(day + first, day + last)
+        return cls(weekly=weekly)
+
+    def availability_mask(self, start: datetime, end: datetime) -> int:
+        """
+        Returns the free slots between `start` and `end` as a bitset.
+        Bit i stands for the slot starting at slot_ceil(start) + i * SLOT;
+        only slots that fit entirely in the window are included.
+        """
+        start, end = as_utc(start), as_utc(end)
+        first = slot_ceil(start)
+        count = (slot_floor(end) - first) // SLOT
+        if count <= 0:
+            return 0
+
+        # Rotate the week so that bit 0 is the first slot of the window,
+        # then repeat it as often as needed with one multiplication.
+        offset = week_slot(first)
+        rotated = (
+            (self.weekly >> offset) | (self.weekly << (SLOTS_PER_WEEK - offset))
+        ) & FULL_WEEK
+        weeks = -(-count // SLOTS_PER_WEEK)
+        # A number with bit 0 of each of the `weeks` weeks set
+        repunit = ((1 << (SLOTS_PER_WEEK * weeks)) - 1) // FULL_WEEK
+        mask = (rotated * repunit) & ((1 << count) - 1)
+
+        for exception in self.exceptions:
+            exc_first = max((slot_floor(exception.start) - first) // SLOT, 0)
+            exc_last = min((slot_ceil(exception.end) - first) // SLOT, count)
+            if exc_first >= exc_last:
+                continue
+            if exception.available:
+                mask |= _range_mask(exc_first, exc_last)
+            else:
+                mask &= ~_range_mask(exc_first, exc_last)
+        return mask
+
+    def is_free(self, moment: datetime) -> bool:
+        """Whether the slot containing `moment` is free."""
+        start = slot_floor(moment)
+        return bool(self.availability_mask(start, start + SLOT))
 
+    def free_slots(self, start: datetime, end: datetime) -> List[TimeSlot]:
+        """Returns the free intervals between `start` and `end`."""
+        first = slot_ceil(start)
+        mask = self.availability_mask(start, end)
+        slots = []
+        while mask:
+            low = (mask & -mask).bit_length() - 1
+            shifted = mask >> low
+            # shifted + 1 clears the run of ones and sets the bit after it
+            length = ((shifted + 1) & ~shifted).bit_length() - 1
+            slots.append(
+                TimeSlot(
+                    start=first + low * SLOT, end=first + (low + length) * SLOT
+                )
+            )
+            mask &= ~_range_mask(low, low + length)
+        return slots
 
-# TODO
+    def first_free_slot(
+        self,
+        after: datetime,
+        duration: timedelta,
+        horizon: timedelta = timedelta(weeks=4),
+    ) -> Optional[TimeSlot]:
+        """
+        Returns the first free interval of length `duration` that starts at
+        or after `after` and ends within `horizon`, or None.
+        """
+        needed = max(-(-duration // SLOT), 1)
+        runs = self.availability_mask(after, after + horizon)
+        # After the loop bit i is set iff slots i .. i + needed - 1 are free;
+        # the run length doubles on every step, so it takes log2(needed).
+        span = 1
+        while span < needed and runs:
+            step = min(span, needed - span)
+            runs &= runs >> step
+            span += step
+        if not runs:
+            return None
+        start = slot_ceil(after) + ((runs & -runs).bit_length() - 1) * SLOT
+        return TimeSlot(start=start, end=start + needed * SLOT)
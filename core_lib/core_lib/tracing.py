@@ -0,0 +1,614 @@
+"""
+Lightweight request tracing across services.
+
+A trace is a tree of spans, each timing one step of a request: the request
+handled by a service, the HTTP calls it makes, its SQL statements, the
+embedding model and the LLM. The current span is kept in a context
+variable, and the trace id travels between services in the W3C
+`traceparent` header, so the spans written by all services can be joined
+into one latency waterfall:
+
+    python -m core_lib.tracing traces.jsonl [--trace TRACE_ID]
+
+Finished spans are exported in batches by a background thread, to a JSON
+lines file or to an OTLP/HTTP collector (JSON encoding). Only traces
+started by an incoming request are recorded; SQL statements or HTTP calls
+made outside of one are not.
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("core_lib.tracing")
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+# Longest SQL statement text kept on a span
+MAX_STATEMENT_LENGTH = 500
+
+
+@dataclass
+class Span:
+    """One timed step of a trace."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    service: str
+    sampled: bool
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    _started: int = field(default=0, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self.sampled and _processor is not None:
+            _processor.submit(self)
+
+    @property
+    def traceparent(self) -> str:
+        flags = "01" if self.sampled else "00"
+        return f"00-{self.trace_id}-{self.span_id}-{flags}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("_started")
+        return data
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_service_name = "unknown"
+_sample_ratio = 1.0
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def parse_traceparent(value: str) -> Optional[Tuple[str, str, bool]]:
+    """Returns (trace id, parent span id, sampled) of a W3C traceparent."""
+    match = _TRACEPARENT.match(value.strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def _new_span(
+    name: str,
+    parent: Optional[Span] = None,
+    remote: Optional[Tuple[str, str, bool]] = None,
+    **attributes: Any,
+) -> Span:
+    if parent is not None:
+        trace_id, parent_id, sampled = (
+            parent.trace_id,
+            parent.span_id,
+            parent.sampled,
+        )
+    elif remote is not None:
+        trace_id, parent_id, sampled = remote
+    else:
+        trace_id = f"{random.getrandbits(128):032x}"
+        parent_id = None
+        sampled = random.random() < _sample_ratio
+    return Span(
+        name=name,
+        trace_id=trace_id,
+        span_id=f"{random.getrandbits(64):016x}",
+        parent_id=parent_id,
+        service=_service_name,
+        sampled=sampled,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+        _started=time.perf_counter_ns(),
+    )
+
+
+def _detached_span(name: str, **attributes: Any) -> Span:
+    """
+    A child of the current span, or an unsampled span outside of a trace.
+    It does not become the current span.
+    """
+    parent = _current.get()
+    span = _new_span(name, parent, **attributes)
+    if parent is None:
+        span.sampled = False
+    return span
+
+
+@contextmanager
+def start_span(
+    name: str, require_parent: bool = False, **attributes: Any
+) -> Iterator[Span]:
+    """
+    Times the block as a child of the current span, or as a new trace.
+    With `require_parent`, the span is not recorded outside of a trace.
+    """
+    if require_parent:
+        span = _detached_span(name, **attributes)
+    else:
+        span = _new_span(name, _current.get(), **attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.end(e)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+
+# --- Export ---
+class JsonlFileExporter:
+    """Appends spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            for span in spans:
+                file.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"key": key, "value": _otlp_value(value)}
+        for key, value in attributes.items()
+        if value is not None
+    ]
+
+
+def to_otlp(spans: List[Span]) -> Dict[str, Any]:
+    """Spans as an OTLP ExportTraceServiceRequest in its JSON encoding."""
+    by_service: Dict[str, List[Span]] = {}
+    for span in spans:
+        by_service.setdefault(span.service, []).append(span)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _otlp_attributes({"service.name": service})
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "core_lib.tracing"},
+                        "spans": [
+                            {
+                                "traceId": span.trace_id,
+                                "spanId": span.span_id,
+                                "parentSpanId": span.parent_id or "",
+                                "name": span.name,
+                                "startTimeUnixNano": str(span.start_ns),
+                                "endTimeUnixNano": str(span.end_ns),
+                                "attributes": _otlp_attributes(span.attributes),
+                                # 1 is OK, 2 is ERROR
+                                "status": (
+                                    {"code": 2, "message": span.error}
+                                    if span.error
+                                    else {"code": 1}
+                                ),
+                            }
+                            for span in service_spans
+                        ],
+                    }
+                ],
+            }
+            for service, service_spans in by_service.items()
+        ]
+    }
+
+
+class OtlpHttpExporter:
+    """POSTs spans to an OTLP/HTTP collector, e.g. .../v1/traces."""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(to_otlp(spans)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+# Queue markers that make the exporter thread export its batch now
+_FLUSH = object()
+_SHUTDOWN = object()
+
+
+class BatchSpanProcessor:
+    """
+    Collects finished spans on a bounded queue and exports them in batches
+    from a background thread. Spans are dropped when the queue is full.
+    """
+
+    def __init__(
+        self,
+        exporter,
+        max_queue_size: int = 10_000,
+        batch_size: int = 512,
+        interval: float = 1.0,
+    ):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(max_queue_size)
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._thread = threading.Thread(
+            target=self._run, name="span-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        with self._flushed:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+            with self._flushed:
+                self._pending -= 1
+
+    def _export(self, batch: List[Span]) -> None:
+        if not batch:
+            return
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.warning(f"Could not export {len(batch)} spans: {e}")
+        with self._flushed:
+            self._pending -= len(batch)
+            self._flushed.notify_all()
+
+    def _run(self) -> None:
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                item = self._queue.get(
+                    timeout=max(deadline - time.monotonic(), 0)
+                )
+            except queue.Empty:
+                item = _FLUSH
+            if item is _SHUTDOWN:
+                self._export(batch)
+                return
+            if item is not _FLUSH:
+                batch.append(item)
+            if (
+                item is _FLUSH
+                or len(batch) >= self.batch_size
+                or time.monotonic() >= deadline
+            ):
+                self._export(batch)
+                batch = []
+                deadline = time.monotonic() + self.interval
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Waits until every submitted span has been exported."""
+        self._queue.put(_FLUSH)
+        with self._flushed:
+            self._flushed.wait_for(lambda: self._pending <= 0, timeout)
+
+    def shutdown(self) -> None:
+        self._queue.put(_SHUTDOWN)
+        self._thread.join(timeout=5.0)
+
+
+_processor: Optional[BatchSpanProcessor] = None
+
+
+def setup_tracing(
+    service_name: str, exporter=None, sample_ratio: Optional[float] = None
+) -> None:
+    """
+    Configures tracing for this process. Without an `exporter`, it is taken
+    from environment variables:
+
+    - TRACE_EXPORTER: "none" (default), "file" or "otlp".
+    - TRACE_FILE: file of the "file" exporter (traces.jsonl).
+    - TRACE_OTLP_ENDPOINT: collector of the "otlp" exporter
+      (http://localhost:4318/v1/traces).
+    - TRACE_SAMPLE_RATIO: share of new traces that are recorded (1.0).
+
+    Trace ids are propagated even when nothing is exported.
+    """
+    global _processor, _service_name, _sample_ratio
+    _service_name = service_name
+    if sample_ratio is None:
+        sample_ratio = float(os.environ.get("TRACE_SAMPLE_RATIO", "1"))
+    _sample_ratio = sample_ratio
+
+    if exporter is None:
+        kind = os.environ.get("TRACE_EXPORTER", "none").lower()
+        if kind == "file":
+            exporter = JsonlFileExporter(
+                os.environ.get("TRACE_FILE", "traces.jsonl")
+            )
+        elif kind == "otlp":
+            exporter = OtlpHttpExporter(
+                os.environ.get(
+                    "TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"
+                )
+            )
+
+    if _processor is not None:
+        _processor.shutdown()
+    _processor = BatchSpanProcessor(exporter) if exporter else None
+
+
+def flush_spans() -> None:
+    """Waits until the finished spans have been exported."""
+    if _processor is not None:
+        _processor.flush()
+
+
+@atexit.register
+def _shutdown() -> None:
+    if _processor is not None:
+        _processor.shutdown()
+
+
+# --- Logging ---
+class TraceContextFilter(logging.Filter):
+    """Adds the trace and span ids of the current span to log records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current.get()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return True
+
+
+# --- HTTP ---
+class TracingMiddleware:
+    """
+    ASGI middleware that continues the trace of an incoming `traceparent`
+    header, or starts one, and times the request as a server span. The
+    response carries the `traceparent` of that span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        remote = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                remote = parse_traceparent(value.decode("latin-1"))
+                break
+        method = scope["method"]
+        span = _new_span(
+            f"{method} {scope['path']}",
+            _current.get() if remote is None else None,
+            remote,
+            **{"http.method": method, "http.target": scope["path"]},
+        )
+        header = (b"traceparent", span.traceparent.encode())
+
+        async def send_with_traceparent(message):
+            if message["type"] == "http.response.start":
+                span.set(**{"http.status_code": message["status"]})
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), header],
+                }
+            await send(message)
+
+        token = _current.set(span)
+        error = None
+        try:
+            await self.app(scope, receive, send_with_traceparent)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current.reset(token)
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", None)
+            if route is not None:
+                span.name = f"{method} {route}"
+                span.set(**{"http.route": route})
+            span.end(error)
+
+
+def trace_app(app, service_name: str) -> None:
+    """Configures tracing for a service and traces its requests."""
+    setup_tracing(service_name)
+    app.add_middleware(TracingMiddleware)
+
+
+@lru_cache
+def _tracing_transport_class():
+    import httpx
+
+    class TracingTransport(httpx.AsyncBaseTransport):
+        """
+        httpx transport that times every request as a client span and
+        passes the trace on in the `traceparent` header.
+        """
+
+        def __init__(
+            self, transport: Optional[httpx.AsyncBaseTransport] = None
+        ):
+            self._transport = transport or httpx.AsyncHTTPTransport()
+
+        async def handle_async_request(self, request):
+            url = request.url
+            with start_span(
+                f"{request.method} {url.host}{url.path}",
+                require_parent=True,
+                **{"http.method": request.method, "http.url": str(url)},
+            ) as span:
+                request.headers["traceparent"] = span.traceparent
+                response = await self._transport.handle_async_request(request)
+                span.set(**{"http.status_code": response.status_code})
+                return response
+
+        async def aclose(self) -> None:
+            await self._transport.aclose()
+
+    return TracingTransport
+
+
+def __getattr__(name: str):
+    # httpx is only imported by the services that make HTTP calls
+    if name == "TracingTransport":
+        return _tracing_transport_class()
+    raise AttributeError(name)
+
+
+# --- SQLAlchemy ---
+def trace_engine(engine) -> None:
+    """Times the SQL statements of `engine` (sync or async) within traces."""
+    from sqlalchemy import event
+
+    engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        # The first keyword, or SQL for an empty statement
+        operation = (statement.split(None, 1) or ["SQL"])[0].upper()
+        span = _detached_span(
+            f"db {operation}",
+            **{"db.statement": statement[:MAX_STATEMENT_LENGTH]},
+        )
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        conn.info["trace_spans"].pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        spans = context.connection and context.connection.info.get(
+            "trace_spans"
+        )
+        if spans:
+            spans.pop().end(context.original_exception)
+
+
+# --- Waterfall ---
+def load_spans(paths: List[str]) -> List[Dict[str, Any]]:
+    spans = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            spans.extend(json.loads(line) for line in file if line.strip())
+    return spans
+
+
+def render_waterfall(spans: List[Dict[str, Any]], width: int = 40) -> str:
+    """Renders the spans of one trace as an indented timeline."""
+    by_id = {span["span_id"]: span for span in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for span in spans:
+        parent = span["parent_id"] if span["parent_id"] in by_id else None
+        children.setdefault(parent, []).append(span)
+
+    start = min(span["start_ns"] for span in spans)
+    end = max(span["end_ns"] for span in spans)
+    total = max(end - start, 1)
+    lines = [f"trace {spans[0]['trace_id']}  {total / 1e9:.3f}s"]
+
+    stack = [
+        (span, 0)
+        for span in sorted(children.get(None, []), key=lambda s: -s["start_ns"])
+    ]
+    while stack:
+        span, depth = stack.pop()
+        offset = span["start_ns"] - start
+        duration = span["end_ns"] - span["start_ns"]
+        first = int(offset / total * width)
+        length = max(int(duration / total * width), 1)
+        bar = " " * first + "#" * min(length, width - first)
+        mark = " !" if span.get("error") else ""
+        lines.append(
+            f"{offset / 1e9:8.3f}s {duration / 1e9:8.3f}s |{bar:<{width}}| "
+            f"{'  ' * depth}{span['service']}: {span['name']}{mark}"
+        )
+        for child in sorted(
+            children.get(span["span_id"], []), key=lambda s: -s["start_ns"]
+        ):
+            stack.append((child, depth + 1))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Prints the latency waterfall of a trace from span files."
+    )
+    parser.add_argument("files", nargs="+", help="JSON lines span files")
+    parser.add_argument(
+        "--trace", help="trace id, by default the slowest trace"
+    )
+    args = parser.parse_args(argv)
+
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    for span in load_spans(args.files):
+        traces.setdefault(span["trace_id"], []).append(span)
+    if not traces:
+        sys.exit("No spans found")
+    if args.trace:
+        trace_id = args.trace
+    else:
+        trace_id = max(
+            traces,
+            key=lambda t: max(s["end_ns"] for s in traces[t])
+            - min(s["start_ns"] for s in traces[t]),
+        )
+    if trace_id not in traces:
+        sys.exit(f"Trace {trace_id} not found")
+    print(render_waterfall(traces[trace_id]))
+
+
+if __name__ == "__main__":
+    main()
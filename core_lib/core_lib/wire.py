@@ -0,0 +1,204 @@
+"""
+Content negotiation between services.
+
+Servers install WireMiddleware and use NegotiatedResponse as the default
+response class: responses are encoded as MessagePack for clients that
+accept `application/msgpack`, and compressed with zstd or gzip when the
+client accepts it and the body is large enough to be worth it. Clients send
+ACCEPT_HEADERS and read bodies with decode_response. Error responses and
+clients that ask for nothing get plain JSON, as before.
+
+zstd needs the zstandard package; without it only gzip is offered.
+"""
+
+import gzip
+import json
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, List, Mapping, NamedTuple, Optional, Sequence
+
+import msgpack
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# Bodies smaller than this are sent uncompressed: below a packet, the CPU
+# is spent for nothing
+DEFAULT_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Media types and encodings the server offers, preferred first on ties
+MEDIA_TYPES = (JSON, MSGPACK)
+ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+# Headers of a client that prefers MessagePack and compressed bodies
+ACCEPT_HEADERS = {
+    "Accept": f"{MSGPACK}, {JSON};q=0.9",
+    "Accept-Encoding": ", ".join(ENCODINGS),
+}
+
+
+class Negotiation(NamedTuple):
+    media_type: str = JSON
+    encoding: Optional[str] = None
+    min_size: int = DEFAULT_MIN_SIZE
+
+
+# Set by WireMiddleware for the request being handled
+_negotiation: ContextVar[Negotiation] = ContextVar(
+    "wire_negotiation", default=Negotiation()
+)
+
+
+def _parse_header(value: str) -> List[tuple]:
+    """(token, q) pairs of an Accept or Accept-Encoding header."""
+    items = []
+    for part in value.split(","):
+        token, *params = [piece.strip() for piece in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        items.append((token.lower(), q))
+    return items
+
+
+def preferred(header: str, offered: Sequence[str]) -> Optional[str]:
+    """
+    Returns the offered value the header gives the highest quality, the
+    earliest offered on ties; None if it accepts none of them. Wildcards
+    (`*/*`, `application/*`, `*`) match any offered value.
+    """
+    accepted = _parse_header(header)
+    best, best_q = None, 0.0
+    for value in offered:
+        q = 0.0
+        for token, token_q in accepted:
+            if token == value:
+                # An exact match overrides wildcards
+                q = token_q
+                break
+            if token in ("*", "*/*") or (
+                token.endswith("/*") and value.startswith(token[:-1])
+            ):
+                q = max(q, token_q)
+        if q > best_q:
+            best, best_q = value, q
+    return best
+
+
+class WireMiddleware:
+    """
+    ASGI middleware negotiating the representation of responses from the
+    Accept and Accept-Encoding headers of the request.
+    """
+
+    def __init__(self, app, min_size: int = DEFAULT_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {
+            name: value.decode("latin-1")
+            for name, value in scope["headers"]
+            if name in (b"accept", b"accept-encoding")
+        }
+        negotiation = Negotiation(
+            media_type=preferred(headers.get(b"accept", JSON), MEDIA_TYPES)
+            or JSON,
+            encoding=preferred(headers.get(b"accept-encoding", ""), ENCODINGS),
+            min_size=self.min_size,
+        )
+        token = _negotiation.set(negotiation)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _negotiation.reset(token)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompress(body)
+    return gzip.decompress(body)
+
+
+def encode(content: Any, media_type: str) -> bytes:
+    """Encodes JSON-compatible data (e.g. a model_dump(mode="json"))."""
+    if media_type == MSGPACK:
+        return msgpack.packb(content)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def decode(body: bytes, media_type: str) -> Any:
+    if media_type.split(";")[0].strip() == MSGPACK:
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
+
+def decode_response(response) -> Any:
+    """The body of an httpx response, whichever representation it is in."""
+    return decode(response.content, response.headers.get("content-type", JSON))
+
+
+@lru_cache
+def _negotiated_response_class():
+    from fastapi.responses import JSONResponse
+
+    class NegotiatedResponse(JSONResponse):
+        """
+        JSONResponse encoded and compressed as negotiated by WireMiddleware
+        for the current request.
+        """
+
+        def __init__(
+            self,
+            content: Any,
+            status_code: int = 200,
+            headers: Optional[Mapping[str, str]] = None,
+            media_type: Optional[str] = None,
+            background=None,
+        ):
+            negotiation = _negotiation.get()
+            self.media_type = negotiation.media_type
+            headers = {**(headers or {}), "Vary": "Accept, Accept-Encoding"}
+            super().__init__(content, status_code, headers, None, background)
+            encoding = negotiation.encoding
+            if encoding and len(self.body) >= negotiation.min_size:
+                self.body = compress(self.body, encoding)
+                self.headers["Content-Encoding"] = encoding
+                self.headers["Content-Length"] = str(len(self.body))
+
+        def render(self, content: Any) -> bytes:
+            return encode(content, self.media_type)
+
+    return NegotiatedResponse
+
+
+def __getattr__(name: str):
+    # FastAPI is only imported by the services that serve requests
+    if name == "NegotiatedResponse":
+        return _negotiated_response_class()
+    raise AttributeError(name)
@@ -0,0 +1,51 @@
+import json
+import logging
+import queue
+
+from core_lib.global_logging_config import (
+    DebugRateLimiter,
+    JsonFormatter,
+    NonBlockingQueueHandler,
+)
+
+
+def _record(level=logging.INFO, msg="Stored task %s", args=(7,), **extra):
+    record = logging.LogRecord(
+        "task_database", level, "/app/crud.py", 42, msg, args, None
+    )
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extra_fields():
+    """Tests that records become one JSON object with their extra fields."""
+    line = JsonFormatter("task_database").format(_record(user_id=3))
+
+    entry = json.loads(line)
+    assert entry["message"] == "Stored task 7"
+    assert entry["service"] == "task_database"
+    assert entry["level"] == "INFO"
+    assert entry["user_id"] == 3
+
+
+def test_debug_records_are_rate_limited_per_call_site():
+    """Tests that only `rate` DEBUG records per call site pass at once."""
+    limiter = DebugRateLimiter(rate=3)
+
+    passed = [limiter.filter(_record(logging.DEBUG)) for _ in range(10)]
+
+    assert passed.count(True) == 3
+    assert limiter.dropped == 7
+    assert limiter.filter(_record(logging.WARNING))
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    """Tests that a full queue drops records and leaves them unformatted."""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+
+    handler.handle(_record())
+    handler.handle(_record())
+
+    queued = handler.queue.get_nowait()
+    assert (queued.msg, queued.args) == ("Stored task %s", (7,))
+    assert handler.dropped == 1
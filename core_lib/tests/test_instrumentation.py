@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from core_lib.instrumentation import Registry, instrument_app, instrument_engine
+
+
+def test_render_prometheus_text_format():
+    """Tests counters, computed gauges and cumulative histogram buckets."""
+    registry = Registry()
+    requests = registry.counter("jobs_total", "Jobs done.", ["kind"])
+    queue = registry.gauge("queue_size", "Items waiting.")
+    latency = registry.histogram("job_seconds", "Job time.", buckets=(0.1, 1))
+
+    requests.labels("embed").inc()
+    requests.labels("embed").inc(2)
+    queue.set_function(lambda: 7)
+    for value in (0.05, 0.5, 0.5, 3):
+        latency.observe(value)
+
+    text = registry.render()
+
+    assert 'jobs_total{kind="embed"} 3.0' in text
+    assert "# TYPE queue_size gauge" in text
+    assert "queue_size 7.0" in text
+    assert 'job_seconds_bucket{le="0.1"} 1.0' in text
+    assert 'job_seconds_bucket{le="1.0"} 3.0' in text
+    assert 'job_seconds_bucket{le="+Inf"} 4.0' in text
+    assert "job_seconds_count 4.0" in text
+    assert "job_seconds_sum 4.05" in text
+    # Declaring a metric twice returns the same one
+    assert registry.counter("jobs_total", "Jobs done.", ["kind"]) is requests
+
+
+def test_app_requests_are_labelled_by_route_template():
+    """Tests that request metrics use the route, not the raw path."""
+    fastapi = pytest.importorskip("fastapi")
+    httpx = pytest.importorskip("httpx")
+
+    registry = Registry()
+    app = fastapi.FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        return {"id": item_id}
+
+    instrument_app(app, registry=registry)
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            for item_id in (1, 2, "x"):
+                await client.get(f"/items/{item_id}")
+            await client.get("/missing")
+            return await client.get("/metrics")
+
+    response = asyncio.run(main())
+
+    text = response.text
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_requests_total{method="GET",route="/items/{item_id}",'
+        'status="200"} 2.0' in text
+    )
+    assert 'route="/items/{item_id}",status="422"} 1.0' in text
+    assert 'route="unmatched",status="404"} 1.0' in text
+    assert "/items/1" not in text
+
+
+def test_engine_statements_are_timed():
+    """Tests that SQL statements are timed by type through engine events."""
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+
+    registry = Registry()
+    engine = sqlalchemy.create_engine("sqlite://")
+    instrument_engine(engine, registry=registry)
+
+    with engine.connect() as connection:
+        connection.execute(sqlalchemy.text("CREATE TABLE t (x INTEGER)"))
+        connection.execute(sqlalchemy.text("SELECT * FROM t"))
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            connection.execute(sqlalchemy.text("SELECT * FROM missing"))
+
+    text = registry.render()
+    assert 'db_query_duration_seconds_count{operation="CREATE"} 1.0' in text
+    assert 'db_query_duration_seconds_count{operation="SELECT"} 1.0' in text
+    assert 'db_query_errors_total{operation="SELECT"} 1.0' in text
+
+
+def test_failed_connections_raise_their_own_error(tmp_path):
+    """Tests that a connection error, which has no statement, is counted."""
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+
+    registry = Registry()
+    engine = sqlalchemy.create_engine(
+        f"sqlite:///{tmp_path / 'missing' / 'tasks.db'}"
+    )
+    instrument_engine(engine, registry=registry)
+
+    with pytest.raises(sqlalchemy.exc.OperationalError):
+        engine.connect()
+
+    assert 'db_query_errors_total{operation=""} 1.0' in registry.render()
@@ -1,7 +1,11 @@
 import pytest
 from pydantic import ValidationError
 from datetime import datetime, timedelta
-from core_lib.models.task import Task, MAX_TASK_LEVEL
+from core_lib.models.task import (
+    Task, MAX_TASK_LEVEL, FlatTaskTree, TaskNode, build_task_tree,
+    flatten_task_tree, TaskCreate, TaskStatus, TaskUpdate, ACTIVE_STATUSES,
+    FINISHED_STATUSES,
+)
 
 def test_task_creation_success():
     """Tests that a Task can be created with valid data."""
@@ -38,3 +42,41 @@ def test_task_with_subtask():
 
     assert len(main_task.subtasks) == 1
     assert main_task.subtasks[0].title == "Step 1: Get a cat"
+
+def _node(id, parent_id, depth):
+    now = datetime.utcnow()
+    return TaskNode(
+        id=id,
+        user_id=1,
+        title=f"Task {id}",
+        parent_id=parent_id,
+        depth=depth,
+        created_at=now,
+        updated_at=now,
+    )
+
+def test_flat_tree_round_trip():
+    """Tests that a flat tree rebuilds into the nested tree and back."""
+    nodes = [_node(1, None, 0), _node(2, 1, 1), _node(4, 2, 2), _node(3, 1, 1)]
+
+    tree = build_task_tree(FlatTaskTree(nodes=nodes).nodes)
+
+    assert [t.id for t in tree.subtasks] == [2, 3]
+    assert tree.subtasks[0].subtasks[0].id == 4
+    assert [(n.id, n.depth) for n in flatten_task_tree(tree)] == [
+        (1, 0), (2, 1), (4, 2), (3, 1)
+    ]
+
+def test_flat_tree_rejects_child_before_parent():
+    """Tests that nodes must come after their parent."""
+    with pytest.raises(ValueError):
+        build_task_tree([_node(1, None, 0), _node(3, 2, 2), _node(2, 1, 1)])
+
+def test_task_status():
+    """Tests the status default, its values and the status groups."""
+    task = TaskCreate(title="Water the plants", user_id=1)
+
+    assert task.status is TaskStatus.PENDING
+    assert TaskUpdate(status="completed").status is TaskStatus.COMPLETED
+    assert set(ACTIVE_STATUSES) | set(FINISHED_STATUSES) == set(TaskStatus)
+    assert not set(ACTIVE_STATUSES) & set(FINISHED_STATUSES)
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core_lib import tracing
+
+
+class MemoryExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def exporter():
+    exporter = MemoryExporter()
+    tracing.setup_tracing("test", exporter=exporter, sample_ratio=1.0)
+    yield exporter
+    tracing.setup_tracing("test", exporter=None)
+
+
+def test_trace_is_propagated_across_services(exporter):
+    """Tests that a call from one app to another stays in one trace."""
+    fastapi = pytest.importorskip("fastapi")
+    httpx = pytest.importorskip("httpx")
+
+    backend = fastapi.FastAPI()
+    backend.add_middleware(tracing.TracingMiddleware)
+
+    @backend.get("/tasks/{task_id}")
+    async def read_task(task_id: int):
+        with tracing.start_span("embedding", batch_size=1):
+            pass
+        return {"id": task_id}
+
+    frontend = fastapi.FastAPI()
+    frontend.add_middleware(tracing.TracingMiddleware)
+
+    @frontend.post("/process")
+    async def process():
+        transport = tracing.TracingTransport(httpx.ASGITransport(app=backend))
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://backend"
+        ) as client:
+            return (await client.get("/tasks/1")).json()
+
+    async def main():
+        transport = httpx.ASGITransport(app=frontend)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://frontend"
+        ) as client:
+            return await client.post("/process")
+
+    response = asyncio.run(main())
+    tracing.flush_spans()
+
+    spans = {span.name: span for span in exporter.spans}
+    assert set(spans) == {
+        "POST /process",
+        "GET backend/tasks/1",
+        "GET /tasks/{task_id}",
+        "embedding",
+    }
+    assert len({span.trace_id for span in exporter.spans}) == 1
+    assert (
+        spans["GET backend/tasks/1"].parent_id == spans["POST /process"].span_id
+    )
+    assert (
+        spans["GET /tasks/{task_id}"].parent_id
+        == spans["GET backend/tasks/1"].span_id
+    )
+    assert spans["embedding"].parent_id == spans["GET /tasks/{task_id}"].span_id
+    assert response.headers["traceparent"] == spans["POST /process"].traceparent
+
+
+def test_spans_outside_of_a_trace_are_not_recorded(exporter):
+    """Tests that spans requiring a parent are dropped without one."""
+    with tracing.start_span("db SELECT", require_parent=True):
+        pass
+    with tracing.start_span("job"):
+        with tracing.start_span("db SELECT", require_parent=True):
+            pass
+    tracing.flush_spans()
+
+    assert [span.name for span in exporter.spans] == ["db SELECT", "job"]
+
+
+def test_otlp_exporter_posts_to_collector():
+    """Tests that spans reach an OTLP/HTTP collector stub as JSON."""
+    received = []
+
+    class Collector(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            received.append(json.loads(self.rfile.read(length)))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Collector)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_port}/v1/traces"
+    try:
+        tracing.setup_tracing(
+            "collector-test", exporter=tracing.OtlpHttpExporter(endpoint)
+        )
+        with tracing.start_span("llm", backend="local"):
+            pass
+        tracing.flush_spans()
+    finally:
+        tracing.setup_tracing("test", exporter=None)
+        server.shutdown()
+
+    (resource,) = received[0]["resourceSpans"]
+    (span,) = resource["scopeSpans"][0]["spans"]
+    assert resource["resource"]["attributes"][0]["value"] == {
+        "stringValue": "collector-test"
+    }
+    assert span["name"] == "llm"
+    assert span["attributes"] == [
+        {"key": "backend", "value": {"stringValue": "local"}}
+    ]
+
+
+def test_waterfall_nests_children_under_parents(exporter):
+    """Tests the text waterfall of a trace."""
+    with tracing.start_span("POST /tasks/process"):
+        with tracing.start_span("llm"):
+            pass
+    tracing.flush_spans()
+
+    text = tracing.render_waterfall([s.to_dict() for s in exporter.spans])
+
+    lines = text.splitlines()
+    assert lines[0].startswith("trace ")
+    assert lines[1].endswith("test: POST /tasks/process")
+    assert lines[2].endswith("  test: llm")
+
+
+def test_empty_statements_are_traced(exporter):
+    """Tests that a statement without any keyword gets a generic span."""
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+
+    engine = sqlalchemy.create_engine("sqlite://")
+    tracing.trace_engine(engine)
+    with tracing.start_span("job"):
+        with engine.connect() as connection:
+            connection.exec_driver_sql("  ")
+            connection.exec_driver_sql("SELECT 1")
+    tracing.flush_spans()
+
+    assert [span.name for span in exporter.spans] == [
+        "db SQL",
+        "db SELECT",
+        "job",
+    ]
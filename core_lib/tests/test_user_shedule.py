@@ -0,0 +1,70 @@
+from datetime import datetime, time, timedelta, timezone
+
+from core_lib.models.user_shedule import SheduleException, UserShedule
+
+# Monday
+MONDAY = datetime(2025, 6, 23)
+
+
+def evenings() -> UserShedule:
+    """Free 19:00-21:00 on weekdays."""
+    return UserShedule.from_weekly_ranges(
+        (weekday, time(19), time(21)) for weekday in range(5)
+    )
+
+
+def test_free_slots_follow_weekly_pattern():
+    """Tests that free intervals are read from the weekly bitmap."""
+    slots = evenings().free_slots(MONDAY, MONDAY + timedelta(days=2))
+
+    assert [(s.start, s.end) for s in slots] == [
+        (MONDAY.replace(hour=19), MONDAY.replace(hour=21)),
+        (MONDAY.replace(day=24, hour=19), MONDAY.replace(day=24, hour=21)),
+    ]
+
+
+def test_exception_removes_free_time():
+    """Tests that an unavailable exception overrides the weekly pattern."""
+    shedule = evenings()
+    shedule.exceptions.append(
+        SheduleException(
+            start=MONDAY.replace(hour=19), end=MONDAY.replace(hour=20)
+        )
+    )
+    slots = shedule.free_slots(MONDAY, MONDAY + timedelta(days=1))
+
+    assert slots[0].start == MONDAY.replace(hour=20)
+
+
+def test_first_free_slot_of_length():
+    """Tests finding the first free run long enough for a task."""
+    slot = evenings().first_free_slot(
+        MONDAY.replace(hour=20, minute=5), timedelta(minutes=90)
+    )
+
+    assert slot.start == MONDAY.replace(day=24, hour=19)
+    assert slot.end == MONDAY.replace(day=24, hour=20, minute=30)
+
+
+def test_weekly_mask_round_trips_as_hex():
+    """Tests that the bitmap is serialized as hex and parsed back."""
+    shedule = evenings()
+    data = shedule.model_dump(mode="json")
+
+    assert isinstance(data["weekly"], str)
+    assert UserShedule.model_validate(data).weekly == shedule.weekly
+
+
+def test_naive_and_aware_datetimes_can_be_mixed():
+    """Tests that naive exceptions apply to a window given in UTC."""
+    shedule = evenings()
+    shedule.exceptions.append(
+        SheduleException(
+            start=MONDAY.replace(hour=19), end=MONDAY.replace(hour=20)
+        )
+    )
+    monday = MONDAY.replace(tzinfo=timezone.utc)
+    slots = shedule.free_slots(monday, monday + timedelta(days=1))
+
+    assert slots[0].start == monday.replace(hour=20)
+    assert slots[0].start.tzinfo is not None
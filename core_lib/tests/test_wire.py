@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from core_lib.wire import (
+    ACCEPT_HEADERS,
+    ENCODINGS,
+    JSON,
+    MEDIA_TYPES,
+    MSGPACK,
+    decode_response,
+    preferred,
+)
+
+
+def test_preferred_follows_quality_then_server_order():
+    """Tests Accept parsing with q-values and wildcards."""
+    assert preferred(f"{MSGPACK}, {JSON};q=0.9", MEDIA_TYPES) == MSGPACK
+    assert preferred(f"{MSGPACK};q=0.5, {JSON}", MEDIA_TYPES) == JSON
+    assert preferred("*/*", MEDIA_TYPES) == JSON
+    assert preferred(f"*/*, {MSGPACK};q=0", MEDIA_TYPES) == JSON
+    assert preferred("text/html", MEDIA_TYPES) is None
+    assert preferred("gzip;q=0.8, br", ENCODINGS) == "gzip"
+    assert preferred("identity", ENCODINGS) is None
+
+
+def test_responses_are_negotiated():
+    """Tests MessagePack, compression above the threshold, and JSON errors."""
+    fastapi = pytest.importorskip("fastapi")
+    httpx = pytest.importorskip("httpx")
+    from core_lib.wire import NegotiatedResponse, WireMiddleware
+
+    app = fastapi.FastAPI(default_response_class=NegotiatedResponse)
+    app.add_middleware(WireMiddleware, min_size=100)
+
+    @app.get("/items/{size}")
+    async def read_items(size: int):
+        if size < 0:
+            raise fastapi.HTTPException(status_code=404, detail="No items")
+        return [{"id": i, "title": "Water the plants"} for i in range(size)]
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return [
+                await client.get("/items/50", headers=ACCEPT_HEADERS),
+                await client.get("/items/1", headers=ACCEPT_HEADERS),
+                await client.get("/items/50", headers={"Accept": JSON}),
+                await client.get("/items/-1", headers=ACCEPT_HEADERS),
+            ]
+
+    packed, small, plain, error = asyncio.run(main())
+
+    assert packed.headers["content-type"] == MSGPACK
+    assert packed.headers["content-encoding"] == ENCODINGS[0]
+    assert len(decode_response(packed)) == 50
+    assert "content-encoding" not in small.headers
+    assert decode_response(small) == [{"id": 0, "title": "Water the plants"}]
+    assert plain.headers["content-type"] == JSON
+    assert decode_response(plain) == decode_response(packed)
+    assert error.status_code == 404
+    assert error.json() == {"detail": "No items"}
@@ -0,0 +1,45 @@
+from datetime import timedelta
+from typing import Literal, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Application settings loaded from environment variables.
+    """
+
+    # model_config allows loading from a .env file
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", extra="ignore"
+    )
+
+    # Base URL of the task_database service
+    DATABASE_SERVICE_URL: str = "http://localhost:8100"
+    # Page size of the window and change queries
+    PAGE_SIZE: int = 5000
+
+    # Reminders due within this window are kept in memory. The window is
+    # reloaded every REFRESH_INTERVAL, which also drops deleted tasks.
+    WINDOW: timedelta = timedelta(hours=6)
+    REFRESH_INTERVAL: timedelta = timedelta(minutes=10)
+    # Edits of tasks are picked up every POLL_INTERVAL. Each poll re-reads
+    # POLL_OVERLAP of history to catch transactions that committed late.
+    POLL_INTERVAL: timedelta = timedelta(seconds=2)
+    POLL_OVERLAP: timedelta = timedelta(seconds=30)
+
+    # How long before the start of a task its reminder fires
+    REMINDER_LEAD: timedelta = timedelta(0)
+    # Reminders found this late are still sent, older ones are skipped
+    MISFIRE_GRACE: timedelta = timedelta(minutes=5)
+    MAX_CONCURRENT_SENDS: int = 100
+    SEND_ATTEMPTS: int = 3
+    SEND_RETRY_DELAY: timedelta = timedelta(seconds=10)
+
+    # "log" only writes reminders to the log, "webhook" POSTs them as JSON
+    SENDER: Literal["log", "webhook"] = "log"
+    WEBHOOK_URL: Optional[str] = None
+    WEBHOOK_TIMEOUT: float = 5.0
+
+
+settings = Settings()
@@ -0,0 +1,243 @@
+import asyncio
+import time
+from collections import Counter
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+import httpx
+
+from core_lib.models.task import Task
+
+from .logging_config import logger
+from .queue import Reminder, ReminderQueue
+from .senders import Sender
+from .source import TaskSource
+
+
+def _as_utc(moment: datetime) -> datetime:
+    """Treats naive datetimes from the database as UTC."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def _utc_from_timestamp(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+class Dispatcher:
+    """
+    Sends a reminder when the execution of a task is due to start.
+
+    Reminders of the tasks starting within `window` are kept in a
+    ReminderQueue. A single loop sleeps until the earliest one is due, or
+    until an earlier reminder is added, and hands the due reminders to the
+    sender. The database is only read with indexed queries: the window is
+    reloaded every `refresh_interval`, and tasks updated or deleted since
+    the last poll are applied every `poll_interval`.
+    """
+
+    def __init__(
+        self,
+        source: TaskSource,
+        sender: Sender,
+        window: timedelta,
+        refresh_interval: timedelta,
+        poll_interval: timedelta,
+        poll_overlap: timedelta = timedelta(seconds=30),
+        lead: timedelta = timedelta(0),
+        misfire_grace: timedelta = timedelta(minutes=5),
+        max_concurrent_sends: int = 100,
+        send_attempts: int = 3,
+        retry_delay: timedelta = timedelta(seconds=10),
+    ):
+        self.source = source
+        self.sender = sender
+        self.window = window
+        self.refresh_interval = refresh_interval
+        self.poll_interval = poll_interval
+        self.poll_overlap = poll_overlap
+        self.lead = lead
+        self.misfire_grace = misfire_grace
+        self.send_attempts = send_attempts
+        self.retry_delay = retry_delay
+
+        self.queue = ReminderQueue()
+        self.stats = Counter()
+        self._wakeup = asyncio.Event()
+        self._send_slots = asyncio.Semaphore(max_concurrent_sends)
+        self._sends: Set[asyncio.Task] = set()
+        self._runner: Optional[asyncio.Task] = None
+        # Start time of the tasks whose reminders were handed to the sender,
+        # so that a reload within the grace period does not send them again
+        self._sent: Dict[int, datetime] = {}
+        self._window_end: Optional[datetime] = None
+        self._polled_until: Optional[datetime] = None
+        self._deletions_polled_until: Optional[datetime] = None
+
+    def start(self) -> None:
+        self._runner = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+        await asyncio.gather(*self._sends, return_exceptions=True)
+
+    async def run(self) -> None:
+        await asyncio.gather(
+            self._fire_loop(),
+            self._every(self.refresh_interval, self.refresh),
+            self._every(self.poll_interval, self.poll),
+        )
+
+    async def _every(
+        self, interval: timedelta, job: Callable[[], Awaitable[None]]
+    ) -> None:
+        while True:
+            try:
+                await job()
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not read tasks from task_database: {e}")
+            except Exception as e:
+                # Keep the loop alive: reminders stop for good otherwise
+                logger.error(f"Reading tasks failed: {e}", exc_info=True)
+            await asyncio.sleep(interval.total_seconds())
+
+    # --- Loading reminders ---
+    def _apply(self, task: Task, now: float) -> None:
+        """Adds, moves or removes the reminder of a task."""
+        starts_at = task.start_time_execution
+        if starts_at is None:
+            self.queue.cancel(task.id)
+            return
+        starts_at = _as_utc(starts_at)
+        fire_at = starts_at - self.lead
+        if self._sent.get(task.id) == starts_at:
+            # Already sent, or being retried
+            return
+        if fire_at.timestamp() < now - self.misfire_grace.total_seconds() or (
+            self._window_end is not None and starts_at >= self._window_end
+        ):
+            # Too late, or left for a later reload
+            self.queue.cancel(task.id)
+            return
+
+        reminder = Reminder(
+            task_id=task.id,
+            user_id=task.user_id,
+            title=task.title,
+            starts_at=starts_at,
+            fire_at=fire_at,
+            updated_at=task.updated_at,
+        )
+        if self.queue.push(reminder):
+            self._wakeup.set()
+
+    async def refresh(self) -> None:
+        """
+        Reloads the reminders of the window, dropping those whose tasks
+        were deleted or moved out of it.
+        """
+        now = time.time()
+        started_at = _utc_from_timestamp(now)
+        start = _utc_from_timestamp(now - self.misfire_grace.total_seconds())
+        end = started_at + self.window
+
+        self._window_end = end
+        loaded = set()
+        async for task in self.source.upcoming(start, end):
+            loaded.add(task.id)
+            self._apply(task, now)
+        for task_id in self.queue.task_ids_starting_before(end):
+            if task_id not in loaded:
+                self.queue.cancel(task_id)
+
+        self._sent = {
+            task_id: starts_at
+            for task_id, starts_at in self._sent.items()
+            if starts_at >= start
+        }
+        if self._polled_until is None:
+            self._polled_until = started_at
+            self._deletions_polled_until = started_at
+        self.stats["refreshes"] += 1
+        logger.info(
+            f"Loaded {len(loaded)} tasks starting until {end.isoformat()}, "
+            f"{len(self.queue)} reminders pending"
+        )
+
+    async def poll(self) -> None:
+        """Applies the tasks updated or deleted since the previous poll."""
+        if self._polled_until is None:
+            return
+        now = time.time()
+        polled_until = self._polled_until
+        async for task in self.source.changed(
+            self._polled_until - self.poll_overlap
+        ):
+            self._apply(task, now)
+            polled_until = max(polled_until, _as_utc(task.updated_at))
+        self._polled_until = polled_until
+
+        polled_until = self._deletions_polled_until
+        async for task in self.source.deleted(
+            self._deletions_polled_until - self.poll_overlap
+        ):
+            self.queue.cancel(task.id)
+            polled_until = max(polled_until, task.deleted_at)
+        self._deletions_polled_until = polled_until
+
+    # --- Sending reminders ---
+    async def _fire_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            next_due = self.queue.next_due()
+            delay = None if next_due is None else next_due - time.time()
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for reminder in self.queue.pop_due(time.time()):
+                self._sent[reminder.task_id] = reminder.starts_at
+                send = asyncio.create_task(self._send(reminder))
+                self._sends.add(send)
+                send.add_done_callback(self._sends.discard)
+
+    async def _send(self, reminder: Reminder) -> None:
+        async with self._send_slots:
+            try:
+                await self.sender.send(reminder)
+            except Exception as e:
+                self._retry(reminder, e)
+                return
+        self.stats["sent"] += 1
+        lateness = time.time() - reminder.fire_at.timestamp()
+        logger.debug(
+            f"Sent reminder of task {reminder.task_id} {lateness:.3f}s late"
+        )
+
+    def _retry(self, reminder: Reminder, error: Exception) -> None:
+        self.stats["failed"] += 1
+        if reminder.attempt + 1 >= self.send_attempts:
+            logger.error(
+                f"Giving up on the reminder of task {reminder.task_id}: {error}"
+            )
+            return
+        logger.warning(
+            f"Could not send the reminder of task {reminder.task_id}: {error}"
+        )
+        # A newer reminder of the task may have been queued meanwhile
+        if reminder.task_id in self.queue:
+            return
+        retry = replace(
+            reminder,
+            fire_at=_utc_from_timestamp(time.time()) + self.retry_delay,
+            attempt=reminder.attempt + 1,
+        )
+        if self.queue.push(retry):
+            self._wakeup.set()
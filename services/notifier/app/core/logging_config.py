@@ -0,0 +1,3 @@
+from core_lib.global_logging_config import setup_service_logging
+
+logger = setup_service_logging("notifier")
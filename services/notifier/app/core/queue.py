@@ -0,0 +1,108 @@
+import heapq
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass(slots=True)
+class Reminder:
+    """A reminder to send when a task is due to start."""
+
+    task_id: int
+    user_id: int
+    title: str
+    # When the task starts and when the reminder is to be sent
+    starts_at: datetime
+    fire_at: datetime
+    # Version of the task the reminder was built from
+    updated_at: datetime
+    attempt: int = 0
+
+
+class ReminderQueue:
+    """
+    Reminders ordered by the time they fire, at most one per task.
+
+    A min-heap with lazy deletion: rescheduling or cancelling a reminder
+    only updates the index, and the outdated heap entry is skipped when it
+    reaches the top. Both are O(log n), so millions of pending reminders
+    can be kept and edited. The heap is rebuilt when outdated entries make
+    up more than half of it.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, int]] = []
+        # task_id -> (sequence number of its live heap entry, reminder)
+        self._index: Dict[int, Tuple[int, Reminder]] = {}
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, task_id: int) -> bool:
+        return task_id in self._index
+
+    def get(self, task_id: int) -> Optional[Reminder]:
+        entry = self._index.get(task_id)
+        return entry[1] if entry else None
+
+    def push(self, reminder: Reminder) -> bool:
+        """
+        Adds or replaces the reminder of a task. Returns True if it became
+        the earliest one, so that a waiting dispatcher has to wake up.
+        A reminder for the same version of the task is kept as it is, so
+        that reloading a task does not undo a postponed retry.
+        """
+        current = self.get(reminder.task_id)
+        if (
+            current is not None
+            and current.starts_at == reminder.starts_at
+            and current.updated_at == reminder.updated_at
+        ):
+            return False
+
+        self._sequence += 1
+        self._index[reminder.task_id] = (self._sequence, reminder)
+        fire_at = reminder.fire_at.timestamp()
+        heapq.heappush(self._heap, (fire_at, self._sequence, reminder.task_id))
+        self._compact()
+        return self._heap[0][1] == self._sequence
+
+    def cancel(self, task_id: int) -> bool:
+        return self._index.pop(task_id, None) is not None
+
+    def _is_live(self, entry: Tuple[float, int, int]) -> bool:
+        live = self._index.get(entry[2])
+        return live is not None and live[0] == entry[1]
+
+    def _drop_outdated_head(self) -> None:
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def _compact(self) -> None:
+        if len(self._heap) > 2 * len(self._index) + 1024:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        """Firing timestamp of the earliest reminder, None if there is none."""
+        self._drop_outdated_head()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[Reminder]:
+        """Removes and returns the reminders that fire at `now` or earlier."""
+        due = []
+        self._drop_outdated_head()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, task_id = heapq.heappop(self._heap)
+            due.append(self._index.pop(task_id)[1])
+            self._drop_outdated_head()
+        return due
+
+    def task_ids_starting_before(self, moment: datetime) -> List[int]:
+        """Ids of the tasks starting before `moment` that have a reminder."""
+        return [
+            task_id
+            for task_id, (_, reminder) in self._index.items()
+            if reminder.starts_at < moment
+        ]
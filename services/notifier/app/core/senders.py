@@ -0,0 +1,65 @@
+from typing import Optional, Protocol
+
+import httpx
+
+from .config import Settings
+from .logging_config import logger
+from .queue import Reminder
+
+
+class Sender(Protocol):
+    """Delivers a reminder to its user. Raising means it was not sent."""
+
+    async def send(self, reminder: Reminder) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+class LogSender:
+    """Only writes reminders to the log; for development."""
+
+    async def send(self, reminder: Reminder) -> None:
+        logger.info(
+            f"Reminder for user {reminder.user_id}: task {reminder.task_id} "
+            f"'{reminder.title}' starts at {reminder.starts_at.isoformat()}"
+        )
+
+    async def aclose(self) -> None:
+        pass
+
+
+class WebhookSender:
+    """POSTs reminders as JSON to a URL, e.g. the bot that messages users."""
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 5.0,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.url = url
+        self._client = client or httpx.AsyncClient(timeout=timeout)
+
+    async def send(self, reminder: Reminder) -> None:
+        response = await self._client.post(
+            self.url,
+            json={
+                "task_id": reminder.task_id,
+                "user_id": reminder.user_id,
+                "title": reminder.title,
+                "starts_at": reminder.starts_at.isoformat(),
+            },
+        )
+        response.raise_for_status()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+def get_sender(settings: Settings) -> Sender:
+    """Creates the sender selected in the settings."""
+    if settings.SENDER == "webhook":
+        if not settings.WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL is required for the webhook sender")
+        return WebhookSender(settings.WEBHOOK_URL, settings.WEBHOOK_TIMEOUT)
+    return LogSender()
@@ -0,0 +1,78 @@
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from core_lib.models.task import DeletedTask, Task
+from core_lib.tracing import TracingTransport
+from core_lib.wire import ACCEPT_HEADERS, decode_response
+
+
+class TaskSource:
+    """Reads upcoming, recently changed and deleted tasks from task_database."""
+
+    def __init__(
+        self,
+        base_url: str,
+        page_size: int = 5000,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.page_size = page_size
+        self._client = client or httpx.AsyncClient(
+            base_url=base_url,
+            transport=TracingTransport(),
+            headers=ACCEPT_HEADERS,
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _page(self, path: str, params: dict, model=Task) -> list:
+        response = await self._client.get(
+            path, params={**params, "limit": self.page_size}
+        )
+        response.raise_for_status()
+        return [
+            model.model_validate(item) for item in decode_response(response)
+        ]
+
+    async def upcoming(
+        self, start: datetime, end: datetime
+    ) -> AsyncIterator[Task]:
+        """Yields the tasks starting in [start, end), by start time."""
+        params = {"start": start.isoformat(), "end": end.isoformat()}
+        while True:
+            tasks = await self._page("/tasks/upcoming", params)
+            for task in tasks:
+                yield task
+            if len(tasks) < self.page_size:
+                return
+            params["after_start"] = tasks[-1].start_time_execution.isoformat()
+            params["after_id"] = tasks[-1].id
+
+    async def changed(self, since: datetime) -> AsyncIterator[Task]:
+        """Yields the tasks updated at or after `since`, by update time."""
+        params = {"since": since.isoformat()}
+        while True:
+            tasks = await self._page("/tasks/changed", params)
+            for task in tasks:
+                yield task
+            if len(tasks) < self.page_size:
+                return
+            params["since"] = tasks[-1].updated_at.isoformat()
+            params["after_id"] = tasks[-1].id
+
+    async def deleted(self, since: datetime) -> AsyncIterator[DeletedTask]:
+        """
+        Yields the tasks deleted or archived at or after `since`, by
+        deletion time.
+        """
+        params = {"since": since.isoformat()}
+        while True:
+            tasks = await self._page("/tasks/deleted", params, DeletedTask)
+            for task in tasks:
+                yield task
+            if len(tasks) < self.page_size:
+                return
+            params["since"] = tasks[-1].deleted_at.isoformat()
+            params["after_id"] = tasks[-1].id
@@ -0,0 +1,55 @@
+from core_lib.instrumentation import gauge, instrument_app
+from core_lib.tracing import trace_app
+from fastapi import FastAPI
+
+from .core.config import settings
+from .core.dispatcher import Dispatcher
+from .core.logging_config import logger
+from .core.senders import get_sender
+from .core.source import TaskSource
+
+app = FastAPI(
+    title="TaskerAI: Notifier Service",
+    description="Reminds users when their tasks are due to start.",
+    version="0.1.0",
+)
+instrument_app(app)
+trace_app(app, "notifier")
+
+source = TaskSource(settings.DATABASE_SERVICE_URL, settings.PAGE_SIZE)
+dispatcher = Dispatcher(
+    source=source,
+    sender=get_sender(settings),
+    window=settings.WINDOW,
+    refresh_interval=settings.REFRESH_INTERVAL,
+    poll_interval=settings.POLL_INTERVAL,
+    poll_overlap=settings.POLL_OVERLAP,
+    lead=settings.REMINDER_LEAD,
+    misfire_grace=settings.MISFIRE_GRACE,
+    max_concurrent_sends=settings.MAX_CONCURRENT_SENDS,
+    send_attempts=settings.SEND_ATTEMPTS,
+    retry_delay=settings.SEND_RETRY_DELAY,
+)
+
+gauge("reminders_pending", "Reminders waiting to be sent.").set_function(
+    lambda: len(dispatcher.queue)
+)
+
+
+@app.on_event("startup")
+async def on_startup():
+    logger.info("Starting the reminder dispatcher")
+    dispatcher.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await dispatcher.stop()
+    await dispatcher.sender.aclose()
+    await source.aclose()
+
+
+@app.get("/stats")
+async def get_stats():
+    """Number of pending reminders and counts of sent and failed ones."""
+    return {"pending": len(dispatcher.queue), **dispatcher.stats}
@@ -0,0 +1,78 @@
+"""
+Benchmark of the reminder queue with millions of pending reminders.
+
+Fills the queue, reschedules a share of the reminders (as edits polled from
+task_database would), and pops everything in order, reporting the rate of
+each step and the peak memory of the process.
+
+Usage (from services/notifier):
+    python -m benchmarks.bench_queue --reminders 2000000
+"""
+
+import argparse
+import random
+import time
+import resource
+from datetime import datetime, timedelta, timezone
+
+from app.core.queue import Reminder, ReminderQueue
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _reminder(task_id: int, offset: float, version: int) -> Reminder:
+    moment = START + timedelta(seconds=offset)
+    return Reminder(
+        task_id=task_id,
+        user_id=task_id % 10_000,
+        title=f"Task {task_id}",
+        starts_at=moment,
+        fire_at=moment,
+        updated_at=START + timedelta(seconds=version),
+    )
+
+
+def _rate(count: int, started: float) -> int:
+    return round(count / (time.perf_counter() - started))
+
+
+def main(reminders: int, edited_share: float, seed: int) -> None:
+    rng = random.Random(seed)
+    window = 6 * 3600
+    queue = ReminderQueue()
+
+    started = time.perf_counter()
+    for task_id in range(reminders):
+        queue.push(_reminder(task_id, rng.uniform(0, window), 0))
+    push_rate = _rate(reminders, started)
+    # ru_maxrss is in kilobytes on Linux
+    memory_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    edits = int(reminders * edited_share)
+    started = time.perf_counter()
+    for task_id in rng.sample(range(reminders), edits):
+        queue.push(_reminder(task_id, rng.uniform(0, window), 1))
+    edit_rate = _rate(edits, started)
+
+    started = time.perf_counter()
+    popped = len(queue.pop_due((START + timedelta(seconds=window)).timestamp()))
+    pop_rate = _rate(popped, started)
+
+    print(
+        {
+            "reminders": reminders,
+            "peak_rss_mb": round(memory_mb),
+            "pushes_per_second": push_rate,
+            "edits_per_second": edit_rate,
+            "pops_per_second": pop_rate,
+        }
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--reminders", type=int, default=2_000_000)
+    parser.add_argument("--edited-share", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args.reminders, args.edited_share, args.seed)
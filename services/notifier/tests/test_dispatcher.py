@@ -0,0 +1,209 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.core.dispatcher import Dispatcher
+from app.core.queue import Reminder, ReminderQueue
+from core_lib.models.task import DeletedTask, Task
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _task(task_id: int, starts_in: float, version: int = 0) -> Task:
+    return Task(
+        id=task_id,
+        user_id=7,
+        title=f"Task {task_id}",
+        start_time_execution=_now() + timedelta(seconds=starts_in),
+        created_at=EPOCH,
+        updated_at=_now() + timedelta(microseconds=version),
+    )
+
+
+class StubSource:
+    """Serves tasks from a dict, like the task_database endpoints."""
+
+    def __init__(self, *tasks: Task):
+        self.tasks = {task.id: task for task in tasks}
+        self.tombstones = []
+
+    def delete(self, task_id: int) -> None:
+        task = self.tasks.pop(task_id)
+        self.tombstones.append(
+            DeletedTask(id=task_id, user_id=task.user_id, deleted_at=_now())
+        )
+
+    async def upcoming(self, start, end):
+        for task in sorted(
+            self.tasks.values(), key=lambda t: t.start_time_execution
+        ):
+            if start <= task.start_time_execution < end:
+                yield task
+
+    async def changed(self, since):
+        for task in self.tasks.values():
+            if task.updated_at >= since:
+                yield task
+
+    async def deleted(self, since):
+        for task in self.tombstones:
+            if task.deleted_at >= since:
+                yield task
+
+
+class StubSender:
+    """Records when reminders are sent; fails the first `failures` ones."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.sent = []
+
+    async def send(self, reminder):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("bot is down")
+        self.sent.append((reminder.task_id, time.time()))
+
+    async def aclose(self):
+        pass
+
+
+def _dispatcher(source, sender, **kwargs) -> Dispatcher:
+    options = {
+        "window": timedelta(hours=1),
+        "refresh_interval": timedelta(seconds=0.2),
+        "poll_interval": timedelta(seconds=0.05),
+        "poll_overlap": timedelta(seconds=1),
+    }
+    options.update(kwargs)
+    return Dispatcher(source=source, sender=sender, **options)
+
+
+def test_queue_keeps_only_the_latest_reminder_of_a_task():
+    """Tests that rescheduled and cancelled reminders are skipped lazily."""
+    queue = ReminderQueue()
+
+    def reminder(task_id, fire_at, version=0):
+        moment = EPOCH + timedelta(seconds=fire_at)
+        return Reminder(
+            task_id=task_id,
+            user_id=1,
+            title="t",
+            starts_at=moment,
+            fire_at=moment,
+            updated_at=EPOCH + timedelta(seconds=version),
+        )
+
+    assert queue.push(reminder(1, 10))
+    assert queue.push(reminder(2, 5))
+    assert not queue.push(reminder(3, 20))
+    assert queue.push(reminder(1, 1, version=1))
+    assert not queue.push(reminder(1, 1, version=1))
+    queue.cancel(2)
+
+    due = queue.pop_due((EPOCH + timedelta(seconds=15)).timestamp())
+
+    assert [r.task_id for r in due] == [1]
+    assert len(queue) == 1
+    assert queue.next_due() == (EPOCH + timedelta(seconds=20)).timestamp()
+
+
+def test_reminders_fire_on_time_and_follow_edits():
+    """Tests firing accuracy, moved and deleted tasks, and no duplicates."""
+    source = StubSource(_task(1, 0.3), _task(2, 0.4), _task(3, 0.5))
+    sender = StubSender()
+
+    async def main():
+        dispatcher = _dispatcher(source, sender)
+        dispatcher.start()
+        await asyncio.sleep(0.1)
+        # Task 2 is moved earlier, task 3 is deleted
+        source.tasks[2] = _task(2, 0.1, version=1)
+        started = time.time()
+        source.delete(3)
+        await asyncio.sleep(0.8)
+        await dispatcher.stop()
+        return started
+
+    started = asyncio.run(main())
+
+    fired = dict(sender.sent)
+    assert sorted(fired) == [1, 2]
+    assert len(sender.sent) == 2
+    assert abs(fired[2] - (started + 0.1)) < 0.1
+    assert fired[1] < fired[2] or fired[2] - fired[1] < 0.1
+
+
+def test_failed_reminders_are_retried():
+    """Tests that a failed send is retried after the retry delay."""
+    source = StubSource(_task(1, 0.05))
+    sender = StubSender(failures=1)
+
+    async def main():
+        dispatcher = _dispatcher(
+            source, sender, retry_delay=timedelta(seconds=0.1)
+        )
+        dispatcher.start()
+        await asyncio.sleep(0.5)
+        await dispatcher.stop()
+        return dispatcher.stats
+
+    stats = asyncio.run(main())
+
+    assert [task_id for task_id, _ in sender.sent] == [1]
+    assert stats["failed"] == 1
+    assert stats["sent"] == 1
+
+
+def test_deleted_tasks_are_dropped_before_the_next_refresh():
+    """Tests that the poll cancels the reminders of deleted tasks."""
+    source = StubSource(_task(1, 0.3), _task(2, 0.3))
+    sender = StubSender()
+
+    async def main():
+        dispatcher = _dispatcher(
+            source, sender, refresh_interval=timedelta(minutes=10)
+        )
+        dispatcher.start()
+        await asyncio.sleep(0.1)
+        source.delete(2)
+        await asyncio.sleep(0.4)
+        await dispatcher.stop()
+
+    asyncio.run(main())
+
+    assert [task_id for task_id, _ in sender.sent] == [1]
+
+
+def test_loops_survive_unexpected_errors():
+    """Tests that a malformed response does not stop the reminders."""
+    source = StubSource(_task(1, 0.3))
+    sender = StubSender()
+    changed = source.changed
+    calls = []
+
+    async def broken_then_fine(since):
+        calls.append(since)
+        if len(calls) == 1:
+            raise ValueError("malformed task")
+        async for task in changed(since):
+            yield task
+
+    source.changed = broken_then_fine
+
+    async def main():
+        dispatcher = _dispatcher(source, sender)
+        dispatcher.start()
+        await asyncio.sleep(0.1)
+        source.tasks[2] = _task(2, 0.2, version=1)
+        await asyncio.sleep(0.4)
+        await dispatcher.stop()
+
+    asyncio.run(main())
+
+    assert len(calls) > 1
+    assert sorted(task_id for task_id, _ in sender.sent) == [1, 2]
@@ -15,7 +15,7 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 # Add the project root to sys.path so Alembic can find your module with models
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from app.db.models import Base
+from app.db.models import TASK_PARTITIONS, Base
 
 # Load environment variables from .env file
 load_dotenv()
@@ -37,6 +37,20 @@ config.set_main_option("sqlalchemy.url", os.environ.get("DATABASE_URL"))
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+# Partitions of tasks are created with it and are not in the metadata
+PARTITIONS = {f"tasks_p{remainder}" for remainder in range(TASK_PARTITIONS)}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table":
+        return name not in PARTITIONS
+    if type_ == "foreign_key_constraint":
+        # Postgres clones the foreign key of tasks for every partition
+        return object.referred_table.name not in PARTITIONS
+    table = getattr(object, "table", None)
+    return table is None or table.name not in PARTITIONS
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -58,6 +72,7 @@ def run_migrations_offline():
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -65,7 +80,11 @@ def run_migrations_offline():
 
 
 def do_run_migrations(connection):
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
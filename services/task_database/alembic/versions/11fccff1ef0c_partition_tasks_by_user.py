@@ -0,0 +1,182 @@
+"""Partition tasks by user
+
+Revision ID: 11fccff1ef0c
+Revises: 
+Create Date: 2026-10-19 13:44:30.546623
+
+The tasks table used to be created by init_db, so this is the first
+revision: it converts that table when it exists, and creates the
+partitioned one otherwise. Subtasks are given the user of their root
+task, since a child must be in its parent's partition. Rows are copied in
+one statement, so the service should be stopped while it runs; indexes
+are built after the copy, which is much faster than maintaining them row
+by row.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '11fccff1ef0c'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with app.db.models.TASK_PARTITIONS
+PARTITIONS = 16
+
+COLUMNS = """
+    id INTEGER NOT NULL DEFAULT nextval('tasks_id_seq'),
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    status taskstatus NOT NULL,
+    parent_id INTEGER,
+    complexity FLOAT,
+    priority FLOAT,
+    tags JSONB,
+    level INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    embedding VECTOR(384),
+    deadline TIMESTAMP WITH TIME ZONE,
+    start_time_execution TIMESTAMP WITH TIME ZONE,
+    estimated_duraction INTERVAL,
+    created_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE
+"""
+COLUMN_NAMES = (
+    "id, title, description, status, parent_id, complexity, priority, tags, "
+    "level, user_id, embedding, deadline, start_time_execution, "
+    "estimated_duraction, created_at, updated_at"
+)
+INDEXES = (
+    "CREATE INDEX ix_tasks_parent_id ON tasks (parent_id)",
+    "CREATE INDEX ix_tasks_start_time_execution "
+    "ON tasks (start_time_execution)",
+    "CREATE INDEX ix_tasks_updated_at ON tasks (updated_at)",
+)
+
+# Gives every task the user of the root of its tree
+OWN_SUBTREES = """
+WITH RECURSIVE owners (id, user_id) AS (
+    SELECT id, coalesce(user_id, 0)
+    FROM tasks_unpartitioned
+    WHERE parent_id IS NULL
+    UNION ALL
+    SELECT child.id, owners.user_id
+    FROM tasks_unpartitioned AS child
+    JOIN owners ON child.parent_id = owners.id
+)
+UPDATE tasks_unpartitioned AS task
+SET user_id = owners.user_id
+FROM owners
+WHERE task.id = owners.id AND task.user_id IS DISTINCT FROM owners.user_id
+"""
+# Tasks left with a different user than their parent's
+MISMATCHED_OWNERS = """
+SELECT child.id
+FROM tasks_unpartitioned AS child
+JOIN tasks_unpartitioned AS parent ON child.parent_id = parent.id
+WHERE child.user_id IS DISTINCT FROM parent.user_id
+ORDER BY child.id
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    existing = sa.inspect(bind).has_table("tasks")
+    if existing:
+        op.execute("ALTER TABLE tasks RENAME TO tasks_unpartitioned")
+        op.execute(
+            "ALTER TABLE tasks_unpartitioned "
+            "DROP CONSTRAINT IF EXISTS tasks_parent_id_fkey, "
+            "DROP CONSTRAINT IF EXISTS tasks_pkey"
+        )
+        for name in ("parent_id", "start_time_execution", "updated_at"):
+            op.execute(f"DROP INDEX IF EXISTS ix_tasks_{name}")
+        op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY NONE")
+    else:
+        op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        op.execute(
+            "CREATE TYPE taskstatus AS ENUM "
+            "('PENDING', 'IN_PROGRESS', 'COMPLETED', 'FAILED', 'CANCELLED')"
+        )
+        op.execute("CREATE SEQUENCE tasks_id_seq")
+
+    op.execute(f"CREATE TABLE tasks ({COLUMNS}) PARTITION BY HASH (user_id)")
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE tasks_p{remainder} PARTITION OF tasks "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+        )
+    if existing:
+        # Parent and child share a partition through the foreign key, so
+        # subtasks take the owner of their root. Tasks without a user could
+        # not be routed to a partition and belong to user 0.
+        op.execute(OWN_SUBTREES)
+        orphans = bind.execute(sa.text(MISMATCHED_OWNERS)).scalars().all()
+        if orphans:
+            raise RuntimeError(
+                "Tasks not reachable from a root, e.g. in a cycle of "
+                f"parent_id, cannot be given an owner: {orphans}"
+            )
+        op.execute(
+            f"INSERT INTO tasks ({COLUMN_NAMES}) "
+            f"SELECT {COLUMN_NAMES.replace('user_id', 'coalesce(user_id, 0)')} "
+            f"FROM tasks_unpartitioned"
+        )
+        op.execute("DROP TABLE tasks_unpartitioned")
+
+    # Created on the parent, they are built for every partition
+    op.execute("ALTER TABLE tasks ADD PRIMARY KEY (id, user_id)")
+    op.execute(
+        "ALTER TABLE tasks ADD CONSTRAINT tasks_parent_id_user_id_fkey "
+        "FOREIGN KEY (parent_id, user_id) REFERENCES tasks (id, user_id)"
+    )
+    for statement in INDEXES:
+        op.execute(statement)
+    op.execute(
+        "CREATE INDEX ix_tasks_user_id_created_at "
+        "ON tasks (user_id, created_at)"
+    )
+    op.execute(
+        "CREATE INDEX ix_tasks_embedding_hnsw "
+        "ON tasks USING hnsw (embedding vector_l2_ops)"
+    )
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY tasks.id")
+    op.execute("ANALYZE tasks")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE tasks RENAME TO tasks_partitioned")
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY NONE")
+    op.execute(
+        "ALTER TABLE tasks_partitioned "
+        "DROP CONSTRAINT tasks_parent_id_user_id_fkey"
+    )
+    for name in (
+        "parent_id",
+        "start_time_execution",
+        "updated_at",
+        "user_id_created_at",
+        "embedding_hnsw",
+    ):
+        op.execute(f"DROP INDEX ix_tasks_{name}")
+
+    op.execute(f"CREATE TABLE tasks ({COLUMNS})")
+    op.execute(
+        f"INSERT INTO tasks ({COLUMN_NAMES}) "
+        f"SELECT {COLUMN_NAMES} FROM tasks_partitioned"
+    )
+    op.execute("DROP TABLE tasks_partitioned")
+    op.execute("ALTER TABLE tasks ADD PRIMARY KEY (id)")
+    op.execute(
+        "ALTER TABLE tasks ADD CONSTRAINT tasks_parent_id_fkey "
+        "FOREIGN KEY (parent_id) REFERENCES tasks (id)"
+    )
+    for statement in INDEXES:
+        op.execute(statement)
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY tasks.id")
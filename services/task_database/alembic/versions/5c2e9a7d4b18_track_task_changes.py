@@ -0,0 +1,101 @@
+"""Track task changes
+
+Revision ID: 5c2e9a7d4b18
+Revises: a60bde0c63d3
+Create Date: 2026-10-19 14:02:11.204518
+
+Adds the change feed position of tasks, written by triggers, and the
+tombstones of deleted tasks. Existing tasks start at position (0, 0), so
+they are only returned by the first, cursorless, call of the feed; the
+columns are added with a constant default, which does not rewrite the
+table.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e9a7d4b18'
+down_revision: Union[str, Sequence[str], None] = 'a60bde0c63d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with app.db.models.TRACK_CHANGES
+TRACK_CHANGES = """
+CREATE OR REPLACE FUNCTION tasks_track_changes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO task_tombstones (id, user_id, change_txid, change_seq)
+        VALUES (
+            OLD.id, OLD.user_id,
+            pg_current_xact_id()::text::bigint, nextval('task_change_seq')
+        );
+        RETURN OLD;
+    END IF;
+    NEW.change_txid := pg_current_xact_id()::text::bigint;
+    NEW.change_seq := nextval('task_change_seq');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE SEQUENCE task_change_seq")
+    for table in ("tasks", "tasks_archive"):
+        op.execute(
+            f"ALTER TABLE {table} "
+            "ADD COLUMN change_txid BIGINT NOT NULL DEFAULT 0, "
+            "ADD COLUMN change_seq BIGINT NOT NULL DEFAULT 0"
+        )
+        op.execute(
+            f"ALTER TABLE {table} "
+            "ALTER COLUMN change_txid DROP DEFAULT, "
+            "ALTER COLUMN change_seq DROP DEFAULT"
+        )
+    op.execute(
+        "CREATE INDEX ix_tasks_user_id_change_txid_change_seq "
+        "ON tasks (user_id, change_txid, change_seq)"
+    )
+
+    op.execute("""
+        CREATE TABLE task_tombstones (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            change_txid BIGINT NOT NULL,
+            change_seq BIGINT NOT NULL,
+            deleted_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+            PRIMARY KEY (id, user_id)
+        )
+        """)
+    op.execute(
+        "CREATE INDEX ix_task_tombstones_user_id_change_txid_change_seq "
+        "ON task_tombstones (user_id, change_txid, change_seq)"
+    )
+
+    op.execute(TRACK_CHANGES)
+    op.execute(
+        "CREATE TRIGGER tasks_track_writes BEFORE INSERT OR UPDATE ON tasks "
+        "FOR EACH ROW EXECUTE FUNCTION tasks_track_changes()"
+    )
+    op.execute(
+        "CREATE TRIGGER tasks_track_deletes AFTER DELETE ON tasks "
+        "FOR EACH ROW EXECUTE FUNCTION tasks_track_changes()"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER tasks_track_deletes ON tasks")
+    op.execute("DROP TRIGGER tasks_track_writes ON tasks")
+    op.execute("DROP FUNCTION tasks_track_changes()")
+    op.execute("DROP TABLE task_tombstones")
+    op.execute("DROP INDEX ix_tasks_user_id_change_txid_change_seq")
+    for table in ("tasks", "tasks_archive"):
+        op.execute(
+            f"ALTER TABLE {table} DROP COLUMN change_txid, "
+            "DROP COLUMN change_seq"
+        )
+    op.execute("DROP SEQUENCE task_change_seq")
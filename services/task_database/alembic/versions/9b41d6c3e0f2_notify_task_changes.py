@@ -0,0 +1,56 @@
+"""Notify task changes
+
+Revision ID: 9b41d6c3e0f2
+Revises: 5c2e9a7d4b18
+Create Date: 2026-10-19 14:31:47.830112
+
+Statement level triggers send one NOTIFY per user and statement on the
+task_changes channel, for app.db.listener.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b41d6c3e0f2'
+down_revision: Union[str, Sequence[str], None] = '5c2e9a7d4b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with app.db.models.NOTIFY_CHANGES
+NOTIFY_CHANGES = """
+CREATE OR REPLACE FUNCTION tasks_notify_changes() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('task_changes', json_build_object(
+        'op', TG_OP,
+        'user_id', user_id,
+        'count', count(*),
+        'ids', CASE WHEN count(*) <= 100 THEN array_agg(id ORDER BY id) END
+    )::text)
+    FROM changed
+    GROUP BY user_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+TRIGGERS = (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(NOTIFY_CHANGES)
+    for operation, transition in TRIGGERS:
+        op.execute(
+            f"CREATE TRIGGER tasks_notify_{operation.lower()}s "
+            f"AFTER {operation} ON tasks "
+            f"REFERENCING {transition} TABLE AS changed "
+            "FOR EACH STATEMENT EXECUTE FUNCTION tasks_notify_changes()"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for operation, _ in TRIGGERS:
+        op.execute(f"DROP TRIGGER tasks_notify_{operation.lower()}s ON tasks")
+    op.execute("DROP FUNCTION tasks_notify_changes()")
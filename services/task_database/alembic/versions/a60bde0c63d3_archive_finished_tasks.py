@@ -0,0 +1,95 @@
+"""Archive finished tasks
+
+Revision ID: a60bde0c63d3
+Revises: 11fccff1ef0c
+Create Date: 2026-10-19 13:49:51.481821
+
+Adds partial indexes over the tasks that still need work and the table
+that app.archive_job moves finished tasks to. Indexes on a partitioned
+table cannot be built concurrently, so writes to tasks wait for them.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a60bde0c63d3'
+down_revision: Union[str, Sequence[str], None] = '11fccff1ef0c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with core_lib.models.task
+ACTIVE = "status IN ('PENDING', 'IN_PROGRESS', 'FAILED')"
+FINISHED = "status IN ('COMPLETED', 'CANCELLED')"
+
+COLUMN_NAMES = (
+    "id, title, description, status, parent_id, complexity, priority, tags, "
+    "level, user_id, embedding, deadline, start_time_execution, "
+    "estimated_duraction, created_at, updated_at"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "CREATE INDEX ix_tasks_active_user_id_priority "
+        f"ON tasks (user_id, priority DESC, deadline) WHERE {ACTIVE}"
+    )
+    op.execute(
+        "CREATE INDEX ix_tasks_active_start_time_execution "
+        f"ON tasks (start_time_execution, id) WHERE {ACTIVE}"
+    )
+    op.execute(
+        "CREATE INDEX ix_tasks_finished_updated_at "
+        f"ON tasks (updated_at) WHERE {FINISHED}"
+    )
+
+    op.execute(
+        """
+        CREATE TABLE tasks_archive (
+            id INTEGER NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            description TEXT,
+            status taskstatus NOT NULL,
+            parent_id INTEGER,
+            complexity FLOAT,
+            priority FLOAT,
+            tags JSONB,
+            level INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            embedding VECTOR(384),
+            deadline TIMESTAMP WITH TIME ZONE,
+            start_time_execution TIMESTAMP WITH TIME ZONE,
+            estimated_duraction INTERVAL,
+            created_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE,
+            archived_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+            PRIMARY KEY (id, user_id)
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX ix_tasks_archive_user_id_created_at "
+        "ON tasks_archive (user_id, created_at)"
+    )
+    op.execute(
+        "CREATE INDEX ix_tasks_archive_parent_id ON tasks_archive (parent_id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived tasks go back; foreign keys are checked at the end of the
+    # statement, so parents and subtasks can be inserted in any order
+    op.execute(
+        f"INSERT INTO tasks ({COLUMN_NAMES}) "
+        f"SELECT {COLUMN_NAMES} FROM tasks_archive"
+    )
+    op.execute("DROP TABLE tasks_archive")
+    for name in (
+        "active_user_id_priority",
+        "active_start_time_execution",
+        "finished_updated_at",
+    ):
+        op.execute(f"DROP INDEX ix_tasks_{name}")
@@ -0,0 +1,32 @@
+"""Index tombstones by deletion time
+
+Revision ID: c7d2e4f91a36
+Revises: e3f1a8c52d07
+Create Date: 2026-10-19 18:12:05.274311
+
+Lets the notifier read the deletions of all users since a moment, to
+drop the reminders of deleted tasks.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e4f91a36'
+down_revision: Union[str, Sequence[str], None] = 'e3f1a8c52d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "CREATE INDEX ix_task_tombstones_deleted_at_id "
+        "ON task_tombstones (deleted_at, id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX ix_task_tombstones_deleted_at_id")
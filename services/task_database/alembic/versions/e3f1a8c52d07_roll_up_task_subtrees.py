@@ -0,0 +1,352 @@
+"""Roll up task subtrees
+
+Revision ID: e3f1a8c52d07
+Revises: 9b41d6c3e0f2
+Create Date: 2026-10-19 16:05:23.418907
+
+Fixes the name of tasks.estimated_duration, and adds the rollups of the
+subtree of each task, maintained by statement level triggers. They are
+backfilled from the tasks and the archive, before the triggers exist.
+Updates of the rollups alone no longer move tasks in the change feed.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3f1a8c52d07'
+down_revision: Union[str, Sequence[str], None] = '9b41d6c3e0f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_COLUMNS = (
+    "ADD COLUMN descendant_count INTEGER NOT NULL DEFAULT 0, "
+    "ADD COLUMN completed_descendant_count INTEGER NOT NULL DEFAULT 0, "
+    "ADD COLUMN descendant_estimated_duration INTERVAL NOT NULL "
+    "DEFAULT '0', "
+    "ADD COLUMN descendant_max_deadline TIMESTAMP WITH TIME ZONE"
+)
+# Every task, archived or not, counts towards each of its ancestors; run
+# for both tables, since the rollups of archived tasks are read when those
+# of their parents are recomputed
+BACKFILL = """
+WITH RECURSIVE every_task AS (
+    SELECT id, user_id, parent_id, status, estimated_duration, deadline
+    FROM tasks
+    UNION ALL
+    SELECT id, user_id, parent_id, status, estimated_duration, deadline
+    FROM tasks_archive
+), up AS (
+    SELECT
+        parent_id AS id, user_id, 1 AS distance,
+        (status = 'COMPLETED')::integer AS completed,
+        coalesce(estimated_duration, interval '0') AS duration,
+        deadline
+    FROM every_task
+    WHERE parent_id IS NOT NULL
+    UNION ALL
+    SELECT
+        t.parent_id, up.user_id, up.distance + 1,
+        up.completed, up.duration, up.deadline
+    FROM up
+    JOIN every_task t ON t.id = up.id AND t.user_id = up.user_id
+    WHERE t.parent_id IS NOT NULL AND up.distance <= 100
+)
+UPDATE {table} t SET
+    descendant_count = r.tasks,
+    completed_descendant_count = r.completed,
+    descendant_estimated_duration = r.duration,
+    descendant_max_deadline = r.deadline
+FROM (
+    SELECT
+        id, user_id,
+        count(*) AS tasks,
+        sum(completed) AS completed,
+        sum(duration) AS duration,
+        max(deadline) AS deadline
+    FROM up
+    GROUP BY id, user_id
+) r
+WHERE t.id = r.id AND t.user_id = r.user_id
+"""
+# Keep in sync with app.db.models.TRACK_CHANGES
+TRACK_CHANGES = """
+CREATE OR REPLACE FUNCTION tasks_track_changes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND current_setting('tasks.rolling_up', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO task_tombstones (id, user_id, change_txid, change_seq)
+        VALUES (
+            OLD.id, OLD.user_id,
+            pg_current_xact_id()::text::bigint, nextval('task_change_seq')
+        );
+        RETURN OLD;
+    END IF;
+    NEW.change_txid := pg_current_xact_id()::text::bigint;
+    NEW.change_seq := nextval('task_change_seq');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+# As of revision 5c2e9a7d4b18
+PREVIOUS_TRACK_CHANGES = """
+CREATE OR REPLACE FUNCTION tasks_track_changes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO task_tombstones (id, user_id, change_txid, change_seq)
+        VALUES (
+            OLD.id, OLD.user_id,
+            pg_current_xact_id()::text::bigint, nextval('task_change_seq')
+        );
+        RETURN OLD;
+    END IF;
+    NEW.change_txid := pg_current_xact_id()::text::bigint;
+    NEW.change_seq := nextval('task_change_seq');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# Keep in sync with app.db.models.ROLLUP_FUNCTIONS
+ROLLUP_FUNCTIONS = (
+    """
+CREATE OR REPLACE FUNCTION tasks_rollup(t tasks, sign integer)
+RETURNS jsonb AS $$
+    SELECT jsonb_build_object(
+        'parent_id', t.parent_id,
+        'user_id', t.user_id,
+        'tasks', sign * (1 + t.descendant_count),
+        'completed', sign * (
+            (t.status = 'COMPLETED')::integer + t.completed_descendant_count
+        ),
+        'duration', sign * (
+            coalesce(t.estimated_duration, interval '0')
+            + t.descendant_estimated_duration
+        ),
+        CASE WHEN sign > 0 THEN 'raised' ELSE 'lowered' END,
+        greatest(t.deadline, t.descendant_max_deadline)
+    )
+$$ LANGUAGE sql STABLE
+""",
+    """
+CREATE OR REPLACE FUNCTION tasks_apply_rollups(changes jsonb)
+RETURNS void AS $$
+DECLARE
+    stale_ancestors integer[];
+    ancestor integer[];
+BEGIN
+    -- Read by tasks_track_changes: rollups are not sent by the change feed
+    PERFORM set_config('tasks.rolling_up', 'on', true);
+    WITH RECURSIVE change AS (
+        SELECT * FROM jsonb_to_recordset(changes) AS c(
+            parent_id integer, user_id integer,
+            tasks integer, completed integer, duration interval,
+            raised timestamptz, lowered timestamptz, recompute boolean
+        )
+        WHERE c.parent_id IS NOT NULL
+    ), up AS (
+        SELECT
+            parent_id AS id, user_id, 1 AS distance, tasks, completed,
+            duration, raised, lowered, coalesce(recompute, false) AS recompute
+        FROM change
+        UNION ALL
+        SELECT
+            t.parent_id, up.user_id, up.distance + 1,
+            up.tasks, up.completed, up.duration,
+            up.raised, up.lowered, up.recompute
+        FROM up
+        JOIN tasks t ON t.id = up.id AND t.user_id = up.user_id
+        -- Bounds the walk should a cycle ever be written
+        WHERE t.parent_id IS NOT NULL AND up.distance <= 100
+    ), rolled AS (
+        SELECT
+            id, user_id,
+            sum(tasks) AS tasks,
+            sum(completed) AS completed,
+            sum(duration) AS duration,
+            max(raised) AS raised,
+            max(lowered) AS lowered,
+            bool_or(recompute) AS recompute,
+            max(distance) AS distance
+        FROM up
+        GROUP BY id, user_id
+    ), updated AS (
+        UPDATE tasks t SET
+            descendant_count = t.descendant_count + r.tasks,
+            completed_descendant_count =
+                t.completed_descendant_count + r.completed,
+            descendant_estimated_duration =
+                t.descendant_estimated_duration + r.duration,
+            descendant_max_deadline =
+                greatest(t.descendant_max_deadline, r.raised)
+        FROM rolled r
+        WHERE t.id = r.id AND t.user_id = r.user_id
+        RETURNING t.id, t.user_id, r.distance, r.recompute OR coalesce(
+            r.lowered >= t.descendant_max_deadline
+            AND r.lowered > coalesce(r.raised, '-infinity'),
+            false
+        ) AS stale
+    )
+    SELECT array_agg(ARRAY[id, user_id] ORDER BY distance)
+        FILTER (WHERE stale)
+    INTO stale_ancestors
+    FROM updated;
+
+    -- Closest ancestors first, so that each reads up to date children.
+    -- Archived children keep their rollups, and keep counting.
+    IF stale_ancestors IS NOT NULL THEN
+        FOREACH ancestor SLICE 1 IN ARRAY stale_ancestors LOOP
+            UPDATE tasks t SET descendant_max_deadline = (
+                SELECT max(greatest(c.deadline, c.descendant_max_deadline))
+                FROM (
+                    SELECT deadline, descendant_max_deadline
+                    FROM tasks
+                    WHERE parent_id = ancestor[1] AND user_id = ancestor[2]
+                    UNION ALL
+                    SELECT deadline, descendant_max_deadline
+                    FROM tasks_archive
+                    WHERE parent_id = ancestor[1] AND user_id = ancestor[2]
+                ) c
+            )
+            WHERE t.id = ancestor[1] AND t.user_id = ancestor[2];
+        END LOOP;
+    END IF;
+    PERFORM set_config('tasks.rolling_up', 'off', true);
+END
+$$ LANGUAGE plpgsql
+-- The number of changes is unknown to the planner, which would rather scan
+-- every partition than look the ancestors up one by one
+SET enable_hashjoin = off
+SET enable_mergejoin = off
+""",
+    """
+CREATE OR REPLACE FUNCTION tasks_track_rollups() RETURNS trigger AS $$
+DECLARE
+    changes jsonb;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT jsonb_agg(tasks_rollup(n, 1)) INTO changes
+        FROM new_rows n
+        WHERE n.parent_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF current_setting('tasks.archiving', true) = 'on' THEN
+            RETURN NULL;
+        END IF;
+        -- A subtree deleted with its root is taken back once, at the root
+        SELECT jsonb_agg(tasks_rollup(o, -1)) INTO changes
+        FROM old_rows o
+        WHERE o.parent_id IS NOT NULL AND NOT EXISTS (
+            SELECT FROM old_rows p
+            WHERE p.id = o.parent_id AND p.user_id = o.user_id
+        );
+    ELSE
+        -- A moved task takes its subtree from its old parent to the new one,
+        -- whose ancestors recompute their deadlines since subtasks may have
+        -- changed too. Both are walked up the tree as it is now: the subtree
+        -- of a task moved along has already been taken to its new place.
+        -- Otherwise only the columns of the task itself changed. Updates of
+        -- the rollups themselves change none of these columns, which ends
+        -- the recursion.
+        SELECT
+            coalesce(
+                jsonb_agg(tasks_rollup(o, -1)) FILTER (WHERE m.moved),
+                '[]'
+            ) || jsonb_agg(CASE WHEN m.moved
+                THEN tasks_rollup(n, 1) || '{"recompute": true}'
+                ELSE jsonb_build_object(
+                    'parent_id', n.parent_id,
+                    'user_id', n.user_id,
+                    'tasks', 0,
+                    'completed', (n.status = 'COMPLETED')::integer
+                        - (o.status = 'COMPLETED')::integer,
+                    'duration', coalesce(n.estimated_duration, interval '0')
+                        - coalesce(o.estimated_duration, interval '0'),
+                    'raised', CASE WHEN n.deadline IS DISTINCT FROM o.deadline
+                        THEN n.deadline END,
+                    'lowered', CASE WHEN n.deadline IS DISTINCT FROM o.deadline
+                        THEN o.deadline END
+                ) END)
+        INTO changes
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id AND n.user_id = o.user_id
+        CROSS JOIN LATERAL (
+            SELECT o.parent_id IS DISTINCT FROM n.parent_id AS moved
+        ) m
+        WHERE (o.parent_id, o.status, o.estimated_duration, o.deadline)
+            IS DISTINCT FROM
+            (n.parent_id, n.status, n.estimated_duration, n.deadline);
+    END IF;
+    IF changes IS NOT NULL THEN
+        PERFORM tasks_apply_rollups(changes);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+""",
+)
+
+TRIGGERS = (
+    ("INSERT", "NEW TABLE AS new_rows"),
+    ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ("DELETE", "OLD TABLE AS old_rows"),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ("tasks", "tasks_archive"):
+        op.execute(
+            f"ALTER TABLE {table} "
+            "RENAME COLUMN estimated_duraction TO estimated_duration"
+        )
+        op.execute(f"ALTER TABLE {table} {ROLLUP_COLUMNS}")
+    # The archive copies the values of tasks, see app.db.models
+    op.execute(
+        "ALTER TABLE tasks_archive "
+        "ALTER COLUMN descendant_count DROP DEFAULT, "
+        "ALTER COLUMN completed_descendant_count DROP DEFAULT, "
+        "ALTER COLUMN descendant_estimated_duration DROP DEFAULT"
+    )
+    for table in ("tasks", "tasks_archive"):
+        op.execute(BACKFILL.format(table=table))
+    op.execute(
+        "CREATE INDEX ix_tasks_roots_user_id_created_at "
+        "ON tasks (user_id, created_at) WHERE parent_id IS NULL"
+    )
+
+    op.execute(TRACK_CHANGES)
+    for function in ROLLUP_FUNCTIONS:
+        op.execute(function)
+    for operation, transitions in TRIGGERS:
+        op.execute(
+            f"CREATE TRIGGER tasks_rollup_{operation.lower()}s "
+            f"AFTER {operation} ON tasks REFERENCING {transitions} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION tasks_track_rollups()"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for operation, _ in TRIGGERS:
+        op.execute(f"DROP TRIGGER tasks_rollup_{operation.lower()}s ON tasks")
+    op.execute("DROP FUNCTION tasks_track_rollups()")
+    op.execute("DROP FUNCTION tasks_apply_rollups(jsonb)")
+    op.execute("DROP FUNCTION tasks_rollup(tasks, integer)")
+    op.execute(PREVIOUS_TRACK_CHANGES)
+    op.execute("DROP INDEX ix_tasks_roots_user_id_created_at")
+    for table in ("tasks", "tasks_archive"):
+        op.execute(
+            f"ALTER TABLE {table} "
+            "DROP COLUMN descendant_count, "
+            "DROP COLUMN completed_descendant_count, "
+            "DROP COLUMN descendant_estimated_duration, "
+            "DROP COLUMN descendant_max_deadline"
+        )
+        op.execute(
+            f"ALTER TABLE {table} "
+            "RENAME COLUMN estimated_duration TO estimated_duraction"
+        )
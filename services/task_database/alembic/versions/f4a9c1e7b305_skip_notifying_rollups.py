@@ -0,0 +1,66 @@
+"""Skip notifying rollups
+
+Revision ID: f4a9c1e7b305
+Revises: c7d2e4f91a36
+Create Date: 2026-10-19 19:02:41.118530
+
+Updates of the rollup columns of the ancestors of a written task sent an
+UPDATE notification of their own; only the statement writing the task
+is notified now.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a9c1e7b305'
+down_revision: Union[str, Sequence[str], None] = 'c7d2e4f91a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with app.db.models.NOTIFY_CHANGES
+NOTIFY_CHANGES = """
+CREATE OR REPLACE FUNCTION tasks_notify_changes() RETURNS trigger AS $$
+BEGIN
+    -- Updates of the rollups alone, see ROLLUP_FUNCTIONS
+    IF current_setting('tasks.rolling_up', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('task_changes', json_build_object(
+        'op', TG_OP,
+        'user_id', user_id,
+        'count', count(*),
+        'ids', CASE WHEN count(*) <= 100 THEN array_agg(id ORDER BY id) END
+    )::text)
+    FROM changed
+    GROUP BY user_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+PREVIOUS_NOTIFY_CHANGES = """
+CREATE OR REPLACE FUNCTION tasks_notify_changes() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('task_changes', json_build_object(
+        'op', TG_OP,
+        'user_id', user_id,
+        'count', count(*),
+        'ids', CASE WHEN count(*) <= 100 THEN array_agg(id ORDER BY id) END
+    )::text)
+    FROM changed
+    GROUP BY user_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(NOTIFY_CHANGES)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(PREVIOUS_NOTIFY_CHANGES)
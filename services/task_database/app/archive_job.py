@@ -0,0 +1,66 @@
+"""
+Archival of finished tasks.
+
+Moves completed and cancelled tasks that were not updated for
+ARCHIVE_AFTER_DAYS days from tasks to tasks_archive, ARCHIVE_BATCH_SIZE
+tasks per transaction, so that locks stay short and the tables and their
+indexes only hold what the service works on. Archived tasks are still
+returned by the endpoints that take include_archived=true.
+
+Run it periodically, e.g. from cron, from services/task_database:
+
+    python -m app.archive_job [--days N] [--batch-size N]
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from .core.config import settings
+from .core.logging_config import logger
+from .db import crud
+from .db.session import AsyncSessionLocal, engine
+
+
+async def archive(days: int, batch_size: int) -> int:
+    """Archives every eligible task, batch by batch; returns how many."""
+    before = datetime.now(timezone.utc) - timedelta(days=days)
+    total = 0
+    async with AsyncSessionLocal() as session:
+        while True:
+            moved = await crud.archive_finished_tasks(
+                session, before=before, batch_size=batch_size
+            )
+            total += moved
+            logger.debug("Archived a batch of %d tasks", moved)
+            # Parents of the archived tasks may have become eligible, so
+            # only a batch that finds nothing at all ends the run
+            if moved == 0:
+                break
+    logger.info("Archived %d tasks finished before %s", total, before)
+    return total
+
+
+async def main(days: int, batch_size: int) -> None:
+    try:
+        await archive(days, batch_size)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=settings.ARCHIVE_AFTER_DAYS,
+        help="archive tasks not updated for this many days",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.ARCHIVE_BATCH_SIZE,
+        help="tasks moved per transaction",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.days, args.batch_size))
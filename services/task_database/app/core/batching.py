@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import deque
+from typing import (
+    Callable,
+    Deque,
+    Generic,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+class MicroBatcher(Generic[Item, Result]):
+    """
+    Merges concurrent calls into batches for a function that is much cheaper
+    per item on a batch, e.g. the forward pass of a model.
+
+    A batch is sent once its first call has waited `window` seconds, or as
+    soon as `max_batch` items are waiting. Batches run one at a time in a
+    worker thread, so the event loop keeps collecting the next batch while
+    one is computed, and the results are handed back to each caller in the
+    order of its items.
+    """
+
+    def __init__(
+        self,
+        function: Callable[[List[Item]], Sequence[Result]],
+        window: float = 0.005,
+        max_batch: int = 256,
+    ):
+        self.function = function
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        # (items, future, time of arrival) of the calls waiting for a batch
+        self._pending: Deque[Tuple[List[Item], asyncio.Future, float]] = deque()
+        self._waiting = 0
+        self._worker: Optional[asyncio.Task] = None
+        # Set when a full batch is waiting, to cut the window short
+        self._full: Optional[asyncio.Event] = None
+
+    @property
+    def pending(self) -> int:
+        """Number of items waiting for a batch."""
+        return self._waiting
+
+    async def submit(self, items: List[Item]) -> List[Result]:
+        """Returns the results of `items`, computed with other calls' items."""
+        if not items:
+            return []
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((items, future, time.monotonic()))
+        self._waiting += len(items)
+        if self._worker is None or self._worker.done():
+            self._full = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        elif self._waiting >= self.max_batch:
+            self._full.set()
+        return await future
+
+    def _take_batch(self) -> List[Tuple[List[Item], asyncio.Future, float]]:
+        """Removes calls from the queue up to max_batch items, at least one."""
+        batch, size = [], 0
+        while self._pending:
+            items = self._pending[0][0]
+            if batch and size + len(items) > self.max_batch:
+                break
+            batch.append(self._pending.popleft())
+            size += len(items)
+        self._waiting -= size
+        return batch
+
+    async def _run(self) -> None:
+        while self._pending:
+            if self._waiting < self.max_batch:
+                first_arrival = self._pending[0][2]
+                delay = first_arrival + self.window - time.monotonic()
+                try:
+                    await asyncio.wait_for(self._full.wait(), max(delay, 0))
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            batch = self._take_batch()
+            # Callers that gave up do not need their items computed
+            batch = [call for call in batch if not call[1].done()]
+            if not batch:
+                continue
+            items = [item for call in batch for item in call[0]]
+            try:
+                results = await asyncio.to_thread(self.function, items)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            start = 0
+            for call_items, future, _ in batch:
+                end = start + len(call_items)
+                if not future.done():
+                    future.set_result(list(results[start:end]))
+                start = end
@@ -0,0 +1,63 @@
+import asyncio
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Set
+
+Event = Dict[str, Any]
+
+# Sent instead of the events a subscriber was too slow to take, or that
+# were lost while the database connection was down: the client has to catch
+# up through the change feed
+RESYNC: Event = {"op": "RESYNC"}
+
+
+class EventBroker:
+    """
+    Fans events out to the subscribers of the user they belong to.
+
+    Every subscriber has its own bounded queue, so a slow client never
+    blocks the others: when its queue is full, its pending events are
+    replaced by a single RESYNC.
+    """
+
+    def __init__(self, max_queued: int = 100):
+        self.max_queued = max_queued
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    @property
+    def subscribers(self) -> int:
+        """Number of open subscriptions."""
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    @contextmanager
+    def subscribe(self, user_id: int) -> Iterator[asyncio.Queue]:
+        """A queue receiving the events of `user_id` until exit."""
+        queue = asyncio.Queue(self.max_queued)
+        self._subscribers[user_id].add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers[user_id]
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: int, event: Event) -> None:
+        """Queues `event` for every subscriber of `user_id`."""
+        for queue in self._subscribers.get(user_id, ()):
+            self._put(queue, event)
+
+    def publish_all(self, event: Event) -> None:
+        """Queues `event` for every subscriber."""
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._put(queue, event)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: Event) -> None:
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
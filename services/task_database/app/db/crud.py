@@ -1,58 +1,173 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, NamedTuple, Optional, Sequence, Tuple
 
-from core_lib.models.task import TaskCreate, TaskUpdate
-from sqlalchemy import select
+from core_lib.models.task import (
+    ACTIVE_STATUSES,
+    FINISHED_STATUSES,
+    MAX_TASK_LEVEL,
+    TaskCreate,
+    TaskStatus,
+    TaskTreeCreate,
+    TaskTreeNode,
+    TaskUpdate,
+)
+from sqlalchemy import (
+    BigInteger,
+    Integer,
+    Text,
+    cast,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, array
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased, defer, raiseload, selectinload
 
 from .embedding import generate_embedding
-from .mappers import pydantic_to_db_task
+from .mappers import pydantic_to_db_task, tree_to_db_tasks
+from .models import ArchivedTask
 from .models import Task as DBTask
+from .models import TaskTombstone
 
 EMBEDDING_DIMENSION = 384
 ZERO_EMBEDDING = [0.0] * EMBEDDING_DIMENSION
 
 
+class SubtasksExistError(Exception):
+    """Raised when a subtree is inserted under a task that has subtasks."""
+
+    def __init__(self, task_id: int):
+        super().__init__(f"Task {task_id} already has subtasks")
+        self.task_id = task_id
+
+
 # --- READ operations ---
-async def get_task_by_id(session: AsyncSession, task_id: int) -> DBTask | None:
+async def get_task_by_id(
+    session: AsyncSession, task_id: int, user_id: Optional[int] = None
+) -> DBTask | None:
     """
     Fetches a task by its ID and eagerly loads the entire subtask tree
-    to prevent lazy loading issues in an async context.
+    to prevent lazy loading issues in an async context. With the `user_id`
+    of the task, only its partition is read.
     """
     # This strategy tells SQLAlchemy to load the 'subtasks' relationship,
     # and for each of those subtasks, to also load their 'subtasks', and so on.
-    # We can chain this to handle multiple levels of nesting.
-    # For a reasonably deep tree (e.g., up to 5 levels), this is effective.
+    # The chain covers the deepest allowed tree, down to the (empty)
+    # subtasks of leaves at MAX_TASK_LEVEL; levels below the actual leaves
+    # cost nothing, since no query is sent without parents to load.
     recursive_load = selectinload(DBTask.subtasks)
-    for _ in range(4):  # Loop 4 times for a total depth of 5 levels
+    for _ in range(MAX_TASK_LEVEL):
         recursive_load = recursive_load.selectinload(DBTask.subtasks)
 
     # We build the query explicitly
     stmt = select(DBTask).where(DBTask.id == task_id).options(recursive_load)
+    if user_id is not None:
+        stmt = stmt.where(DBTask.user_id == user_id)
 
     result = await session.execute(stmt)
     # scalar_one_or_none() correctly assembles the single result object
     return result.scalar_one_or_none()
 
 
+def _task_source(include_archived: bool = False):
+    """
+    The entity to query tasks with: DBTask, or with the archive, DBTask
+    aliased over the union of both tables. Rows of the union have no
+    relationships to load, see _flat_tasks.
+    """
+    if not include_archived:
+        return DBTask
+    columns = [column.name for column in DBTask.__table__.columns]
+    both = union_all(
+        select(*(DBTask.__table__.c[name] for name in columns)),
+        select(*(ArchivedTask.__table__.c[name] for name in columns)),
+    ).subquery("all_tasks")
+    return aliased(DBTask, both)
+
+
+def _flat_tasks(source=DBTask):
+    """
+    Selects tasks without their subtrees and embeddings. The subtasks of
+    the loaded tasks can not be read.
+    """
+    return select(source).options(
+        raiseload(source.subtasks), defer(source.embedding)
+    )
+
+
+def _with_statuses(stmt, source, statuses: Optional[Sequence[TaskStatus]]):
+    """Filters `stmt` on the given statuses, if any."""
+    if statuses is None:
+        return stmt
+    return stmt.where(source.status.in_(statuses))
+
+
 async def get_tasks_by_user(
-    session: AsyncSession, user_id: int
+    session: AsyncSession,
+    user_id: int,
+    statuses: Optional[Sequence[TaskStatus]] = None,
+    include_archived: bool = False,
 ) -> List[DBTask]:
-    """Fetches all tasks for a specific user."""
+    """
+    Fetches all tasks for a specific user, optionally only those in
+    `statuses`. Archived tasks are only read with `include_archived`.
+    """
+    source = _task_source(include_archived)
     stmt = (
-        select(DBTask)
-        .where(DBTask.user_id == user_id)
+        _flat_tasks(source)
+        .where(source.user_id == user_id)
+        .order_by(source.created_at.desc())
+    )
+    stmt = _with_statuses(stmt, source, statuses)
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def get_root_tasks(
+    session: AsyncSession,
+    user_id: int,
+    statuses: Optional[Sequence[TaskStatus]] = None,
+) -> List[DBTask]:
+    """
+    Fetches the roots of the task trees of a user, newest first, optionally
+    only those in `statuses`; their rollup columns describe the trees.
+    """
+    stmt = (
+        _flat_tasks()
+        .where(DBTask.user_id == user_id, DBTask.parent_id.is_(None))
         .order_by(DBTask.created_at.desc())
     )
+    stmt = _with_statuses(stmt, DBTask, statuses)
     result = await session.execute(stmt)
     return result.scalars().all()
 
 
+async def get_task_without_subtree(
+    session: AsyncSession, task_id: int, user_id: Optional[int] = None
+) -> DBTask | None:
+    """Fetches a task alone, e.g. to read its rollup columns."""
+    stmt = _flat_tasks().where(DBTask.id == task_id)
+    if user_id is not None:
+        stmt = stmt.where(DBTask.user_id == user_id)
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
+
+
 async def get_unscheduled_tasks(
-    session: AsyncSession, user_id: int
+    session: AsyncSession,
+    user_id: int,
+    statuses: Sequence[TaskStatus] = ACTIVE_STATUSES,
 ) -> List[DBTask]:
-    """Fetches future or unscheduled tasks for a user."""
+    """
+    Fetches future or unscheduled tasks for a user. Only tasks that still
+    need work by default, which are read from a partial index.
+    """
     stmt = (
         select(DBTask)
         .where(
@@ -61,26 +176,360 @@ async def get_unscheduled_tasks(
         )
         .order_by(DBTask.priority.desc(), DBTask.deadline.asc())
     )
+    stmt = _with_statuses(stmt, DBTask, statuses)
     result = await session.execute(stmt)
     return result.scalars().all()
 
 
+async def get_task_subtree_flat(
+    session: AsyncSession,
+    task_id: int,
+    user_id: Optional[int] = None,
+    include_archived: bool = False,
+) -> List[Tuple[DBTask, int]]:
+    """
+    Fetches a task and its whole subtree in one query, as (task, depth)
+    pairs in depth-first order. Empty if the task does not exist. With the
+    `user_id` of the task, only its partition is read; with
+    `include_archived`, archived tasks of the subtree are included.
+    """
+    tasks = _task_source(include_archived)
+    # Walk down the tree, keeping the path of ids from the root: ordering
+    # by it lists every node after its parent and its subtree before the
+    # next sibling
+    same_user = [] if user_id is None else [tasks.user_id == user_id]
+    subtree = (
+        select(
+            tasks.id,
+            tasks.user_id,
+            literal(0).label("depth"),
+            array([tasks.id], type_=ARRAY(Integer)).label("path"),
+        )
+        .where(tasks.id == task_id, *same_user)
+        .cte("subtree", recursive=True)
+    )
+    subtree = subtree.union_all(
+        select(
+            tasks.id,
+            tasks.user_id,
+            subtree.c.depth + 1,
+            subtree.c.path.concat(tasks.id),
+        )
+        .join(
+            subtree,
+            (tasks.parent_id == subtree.c.id)
+            & (tasks.user_id == subtree.c.user_id),
+        )
+        .where(*same_user)
+    )
+    stmt = (
+        _flat_tasks(tasks)
+        .add_columns(subtree.c.depth)
+        .join(
+            subtree,
+            (tasks.id == subtree.c.id) & (tasks.user_id == subtree.c.user_id),
+        )
+        .where(*same_user)
+        .order_by(subtree.c.path)
+    )
+    result = await session.execute(stmt)
+    return result.all()
+
+
+async def get_task_ancestors(
+    session: AsyncSession, task_id: int, user_id: Optional[int] = None
+) -> List[DBTask]:
+    """
+    Fetches the parent chain of a task in one query, root first, without
+    the task itself. Empty for a root or a task that does not exist.
+    """
+    # Walk up the tree; with the `user_id`, only its partition is read
+    same_user = [] if user_id is None else [DBTask.user_id == user_id]
+    chain = (
+        select(
+            DBTask.parent_id.label("id"),
+            DBTask.user_id,
+            literal(1).label("distance"),
+        )
+        .where(DBTask.id == task_id, *same_user)
+        .cte("chain", recursive=True)
+    )
+    chain = chain.union_all(
+        select(DBTask.parent_id, DBTask.user_id, chain.c.distance + 1)
+        .join(
+            chain,
+            (DBTask.id == chain.c.id) & (DBTask.user_id == chain.c.user_id),
+        )
+        .where(*same_user)
+    )
+    stmt = (
+        _flat_tasks()
+        .join(
+            chain,
+            (DBTask.id == chain.c.id) & (DBTask.user_id == chain.c.user_id),
+        )
+        .where(*same_user)
+        .order_by(chain.c.distance.desc())
+    )
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def get_upcoming_tasks(
+    session: AsyncSession,
+    start: datetime,
+    end: datetime,
+    limit: int,
+    after_start: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    statuses: Optional[Sequence[TaskStatus]] = None,
+) -> List[DBTask]:
+    """
+    Fetches tasks whose execution starts in [start, end), ordered by start
+    time and id, optionally only those in `statuses`. Pass the start time
+    and id of the last task of a page as `after_start` and `after_id` to
+    get the next one.
+    """
+    stmt = _flat_tasks().where(
+        DBTask.start_time_execution >= start,
+        DBTask.start_time_execution < end,
+    )
+    stmt = _with_statuses(stmt, DBTask, statuses)
+    if after_start is not None and after_id is not None:
+        stmt = stmt.where(
+            tuple_(DBTask.start_time_execution, DBTask.id)
+            > tuple_(after_start, after_id)
+        )
+    stmt = stmt.order_by(DBTask.start_time_execution, DBTask.id).limit(limit)
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def get_changed_tasks(
+    session: AsyncSession,
+    since: datetime,
+    limit: int,
+    after_id: Optional[int] = None,
+) -> List[DBTask]:
+    """
+    Fetches tasks updated at or after `since`, ordered by update time and
+    id. Pass the update time and id of the last task of a page as `since`
+    and `after_id` to get the next one.
+    """
+    if after_id is None:
+        stmt = _flat_tasks().where(DBTask.updated_at >= since)
+    else:
+        stmt = _flat_tasks().where(
+            tuple_(DBTask.updated_at, DBTask.id) > tuple_(since, after_id)
+        )
+    stmt = stmt.order_by(DBTask.updated_at, DBTask.id).limit(limit)
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def get_deleted_tasks(
+    session: AsyncSession,
+    since: datetime,
+    limit: int,
+    after_id: Optional[int] = None,
+) -> List[TaskTombstone]:
+    """
+    Fetches the tombstones of tasks of all users deleted or archived at or
+    after `since`, ordered by deletion time and id. Pages are chained like
+    in get_changed_tasks.
+    """
+    if after_id is None:
+        stmt = select(TaskTombstone).where(TaskTombstone.deleted_at >= since)
+    else:
+        stmt = select(TaskTombstone).where(
+            tuple_(TaskTombstone.deleted_at, TaskTombstone.id)
+            > tuple_(since, after_id)
+        )
+    stmt = stmt.order_by(TaskTombstone.deleted_at, TaskTombstone.id).limit(
+        limit
+    )
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+class TaskChangesPage(NamedTuple):
+    tasks: List[DBTask]
+    deleted: List[int]
+    # (change_txid, change_seq) to pass as `after` for the next page
+    cursor: Tuple[int, int]
+    has_more: bool
+
+
+async def get_task_changes(
+    session: AsyncSession,
+    user_id: int,
+    after: Optional[Tuple[int, int]],
+    limit: int,
+) -> TaskChangesPage:
+    """
+    Fetches the tasks of a user written after the feed position `after`,
+    and the ids of those deleted, ordered by (change_txid, change_seq).
+    Without `after`, every task of the user is returned.
+
+    Sequence values are taken before commit, so a lower one can become
+    visible after a higher one. Only writes of transactions older than the
+    oldest one still running are returned: none of those can commit later,
+    so the returned cursor never skips a change. A long transaction delays
+    the feed, but does not break it.
+    """
+    horizon = await session.scalar(
+        select(
+            cast(
+                cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text),
+                BigInteger,
+            )
+        )
+    )
+
+    def position(table):
+        return tuple_(table.change_txid, table.change_seq)
+
+    def changes(table, deleted: bool):
+        stmt = select(
+            table.id,
+            table.change_txid,
+            table.change_seq,
+            literal(deleted).label("deleted"),
+        ).where(table.user_id == user_id, table.change_txid < horizon)
+        if after is not None:
+            stmt = stmt.where(position(table) > tuple_(*after))
+        return stmt
+
+    feed = union_all(
+        changes(DBTask, False), changes(TaskTombstone, True)
+    ).subquery("feed")
+    # One more row than asked tells if there is a next page
+    rows = (
+        await session.execute(
+            select(feed)
+            .order_by(feed.c.change_txid, feed.c.change_seq)
+            .limit(limit + 1)
+        )
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    task_ids = [row.id for row in rows if not row.deleted]
+    tasks = []
+    if task_ids:
+        result = await session.execute(
+            _flat_tasks()
+            .where(DBTask.user_id == user_id, DBTask.id.in_(task_ids))
+            .order_by(DBTask.change_txid, DBTask.change_seq)
+        )
+        tasks = result.scalars().all()
+    # Past the last row of a full page, or else past every transaction
+    # that has finished
+    if has_more:
+        cursor = (rows[-1].change_txid, rows[-1].change_seq)
+    else:
+        cursor = (horizon, 0)
+    return TaskChangesPage(
+        tasks=tasks,
+        deleted=[row.id for row in rows if row.deleted],
+        cursor=cursor,
+        has_more=has_more,
+    )
+
+
 # --- CREATE operation ---
 async def create_task_in_db(session: AsyncSession, task: TaskCreate) -> DBTask:
     """Creates a new task using the mapper."""
-    db_task = pydantic_to_db_task(task)
+    db_task = await pydantic_to_db_task(task)
     session.add(db_task)
     await session.commit()
     await session.refresh(db_task)
     return db_task
 
 
+async def create_task_tree_in_db(
+    session: AsyncSession, tree: TaskTreeCreate
+) -> DBTask | None:
+    """
+    Creates a task together with its whole subtree in one transaction.
+    Returns None if the requested parent task does not exist.
+    """
+    level = tree.level
+    if tree.parent_id is not None:
+        # The parent has to belong to the same user
+        result = await session.execute(
+            select(DBTask.level).where(
+                DBTask.id == tree.parent_id, DBTask.user_id == tree.user_id
+            )
+        )
+        parent_level = result.scalar_one_or_none()
+        if parent_level is None:
+            return None
+        level = parent_level + 1
+
+    (db_task,) = await tree_to_db_tasks(
+        [tree], user_id=tree.user_id, level=level
+    )
+    db_task.parent_id = tree.parent_id
+    session.add(db_task)
+    await session.commit()
+    return db_task
+
+
+async def insert_subtree_in_db(
+    session: AsyncSession,
+    task_id: int,
+    tree: TaskTreeNode,
+    user_id: Optional[int] = None,
+) -> DBTask | None:
+    """
+    Updates an existing task with the fields set on the root of `tree` and
+    inserts the subtasks of `tree` under it, all in one transaction.
+
+    Raises:
+        SubtasksExistError: If the task already has subtasks, e.g. when it
+            was decomposed before.
+    """
+    # Lock the task, so that concurrent calls can not both find it without
+    # subtasks
+    stmt = select(DBTask.id).where(DBTask.id == task_id).with_for_update()
+    if user_id is not None:
+        stmt = stmt.where(DBTask.user_id == user_id)
+    await session.execute(stmt)
+
+    db_task = await get_task_by_id(session, task_id, user_id)
+    if not db_task:
+        return None
+    if db_task.subtasks:
+        await session.rollback()
+        raise SubtasksExistError(task_id)
+
+    # The position of the task in its own tree is not changed here
+    update_data = tree.model_dump(
+        exclude={"subtasks", "parent_id", "level"}, exclude_unset=True
+    )
+    for key, value in update_data.items():
+        setattr(db_task, key, value)
+
+    db_task.subtasks.extend(
+        await tree_to_db_tasks(
+            tree.subtasks, user_id=db_task.user_id, level=db_task.level + 1
+        )
+    )
+
+    await session.commit()
+    return db_task
+
+
 # --- UPDATE operation ---
 async def update_task_in_db(
-    session: AsyncSession, task_id: int, task_update: TaskUpdate
+    session: AsyncSession,
+    task_id: int,
+    task_update: TaskUpdate,
+    user_id: Optional[int] = None,
 ) -> DBTask | None:
     """Updates a task's attributes."""
-    db_task = await get_task_by_id(session, task_id)
+    db_task = await get_task_by_id(session, task_id, user_id)
     if not db_task:
         return None
 
@@ -97,9 +546,11 @@ async def update_task_in_db(
 
 
 # --- DELETE operation ---
-async def delete_task_in_db(session: AsyncSession, task_id: int) -> bool:
+async def delete_task_in_db(
+    session: AsyncSession, task_id: int, user_id: Optional[int] = None
+) -> bool:
     """Deletes a task by its ID."""
-    db_task = await get_task_by_id(session, task_id)
+    db_task = await get_task_by_id(session, task_id, user_id)
     if db_task:
         await session.delete(db_task)
         await session.commit()
@@ -107,6 +558,55 @@ async def delete_task_in_db(session: AsyncSession, task_id: int) -> bool:
     return False
 
 
+# --- ARCHIVE operation ---
+async def archive_finished_tasks(
+    session: AsyncSession, before: datetime, batch_size: int
+) -> int:
+    """
+    Moves up to `batch_size` finished tasks last updated before `before`
+    to the archive, in one statement, and returns how many were moved.
+
+    Only tasks without subtasks left in `tasks` are moved, so the subtasks
+    never lose their parent: a finished tree is archived from its leaves
+    up, over successive batches. Rows locked by another run are skipped.
+    Moved tasks keep counting in the rollups of their ancestors.
+    """
+    # Read by the tasks_track_rollups trigger function, until commit
+    await session.execute(
+        select(func.set_config("tasks.archiving", "on", True))
+    )
+    tasks = DBTask.__table__
+    child = tasks.alias("child")
+    candidates = (
+        select(tasks.c.id, tasks.c.user_id)
+        .where(
+            tasks.c.status.in_(FINISHED_STATUSES),
+            tasks.c.updated_at < before,
+            ~exists().where(
+                child.c.parent_id == tasks.c.id,
+                child.c.user_id == tasks.c.user_id,
+            ),
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .correlate(None)
+    )
+    moved = (
+        delete(tasks)
+        .where(tuple_(tasks.c.id, tasks.c.user_id).in_(candidates))
+        .returning(*tasks.c)
+        .cte("moved")
+    )
+    columns = [column.name for column in tasks.columns]
+    result = await session.execute(
+        insert(ArchivedTask.__table__).from_select(
+            columns, select(*(moved.c[name] for name in columns))
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+
 # --- SEARCH (Future) ---
 async def search_similar_tasks(
     session: AsyncSession,
@@ -114,6 +614,7 @@ async def search_similar_tasks(
     query: str,
     limit: int = 5,
     max_distance: Optional[float] = None,
+    statuses: Optional[Sequence[TaskStatus]] = None,
 ) -> List[DBTask]:
     """
     Searches for tasks with similar embeddings based on a given query string,
@@ -126,11 +627,12 @@ async def search_similar_tasks(
         limit (int): The maximum number of similar tasks to return.
         max_distance (Optional[float]): The maximum L2 distance allowed for a task to be considered similar.
                                        If None, no distance constraint is applied.
+        statuses (Optional[Sequence[TaskStatus]]): Only search tasks in these statuses.
 
     Returns:
         List[DBTask]: A list of similar tasks, ordered by similarity and within the distance constraint.
     """
-    query_embedding = generate_embedding(query)
+    query_embedding = await generate_embedding(query)
 
     # Вычисляем расстояние и используем его для фильтрации
     distance_column = DBTask.embedding.l2_distance(query_embedding)
@@ -142,6 +644,7 @@ async def search_similar_tasks(
 
     if max_distance is not None:
         stmt = stmt.where(distance_column <= max_distance)
+    stmt = _with_statuses(stmt, DBTask, statuses)
 
     stmt = stmt.order_by(distance_column).limit(limit)
 
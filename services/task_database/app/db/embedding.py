@@ -1,21 +1,135 @@
-from typing import List
+import asyncio
+from typing import List, Optional
 
-from sentence_transformers import SentenceTransformer
+import httpx
+from core_lib.instrumentation import histogram
+from core_lib.tracing import TracingTransport, start_span
+from core_lib.wire import ACCEPT_HEADERS, decode_response
+
+from ..core.batching import MicroBatcher
+from ..core.config import settings
 
 EMBEDDING_SIZE = 384
-try:
-    _embedding_model = SentenceTransformer(
-        "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-    )
-except ImportError:
-    raise ImportError(
-        "Please install sentence-transformers: pip install sentence-transformers"
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+EMBEDDING_BATCH_SIZE = histogram(
+    "embedding_batch_size",
+    "Number of texts encoded in one call to the embedding model.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+EMBEDDING_SECONDS = histogram(
+    "embedding_duration_seconds",
+    "Time to encode one batch of texts with the embedding model.",
+)
+
+_client: Optional[httpx.AsyncClient] = None
+_local_batcher: Optional[MicroBatcher[str, List[float]]] = None
+_local_lock = asyncio.Lock()
+
+
+class EmbeddingServiceError(RuntimeError):
+    """The embedding service could not be reached or failed to answer."""
+
+
+def load_model():
+    """Loads the SentenceTransformer model; takes seconds and ~500 MB."""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        raise ImportError(
+            "Please install sentence-transformers: pip install sentence-transformers"
+        )
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def create_batcher(model) -> MicroBatcher[str, List[float]]:
+    """A MicroBatcher encoding the texts of concurrent calls together."""
+
+    def encode(texts: List[str]) -> List[List[float]]:
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        with EMBEDDING_SECONDS.time():
+            embeddings = model.encode(
+                texts, batch_size=len(texts), convert_to_numpy=True
+            )
+        return embeddings.tolist()
+
+    return MicroBatcher(
+        encode,
+        window=settings.EMBEDDING_BATCH_WINDOW_MS / 1000,
+        max_batch=settings.EMBEDDING_MAX_BATCH,
     )
 
 
-def generate_embedding(text: str) -> List[float]:
+async def load_local_model() -> None:
+    """
+    Loads the model of this process without blocking the event loop. Only
+    for development without an embedding service: every worker then holds
+    its own copy of the model. Called at startup; requests that come first
+    wait for it.
+    """
+    global _local_batcher
+    async with _local_lock:
+        if _local_batcher is None:
+            _local_batcher = create_batcher(await asyncio.to_thread(load_model))
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=settings.EMBEDDING_SERVICE_URL,
+            transport=TracingTransport(),
+            headers=ACCEPT_HEADERS,
+            timeout=settings.EMBEDDING_TIMEOUT,
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def generate_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Generates embeddings for many texts.
+
+    Texts are sent to the embedding service at EMBEDDING_SERVICE_URL, which
+    encodes them in one batch with those of concurrent requests. Without
+    it, they are batched the same way by a model loaded in this process,
+    which is for development only.
+
+    Args:
+        texts (List[str]): The input texts to embed.
+
+    Returns:
+        List[List[float]]: One dense vector per input text, in input order.
+
+    Raises:
+        EmbeddingServiceError: If the embedding service is unavailable.
+    """
+    if not texts:
+        return []
+    with start_span("embedding", require_parent=True, batch_size=len(texts)):
+        if not settings.EMBEDDING_SERVICE_URL:
+            if _local_batcher is None:
+                await load_local_model()
+            return await _local_batcher.submit(texts)
+        try:
+            response = await _get_client().post("/embed", json={"texts": texts})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise EmbeddingServiceError(
+                f"Embedding service failed: {e!r}"
+            ) from e
+        return decode_response(response)["embeddings"]
+
+
+async def generate_embedding(text: str) -> List[float]:
     """
-    Generates an embedding for the given text using a pre-trained SentenceTransformer model.
+    Generates an embedding for the given text, see generate_embeddings.
 
     Args:
         text (str): The input text to embed.
@@ -23,5 +137,5 @@ def generate_embedding(text: str) -> List[float]:
     Returns:
         List[float]: The dense vector representation of the text.
     """
-    embedding = _embedding_model.encode(text, convert_to_numpy=True).tolist()
+    (embedding,) = await generate_embeddings([text])
     return embedding
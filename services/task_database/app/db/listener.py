@@ -0,0 +1,89 @@
+import asyncio
+import json
+from typing import Optional
+
+import asyncpg
+
+from ..core.events import RESYNC, EventBroker
+from ..core.logging_config import logger
+
+# Channel of the tasks_notify_changes trigger function, see models
+CHANNEL = "task_changes"
+# Raised when the database cannot be reached or the connection was lost
+CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresError,
+    asyncpg.InterfaceError,
+)
+
+
+class TaskChangeListener:
+    """
+    The one connection of the process that LISTENs to task changes, and
+    publishes them to a broker.
+
+    Postgres sends a notification per user and statement once the writing
+    transaction commits: {"op", "user_id", "count", "ids"}, where ids is
+    null for statements that changed more than 100 tasks of the user. The
+    connection is checked every `keepalive` seconds and reopened when lost;
+    subscribers then get a RESYNC, since notifications sent meanwhile are
+    gone.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        broker: EventBroker,
+        keepalive: float = 15.0,
+        retry_delay: float = 1.0,
+    ):
+        self.dsn = dsn
+        self.broker = broker
+        self.keepalive = keepalive
+        self.retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notification(self, connection, pid, channel, payload) -> None:
+        event = json.loads(payload)
+        self.broker.publish(event["user_id"], event)
+
+    async def _run(self) -> None:
+        connected_before = False
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except CONNECTION_ERRORS as e:
+                logger.warning("Cannot listen to task changes: %r", e)
+                await asyncio.sleep(self.retry_delay)
+                continue
+            try:
+                await connection.add_listener(CHANNEL, self._on_notification)
+                if connected_before:
+                    self.broker.publish_all(RESYNC)
+                connected_before = True
+                await self._watch(connection)
+            except CONNECTION_ERRORS as e:
+                logger.warning("Lost the task changes connection: %r", e)
+            finally:
+                connection.terminate()
+            await asyncio.sleep(self.retry_delay)
+
+    async def _watch(self, connection: asyncpg.Connection) -> None:
+        """Returns or raises once the connection is lost."""
+        while not connection.is_closed():
+            await asyncio.sleep(self.keepalive)
+            # An idle connection would not notice a dead peer by itself
+            await connection.execute("SELECT 1", timeout=self.keepalive)
@@ -1,19 +1,37 @@
-from core_lib.models.task import TaskCreate
+from datetime import timedelta
+from typing import List, Optional
 
-from .embedding import generate_embedding
+from core_lib.models.task import (
+    MAX_TASK_LEVEL,
+    TaskBase,
+    TaskCreate,
+    TaskDashboard,
+    TaskProgress,
+    TaskStatus,
+    TaskTreeNode,
+)
+
+from .embedding import generate_embedding, generate_embeddings
 from .models import Task as DBTask
 
 
-def pydantic_to_db_task(task: TaskCreate) -> DBTask:
+def task_embedding_text(task: TaskBase) -> str:
+    """Builds the text that is embedded for semantic search of a task."""
+    return f"{task.title}\n{task.description}\n{task.tags}"
+
+
+async def pydantic_to_db_task(
+    task: TaskCreate, embedding: Optional[List[float]] = None
+) -> DBTask:
     """
     Converts a Pydantic TaskCreate model to a SQLAlchemy DBTask model.
     This is where future logic like text embedding can be centralized.
+    A precomputed embedding can be passed in to skip encoding the task here.
     """
     # Create the DB model instance
     # db_instance = DBTask(**task.model_dump())
-    embedding = generate_embedding(
-        f"{task.title}\n{task.description}\n{task.tags}"
-    )
+    if embedding is None:
+        embedding = await generate_embedding(task_embedding_text(task))
 
     db_instance = DBTask(
         title=task.title,
@@ -24,8 +42,9 @@ def pydantic_to_db_task(task: TaskCreate) -> DBTask:
         level=task.level,
         user_id=task.user_id,
         parent_id=task.parent_id,
+        status=task.status,
         embedding=embedding,
-        # estimated_duration=task.estimated_duration,
+        estimated_duration=task.estimated_duration,
         start_time_execution=task.start_time_execution,
         deadline=task.deadline,
     )
@@ -33,3 +52,118 @@ def pydantic_to_db_task(task: TaskCreate) -> DBTask:
     # Placeholder for future logic
 
     return db_instance
+
+
+async def tree_to_db_tasks(
+    nodes: List[TaskTreeNode], user_id: int, level: int
+) -> List[DBTask]:
+    """
+    Converts Pydantic task trees to trees of SQLAlchemy DBTask models.
+
+    All nodes are embedded in one call to generate_embeddings. Levels are
+    derived from the position in the tree, and parent ids of nested nodes
+    are left to the ORM, which resolves them through the `subtasks`
+    relationship on flush.
+
+    Args:
+        nodes (List[TaskTreeNode]): The roots of the trees to convert.
+        user_id (int): The owner of every created task.
+        level (int): The level of the given roots.
+
+    Returns:
+        List[DBTask]: The converted roots, in input order.
+
+    Raises:
+        ValueError: If a node would be nested deeper than MAX_TASK_LEVEL.
+    """
+    # Walk the trees iteratively in depth-first order
+    ordered = []
+    stack = [(node, level) for node in reversed(nodes)]
+    while stack:
+        node, node_level = stack.pop()
+        if node_level > MAX_TASK_LEVEL:
+            raise ValueError(
+                f"Task tree is deeper than the maximum level {MAX_TASK_LEVEL}"
+            )
+        ordered.append((node, node_level))
+        stack.extend(
+            (child, node_level + 1) for child in reversed(node.subtasks)
+        )
+
+    embeddings = await generate_embeddings(
+        [task_embedding_text(node) for node, _ in ordered]
+    )
+
+    db_tasks = {}
+    for (node, node_level), embedding in zip(ordered, embeddings):
+        db_tasks[id(node)] = DBTask(
+            title=node.title,
+            description=node.description,
+            complexity=node.complexity,
+            priority=node.priority,
+            tags=node.tags,
+            level=node_level,
+            status=node.status,
+            user_id=user_id,
+            embedding=embedding,
+            estimated_duration=node.estimated_duration,
+            start_time_execution=node.start_time_execution,
+            deadline=node.deadline,
+            subtasks=[],
+        )
+    for node, _ in ordered:
+        db_tasks[id(node)].subtasks = [
+            db_tasks[id(child)] for child in node.subtasks
+        ]
+
+    return [db_tasks[id(node)] for node in nodes]
+
+
+def _completion(completed: int, total: int) -> float:
+    return completed / total if total else 0.0
+
+
+def db_task_to_progress(db_task: DBTask) -> TaskProgress:
+    """
+    Reads the progress of a task tree from the rollup columns of its root,
+    without loading the subtree.
+    """
+    total = 1 + db_task.descendant_count
+    completed = (
+        db_task.status == TaskStatus.COMPLETED
+    ) + db_task.completed_descendant_count
+    deadlines = [
+        deadline
+        for deadline in (db_task.deadline, db_task.descendant_max_deadline)
+        if deadline is not None
+    ]
+    return TaskProgress(
+        id=db_task.id,
+        title=db_task.title,
+        status=db_task.status,
+        total_tasks=total,
+        completed_tasks=completed,
+        completion=_completion(completed, total),
+        estimated_duration=(db_task.estimated_duration or timedelta())
+        + db_task.descendant_estimated_duration,
+        deadline=max(deadlines, default=None),
+    )
+
+
+def db_roots_to_dashboard(
+    user_id: int, db_roots: List[DBTask]
+) -> TaskDashboard:
+    """Builds the dashboard of a user from the roots of their task trees."""
+    trees = [db_task_to_progress(db_root) for db_root in db_roots]
+    total = sum(tree.total_tasks for tree in trees)
+    completed = sum(tree.completed_tasks for tree in trees)
+    return TaskDashboard(
+        user_id=user_id,
+        trees=trees,
+        total_tasks=total,
+        completed_tasks=completed,
+        completion=_completion(completed, total),
+        estimated_duration=sum(
+            (tree.estimated_duration for tree in trees), timedelta()
+        ),
+    )
@@ -1,16 +1,24 @@
-import enum
 from datetime import datetime
 
+from core_lib.models.task import ACTIVE_STATUSES, FINISHED_STATUSES, TaskStatus
 from pgvector.sqlalchemy import Vector
 from sqlalchemy import (
+    DDL,
+    BigInteger,
     Column,
     DateTime,
     Float,
-    ForeignKey,
+    ForeignKeyConstraint,
+    Index,
+    FetchedValue,
     Integer,
     Interval,
+    Sequence,
     String,
+    Table,
     Text,
+    event,
+    func,
 )
 from sqlalchemy import Enum as SAEnum
 from sqlalchemy.dialects.postgresql import JSONB
@@ -19,24 +27,38 @@ from sqlalchemy.orm import declarative_base, relationship
 # from .embedding import EMBEDDING_SIZE
 
 EMBEDDING_SIZE = 384
+# Tasks are hash partitioned by user: the queries of a user read a single
+# partition, with its own indexes. Changing it requires a migration.
+TASK_PARTITIONS = 16
 
 
 Base = declarative_base()
 
-
-class TaskStatus(str, enum.Enum):
-    PENDING = "pending"
-    IN_PROGRESS = "in_progress"
-    COMPLETED = "completed"
-    FAILED = "failed"
-    CANCELLED = "cancelled"
+# Orders the writes to tasks for the change feed, see TRACK_CHANGES
+task_change_seq = Sequence("task_change_seq", metadata=Base.metadata)
 
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # A subtask belongs to the user of its parent; the key has to
+        # include the partition key
+        ForeignKeyConstraint(
+            ["parent_id", "user_id"], ["tasks.id", "tasks.user_id"]
+        ),
+        Index("ix_tasks_user_id_created_at", "user_id", "created_at"),
+        Index(
+            "ix_tasks_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_ops={"embedding": "vector_l2_ops"},
+        ),
+        {"postgresql_partition_by": "HASH (user_id)"},
+    )
 
     # Core Fields
-    id = Column(Integer, primary_key=True)
+    # Unique through the sequence; the primary key is (id, user_id)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     status = Column(
@@ -44,7 +66,7 @@ class Task(Base):
     )
 
     # Tree Structure
-    parent_id = Column(Integer, ForeignKey("tasks.id"), nullable=True)
+    parent_id = Column(Integer, nullable=True, index=True)
 
     # Defines the "one-to-many" relationship for subtasks.
     # When a parent task is deleted, all its subtasks are also deleted due to the cascade.
@@ -57,7 +79,11 @@ class Task(Base):
 
     # Defines the "many-to-one" relationship for the parent.
     # remote_side is required for self-referential relationships.
-    parent = relationship("Task", back_populates="subtasks", remote_side=[id])
+    parent = relationship(
+        "Task",
+        back_populates="subtasks",
+        remote_side="[Task.id, Task.user_id]",
+    )
 
     # AI-Generated Fields
     complexity = Column(Float, default=0.0)
@@ -65,9 +91,8 @@ class Task(Base):
     tags = Column(JSONB, default=list)
     level = Column(Integer, nullable=False, default=0)
 
-    # Multi-tenancy - each task belongs to a user
-    # user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    user_id = Column(Integer, nullable=True, default=0)
+    # Multi-tenancy - each task belongs to a user, and the partition key
+    user_id = Column(Integer, primary_key=True)
 
     # Vector for semantic search
     embedding = Column(
@@ -77,12 +102,449 @@ class Task(Base):
     # Timestamps
     deadline = Column(DateTime(timezone=True), default=datetime.utcnow)
     start_time_execution = Column(
-        DateTime(timezone=True), default=datetime.utcnow
+        DateTime(timezone=True), default=datetime.utcnow, index=True
     )
-    estimated_duraction = Column(Interval, nullable=True)
+    estimated_duration = Column(Interval, nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(
         DateTime(timezone=True),
         default=datetime.utcnow,
         onupdate=datetime.utcnow,
+        index=True,
+    )
+
+    # Position in the change feed: the transaction of the last write and
+    # the order of that write, both set by the tasks_track_changes trigger
+    # function
+    change_txid = Column(
+        BigInteger,
+        nullable=False,
+        server_default=FetchedValue(),
+        server_onupdate=FetchedValue(),
+    )
+    change_seq = Column(
+        BigInteger,
+        nullable=False,
+        server_default=FetchedValue(),
+        server_onupdate=FetchedValue(),
+    )
+
+    # Rollups of the subtree below the task, kept up to date by the
+    # tasks_track_rollups trigger function: the number of descendants, of
+    # completed ones, the sum of their estimated durations and their latest
+    # deadline. Archived descendants keep counting.
+    descendant_count = Column(Integer, nullable=False, server_default="0")
+    completed_descendant_count = Column(
+        Integer, nullable=False, server_default="0"
+    )
+    descendant_estimated_duration = Column(
+        Interval, nullable=False, server_default="0"
+    )
+    descendant_max_deadline = Column(DateTime(timezone=True), nullable=True)
+
+
+# Reads the change feed of a user from where its cursor stopped
+Index(
+    "ix_tasks_user_id_change_txid_change_seq",
+    Task.user_id,
+    Task.change_txid,
+    Task.change_seq,
+)
+
+# Partial indexes cover only the tasks of the hot paths, so they stay small
+# however many finished tasks pile up. Queries use them when they filter on
+# a subset of the same statuses.
+Index(
+    "ix_tasks_active_user_id_priority",
+    Task.user_id,
+    Task.priority.desc(),
+    Task.deadline,
+    postgresql_where=Task.status.in_(ACTIVE_STATUSES),
+)
+Index(
+    "ix_tasks_active_start_time_execution",
+    Task.start_time_execution,
+    Task.id,
+    postgresql_where=Task.status.in_(ACTIVE_STATUSES),
+)
+# Reads the trees of a user, for the dashboard
+Index(
+    "ix_tasks_roots_user_id_created_at",
+    Task.user_id,
+    Task.created_at,
+    postgresql_where=Task.parent_id.is_(None),
+)
+# Finds the candidates of the archival job
+Index(
+    "ix_tasks_finished_updated_at",
+    Task.updated_at,
+    postgresql_where=Task.status.in_(FINISHED_STATUSES),
+)
+
+
+class ArchivedTask(Base):
+    """
+    A finished task moved out of `tasks` by app.archive_job. Same columns,
+    without defaults, the hot path indexes and partitions; rows keep their
+    id and parent_id, which may point to a task that is still in `tasks`.
+    """
+
+    __table__ = Table(
+        "tasks_archive",
+        Base.metadata,
+        *(
+            Column(
+                column.name,
+                column.type,
+                primary_key=column.primary_key,
+                nullable=column.nullable,
+                autoincrement=False,
+            )
+            for column in Task.__table__.columns
+        ),
+        Column(
+            "archived_at",
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),
+        ),
+        Index("ix_tasks_archive_user_id_created_at", "user_id", "created_at"),
+        Index("ix_tasks_archive_parent_id", "parent_id"),
+    )
+
+
+class TaskTombstone(Base):
+    """
+    A deleted (or archived) task, so that the change feed can tell clients
+    to drop it. Written by the tasks_track_changes trigger function.
+    """
+
+    __tablename__ = "task_tombstones"
+    __table_args__ = (
+        Index(
+            "ix_task_tombstones_user_id_change_txid_change_seq",
+            "user_id",
+            "change_txid",
+            "change_seq",
+        ),
+        # Deletions of all users, for the reminders of the notifier
+        Index("ix_task_tombstones_deleted_at_id", "deleted_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    change_txid = Column(BigInteger, nullable=False)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+# Stamps every write to tasks with its transaction id and the next value of
+# task_change_seq, and leaves a tombstone for every delete. The transaction
+# id lets readers of the feed wait for transactions that took a lower
+# sequence value but have not committed yet, see crud.get_task_changes.
+# Updates of the rollups alone are not stamped, see ROLLUP_FUNCTIONS.
+# Keep in sync with the migrations.
+TRACK_CHANGES = """
+CREATE OR REPLACE FUNCTION tasks_track_changes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND current_setting('tasks.rolling_up', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO task_tombstones (id, user_id, change_txid, change_seq)
+        VALUES (
+            OLD.id, OLD.user_id,
+            pg_current_xact_id()::text::bigint, nextval('task_change_seq')
+        );
+        RETURN OLD;
+    END IF;
+    NEW.change_txid := pg_current_xact_id()::text::bigint;
+    NEW.change_seq := nextval('task_change_seq');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+event.listen(Task.__table__, "before_create", DDL(TRACK_CHANGES))
+event.listen(
+    Task.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER tasks_track_writes BEFORE INSERT OR UPDATE ON tasks "
+        "FOR EACH ROW EXECUTE FUNCTION tasks_track_changes()"
+    ),
+)
+event.listen(
+    Task.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER tasks_track_deletes AFTER DELETE ON tasks "
+        "FOR EACH ROW EXECUTE FUNCTION tasks_track_changes()"
+    ),
+)
+
+# Notifies the listeners of the "task_changes" channel of every statement
+# writing tasks, once per user, when its transaction commits; read by
+# app.db.listener, except the updates of the rollups. Keep in sync with the
+# migrations.
+NOTIFY_CHANGES = """
+CREATE OR REPLACE FUNCTION tasks_notify_changes() RETURNS trigger AS $$
+BEGIN
+    -- Updates of the rollups alone, see ROLLUP_FUNCTIONS
+    IF current_setting('tasks.rolling_up', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('task_changes', json_build_object(
+        'op', TG_OP,
+        'user_id', user_id,
+        'count', count(*),
+        'ids', CASE WHEN count(*) <= 100 THEN array_agg(id ORDER BY id) END
+    )::text)
+    FROM changed
+    GROUP BY user_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+event.listen(Task.__table__, "before_create", DDL(NOTIFY_CHANGES))
+for operation, transition in (
+    ("INSERT", "NEW"),
+    ("UPDATE", "NEW"),
+    ("DELETE", "OLD"),
+):
+    event.listen(
+        Task.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TRIGGER tasks_notify_{operation.lower()}s "
+            f"AFTER {operation} ON tasks "
+            f"REFERENCING {transition} TABLE AS changed "
+            "FOR EACH STATEMENT EXECUTE FUNCTION tasks_notify_changes()"
+        ),
+    )
+
+# Maintain the rollup columns of tasks. Every statement hands what it
+# changed to tasks_apply_rollups, which walks the ancestors of all changes
+# at once and updates each ancestor once. Sums are updated by their
+# difference; the latest deadline is raised in place, and recomputed from
+# the children, bottom-up, only where the latest one may have left. The
+# archive job sets tasks.archiving so that moving tasks out does not count
+# as deleting them. Keep in sync with the migration.
+ROLLUP_FUNCTIONS = (
+    # The contribution of the subtree of `t` to each of its ancestors,
+    # taken back if `sign` is -1
+    """
+CREATE OR REPLACE FUNCTION tasks_rollup(t tasks, sign integer)
+RETURNS jsonb AS $$
+    SELECT jsonb_build_object(
+        'parent_id', t.parent_id,
+        'user_id', t.user_id,
+        'tasks', sign * (1 + t.descendant_count),
+        'completed', sign * (
+            (t.status = 'COMPLETED')::integer + t.completed_descendant_count
+        ),
+        'duration', sign * (
+            coalesce(t.estimated_duration, interval '0')
+            + t.descendant_estimated_duration
+        ),
+        CASE WHEN sign > 0 THEN 'raised' ELSE 'lowered' END,
+        greatest(t.deadline, t.descendant_max_deadline)
+    )
+$$ LANGUAGE sql STABLE
+""",
+    # Each change adds its sums to every current ancestor of `parent_id`.
+    # `raised` is a deadline now in their subtrees, `lowered` one that was,
+    # and `recompute` asks for their latest deadline to be recomputed.
+    """
+CREATE OR REPLACE FUNCTION tasks_apply_rollups(changes jsonb)
+RETURNS void AS $$
+DECLARE
+    stale_ancestors integer[];
+    ancestor integer[];
+BEGIN
+    -- Read by tasks_track_changes: rollups are not sent by the change feed
+    PERFORM set_config('tasks.rolling_up', 'on', true);
+    WITH RECURSIVE change AS (
+        SELECT * FROM jsonb_to_recordset(changes) AS c(
+            parent_id integer, user_id integer,
+            tasks integer, completed integer, duration interval,
+            raised timestamptz, lowered timestamptz, recompute boolean
+        )
+        WHERE c.parent_id IS NOT NULL
+    ), up AS (
+        SELECT
+            parent_id AS id, user_id, 1 AS distance, tasks, completed,
+            duration, raised, lowered, coalesce(recompute, false) AS recompute
+        FROM change
+        UNION ALL
+        SELECT
+            t.parent_id, up.user_id, up.distance + 1,
+            up.tasks, up.completed, up.duration,
+            up.raised, up.lowered, up.recompute
+        FROM up
+        JOIN tasks t ON t.id = up.id AND t.user_id = up.user_id
+        -- Bounds the walk should a cycle ever be written
+        WHERE t.parent_id IS NOT NULL AND up.distance <= 100
+    ), rolled AS (
+        SELECT
+            id, user_id,
+            sum(tasks) AS tasks,
+            sum(completed) AS completed,
+            sum(duration) AS duration,
+            max(raised) AS raised,
+            max(lowered) AS lowered,
+            bool_or(recompute) AS recompute,
+            max(distance) AS distance
+        FROM up
+        GROUP BY id, user_id
+    ), updated AS (
+        UPDATE tasks t SET
+            descendant_count = t.descendant_count + r.tasks,
+            completed_descendant_count =
+                t.completed_descendant_count + r.completed,
+            descendant_estimated_duration =
+                t.descendant_estimated_duration + r.duration,
+            descendant_max_deadline =
+                greatest(t.descendant_max_deadline, r.raised)
+        FROM rolled r
+        WHERE t.id = r.id AND t.user_id = r.user_id
+        RETURNING t.id, t.user_id, r.distance, r.recompute OR coalesce(
+            r.lowered >= t.descendant_max_deadline
+            AND r.lowered > coalesce(r.raised, '-infinity'),
+            false
+        ) AS stale
+    )
+    SELECT array_agg(ARRAY[id, user_id] ORDER BY distance)
+        FILTER (WHERE stale)
+    INTO stale_ancestors
+    FROM updated;
+
+    -- Closest ancestors first, so that each reads up to date children.
+    -- Archived children keep their rollups, and keep counting.
+    IF stale_ancestors IS NOT NULL THEN
+        FOREACH ancestor SLICE 1 IN ARRAY stale_ancestors LOOP
+            UPDATE tasks t SET descendant_max_deadline = (
+                SELECT max(greatest(c.deadline, c.descendant_max_deadline))
+                FROM (
+                    SELECT deadline, descendant_max_deadline
+                    FROM tasks
+                    WHERE parent_id = ancestor[1] AND user_id = ancestor[2]
+                    UNION ALL
+                    SELECT deadline, descendant_max_deadline
+                    FROM tasks_archive
+                    WHERE parent_id = ancestor[1] AND user_id = ancestor[2]
+                ) c
+            )
+            WHERE t.id = ancestor[1] AND t.user_id = ancestor[2];
+        END LOOP;
+    END IF;
+    PERFORM set_config('tasks.rolling_up', 'off', true);
+END
+$$ LANGUAGE plpgsql
+-- The number of changes is unknown to the planner, which would rather scan
+-- every partition than look the ancestors up one by one
+SET enable_hashjoin = off
+SET enable_mergejoin = off
+""",
+    """
+CREATE OR REPLACE FUNCTION tasks_track_rollups() RETURNS trigger AS $$
+DECLARE
+    changes jsonb;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT jsonb_agg(tasks_rollup(n, 1)) INTO changes
+        FROM new_rows n
+        WHERE n.parent_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF current_setting('tasks.archiving', true) = 'on' THEN
+            RETURN NULL;
+        END IF;
+        -- A subtree deleted with its root is taken back once, at the root
+        SELECT jsonb_agg(tasks_rollup(o, -1)) INTO changes
+        FROM old_rows o
+        WHERE o.parent_id IS NOT NULL AND NOT EXISTS (
+            SELECT FROM old_rows p
+            WHERE p.id = o.parent_id AND p.user_id = o.user_id
+        );
+    ELSE
+        -- A moved task takes its subtree from its old parent to the new one,
+        -- whose ancestors recompute their deadlines since subtasks may have
+        -- changed too. Both are walked up the tree as it is now: the subtree
+        -- of a task moved along has already been taken to its new place.
+        -- Otherwise only the columns of the task itself changed. Updates of
+        -- the rollups themselves change none of these columns, which ends
+        -- the recursion.
+        SELECT
+            coalesce(
+                jsonb_agg(tasks_rollup(o, -1)) FILTER (WHERE m.moved),
+                '[]'
+            ) || jsonb_agg(CASE WHEN m.moved
+                THEN tasks_rollup(n, 1) || '{"recompute": true}'
+                ELSE jsonb_build_object(
+                    'parent_id', n.parent_id,
+                    'user_id', n.user_id,
+                    'tasks', 0,
+                    'completed', (n.status = 'COMPLETED')::integer
+                        - (o.status = 'COMPLETED')::integer,
+                    'duration', coalesce(n.estimated_duration, interval '0')
+                        - coalesce(o.estimated_duration, interval '0'),
+                    'raised', CASE WHEN n.deadline IS DISTINCT FROM o.deadline
+                        THEN n.deadline END,
+                    'lowered', CASE WHEN n.deadline IS DISTINCT FROM o.deadline
+                        THEN o.deadline END
+                ) END)
+        INTO changes
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id AND n.user_id = o.user_id
+        CROSS JOIN LATERAL (
+            SELECT o.parent_id IS DISTINCT FROM n.parent_id AS moved
+        ) m
+        WHERE (o.parent_id, o.status, o.estimated_duration, o.deadline)
+            IS DISTINCT FROM
+            (n.parent_id, n.status, n.estimated_duration, n.deadline);
+    END IF;
+    IF changes IS NOT NULL THEN
+        PERFORM tasks_apply_rollups(changes);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+""",
+)
+# After the table: tasks_rollup takes its row type, and has to be dropped
+# before it
+for function in ROLLUP_FUNCTIONS:
+    event.listen(Task.__table__, "after_create", DDL(function))
+event.listen(
+    Task.__table__,
+    "before_drop",
+    DDL("DROP FUNCTION IF EXISTS tasks_rollup(tasks, integer)"),
+)
+for operation, transitions in (
+    ("INSERT", "NEW TABLE AS new_rows"),
+    ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ("DELETE", "OLD TABLE AS old_rows"),
+):
+    event.listen(
+        Task.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TRIGGER tasks_rollup_{operation.lower()}s "
+            f"AFTER {operation} ON tasks REFERENCING {transitions} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION tasks_track_rollups()"
+        ),
+    )
+
+# Partitions are created with the table, see also the migration
+for remainder in range(TASK_PARTITIONS):
+    event.listen(
+        Task.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TABLE tasks_p{remainder} PARTITION OF tasks "
+            f"FOR VALUES WITH (MODULUS {TASK_PARTITIONS}, "
+            f"REMAINDER {remainder})"
+        ),
     )
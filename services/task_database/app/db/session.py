@@ -1,11 +1,15 @@
 from app.core.config import settings
+from core_lib.instrumentation import instrument_engine
+from core_lib.tracing import trace_engine
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from .models import Base  # Import Base from our db models
 
 # Create an asynchronous engine to connect to the database
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(settings.DATABASE_URL, echo=settings.DB_ECHO)
+instrument_engine(engine)
+trace_engine(engine)
 
 # Create a factory for asynchronous sessions
 AsyncSessionLocal = sessionmaker(
@@ -0,0 +1,67 @@
+"""
+Embedding service shared by the task_database workers.
+
+Holds the only copy of the embedding model, so memory does not grow with
+the number of workers, and encodes the texts of concurrent requests in one
+batch. Run it with a single worker and point EMBEDDING_SERVICE_URL of
+task_database at it:
+
+    uvicorn app.embedding_server:app --port 8010 --workers 1
+"""
+
+import asyncio
+from typing import List
+
+from core_lib.instrumentation import gauge, instrument_app
+from core_lib.tracing import trace_app
+from core_lib.wire import NegotiatedResponse, WireMiddleware
+from fastapi import FastAPI, HTTPException, status
+from pydantic import BaseModel, Field
+
+from .core.logging_config import logger
+from .db.embedding import create_batcher, load_model
+
+# Most texts accepted in one request
+MAX_TEXTS = 4096
+
+app = FastAPI(
+    title="TaskerAI: Embedding Service",
+    default_response_class=NegotiatedResponse,
+)
+app.add_middleware(WireMiddleware)
+instrument_app(app)
+trace_app(app, "embedding_server")
+
+batcher = None
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str] = Field(..., max_length=MAX_TEXTS)
+
+
+@app.on_event("startup")
+async def on_startup():
+    global batcher
+    logger.info("Loading the embedding model")
+    batcher = create_batcher(await asyncio.to_thread(load_model))
+    gauge(
+        "embedding_pending_texts", "Texts waiting for the next batch."
+    ).set_function(lambda: batcher.pending)
+
+
+@app.post("/embed")
+async def embed(request: EmbedRequest):
+    """Embeds the texts, in order, batched with those of other requests."""
+    if batcher is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The embedding model is not loaded yet.",
+        )
+    embeddings = await batcher.submit(request.texts)
+    # Returned as a response to skip FastAPI's walk over every float
+    return NegotiatedResponse({"embeddings": embeddings})
+
+
+@app.get("/health", status_code=status.HTTP_200_OK)
+async def health_check():
+    return {"status": "ok", "batches": batcher.batches if batcher else 0}
@@ -1,20 +1,132 @@
 # in services/task_database/app/main.py
-from typing import List, Optional
+import asyncio
+import json
+from datetime import datetime
+from typing import List, Literal, Optional, Union
 
-from core_lib.models.task import Task, TaskCreate, TaskUpdate, TaskWithSubtasks
-from fastapi import Depends, FastAPI, HTTPException, Query, status
+from core_lib.instrumentation import gauge, instrument_app
+from core_lib.tracing import trace_app
+from core_lib.wire import NegotiatedResponse, WireMiddleware
+from core_lib.models.task import (
+    ACTIVE_STATUSES,
+    DeletedTask,
+    FlatTaskTree,
+    Task,
+    TaskChanges,
+    TaskCreate,
+    TaskDashboard,
+    TaskNode,
+    TaskProgress,
+    TaskStatus,
+    TaskTreeCreate,
+    TaskTreeNode,
+    TaskUpdate,
+    TaskWithSubtasks,
+    build_task_tree,
+)
+from fastapi import (
+    Depends,
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .core.config import settings
+from .core.events import RESYNC, EventBroker
+from .core.logging_config import logger
 from .db import crud
+from .db.embedding import (
+    EmbeddingServiceError,
+    close_client,
+    load_local_model,
+)
+from .db.listener import TaskChangeListener
+from .db.mappers import db_roots_to_dashboard, db_task_to_progress
 from .db.session import get_db_session, init_db
 
-app = FastAPI(title="TaskerAI: Database Service")
+app = FastAPI(
+    title="TaskerAI: Database Service",
+    # JSON or MessagePack, compressed or not, as the client accepts
+    default_response_class=NegotiatedResponse,
+)
+app.add_middleware(
+    WireMiddleware, min_size=settings.RESPONSE_COMPRESSION_MIN_SIZE
+)
+instrument_app(app)
+trace_app(app, "task_database")
+
+# Largest page of the listing endpoints used by other services
+MAX_PAGE_SIZE = 10_000
+
+# Task changes pushed to the subscribers of /tasks/events and /tasks/ws
+broker = EventBroker(max_queued=settings.EVENTS_MAX_QUEUED)
+listener = TaskChangeListener(
+    settings.DATABASE_URL.replace("+asyncpg", ""), broker
+)
+gauge(
+    "task_event_subscribers", "Open subscriptions to task changes."
+).set_function(lambda: broker.subscribers)
+
+
+def owner_query():
+    return Query(
+        None,
+        description="Owner of the task. Optional, but lets the database read "
+        "only the partition of that user instead of all of them.",
+    )
+
+
+def status_query(default=None):
+    return Query(
+        default,
+        alias="status",
+        description="Only tasks in these statuses; repeat the parameter "
+        "for several.",
+    )
+
+
+def include_archived_query():
+    return Query(
+        False,
+        description="Also read completed and cancelled tasks moved to the "
+        "archive, which is slower.",
+    )
 
 
 # --- Events ---
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    if not settings.EMBEDDING_SERVICE_URL:
+        logger.warning(
+            "EMBEDDING_SERVICE_URL is not set, loading the embedding model in "
+            "this worker; use app.embedding_server outside development"
+        )
+        await load_local_model()
+    listener.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await listener.stop()
+    await close_client()
+
+
+@app.exception_handler(EmbeddingServiceError)
+async def embedding_service_error_handler(
+    request: Request, exc: EmbeddingServiceError
+):
+    logger.error("%s", exc)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Embedding service is unavailable."},
+    )
 
 
 # --- API Endpoints ---
@@ -26,20 +138,226 @@ async def create_task(
     return await crud.create_task_in_db(session=session, task=task)
 
 
+@app.post(
+    "/tasks/tree",
+    response_model=TaskWithSubtasks,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_task_tree(
+    tree: TaskTreeCreate, session: AsyncSession = Depends(get_db_session)
+):
+    """
+    Create a task together with its whole subtree in one transaction.
+    Levels and parent ids of the subtasks are resolved by the service.
+    """
+    try:
+        db_task = await crud.create_task_tree_in_db(session=session, tree=tree)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if db_task is None:
+        raise HTTPException(status_code=404, detail="Parent task not found")
+    return db_task
+
+
 @app.get("/tasks/", response_model=List[Task])
 async def read_user_tasks(
-    user_id: int, session: AsyncSession = Depends(get_db_session)
+    user_id: int,
+    statuses: Optional[List[TaskStatus]] = status_query(),
+    include_archived: bool = include_archived_query(),
+    session: AsyncSession = Depends(get_db_session),
 ):
     """Retrieve all tasks for a specific user."""
-    return await crud.get_tasks_by_user(session=session, user_id=user_id)
+    return await crud.get_tasks_by_user(
+        session=session,
+        user_id=user_id,
+        statuses=statuses,
+        include_archived=include_archived,
+    )
 
 
 @app.get("/tasks/unscheduled/", response_model=List[Task])
 async def read_unscheduled_tasks(
-    user_id: int, session: AsyncSession = Depends(get_db_session)
+    user_id: int,
+    statuses: List[TaskStatus] = status_query(list(ACTIVE_STATUSES)),
+    session: AsyncSession = Depends(get_db_session),
 ):
-    """Retrieve future or unscheduled tasks for a user."""
-    return await crud.get_unscheduled_tasks(session=session, user_id=user_id)
+    """
+    Retrieve future or unscheduled tasks for a user; by default only those
+    that still need work.
+    """
+    return await crud.get_unscheduled_tasks(
+        session=session, user_id=user_id, statuses=statuses
+    )
+
+
+@app.get("/tasks/upcoming", response_model=List[Task])
+async def read_upcoming_tasks(
+    start: datetime,
+    end: datetime,
+    after_start: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    statuses: Optional[List[TaskStatus]] = status_query(),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve tasks of all users that start in [start, end), ordered by start
+    time. Pages are chained with the start time and id of the last task.
+    """
+    return await crud.get_upcoming_tasks(
+        session=session,
+        start=start,
+        end=end,
+        limit=limit,
+        after_start=after_start,
+        after_id=after_id,
+        statuses=statuses,
+    )
+
+
+@app.get("/tasks/changed", response_model=List[Task])
+async def read_changed_tasks(
+    since: datetime,
+    after_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve tasks of all users updated since a moment, ordered by update
+    time. Pages are chained with the update time and id of the last task.
+    """
+    return await crud.get_changed_tasks(
+        session=session, since=since, limit=limit, after_id=after_id
+    )
+
+
+@app.get("/tasks/deleted", response_model=List[DeletedTask])
+async def read_deleted_tasks(
+    since: datetime,
+    after_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve the tasks of all users deleted or archived since a moment,
+    ordered by deletion time. Pages are chained with the deletion time and
+    id of the last task.
+    """
+    return await crud.get_deleted_tasks(
+        session=session, since=since, limit=limit, after_id=after_id
+    )
+
+
+@app.get("/tasks/changes", response_model=TaskChanges)
+async def read_task_changes(
+    user_id: int,
+    since: Optional[str] = Query(
+        None,
+        description="Cursor returned by the previous call; without it, all "
+        "tasks of the user are returned with the first cursor.",
+    ),
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve the tasks of a user created or updated since a cursor, and the
+    ids of those deleted or archived, to keep a copy in sync. Call again
+    with the returned cursor while `has_more` is true.
+    """
+    after = None
+    if since:
+        try:
+            txid, seq = (int(part) for part in since.split("-"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = (txid, seq)
+    page = await crud.get_task_changes(
+        session=session, user_id=user_id, after=after, limit=limit
+    )
+    return TaskChanges(
+        tasks=page.tasks,
+        deleted=page.deleted,
+        cursor="-".join(str(part) for part in page.cursor),
+        has_more=page.has_more,
+    )
+
+
+@app.get("/tasks/dashboard", response_model=TaskDashboard)
+async def read_task_dashboard(
+    user_id: int,
+    statuses: Optional[List[TaskStatus]] = status_query(),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve the progress and effort of every task tree of a user, by the
+    status of its root, without reading the subtasks.
+    """
+    roots = await crud.get_root_tasks(
+        session=session, user_id=user_id, statuses=statuses
+    )
+    return db_roots_to_dashboard(user_id, roots)
+
+
+@app.get("/tasks/events")
+async def stream_task_events(request: Request, user_id: int):
+    """
+    Server-sent events of the changes to the tasks of a user, within
+    milliseconds of their commit: {"op", "user_id", "count", "ids"}, ids
+    being null for bulk changes. The first event, and any event after one
+    was missed, is {"op": "RESYNC"}: read /tasks/changes from the last
+    cursor then.
+    """
+
+    async def events():
+        with broker.subscribe(user_id) as queue:
+            yield f"data: {json.dumps(RESYNC)}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), settings.EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # Keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/tasks/ws")
+async def task_events_websocket(websocket: WebSocket, user_id: int):
+    """The events of /tasks/events over a WebSocket."""
+    await websocket.accept()
+
+    async def until_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    with broker.subscribe(user_id) as queue:
+        disconnected = asyncio.create_task(until_disconnect())
+        try:
+            await websocket.send_json(RESYNC)
+            while True:
+                event = asyncio.create_task(queue.get())
+                await asyncio.wait(
+                    {event, disconnected},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnected.done():
+                    event.cancel()
+                    return
+                await websocket.send_json(event.result())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            disconnected.cancel()
 
 
 @app.get("/tasks/search_similar/", response_model=List[Task])
@@ -58,6 +376,7 @@ async def search_tasks_by_similarity(
         description="Maximum allowed L2 distance for similarity. Tasks with greater distance will be excluded.",
         ge=0,
     ),
+    statuses: Optional[List[TaskStatus]] = status_query(),
     session: AsyncSession = Depends(get_db_session),
 ):
     """
@@ -70,43 +389,142 @@ async def search_tasks_by_similarity(
         query=query,
         limit=limit,
         max_distance=max_distance,  # Передаем новый параметр
+        statuses=statuses,
     )
 
 
-@app.get("/tasks/{task_id}", response_model=TaskWithSubtasks)
+@app.get(
+    "/tasks/{task_id}", response_model=Union[TaskWithSubtasks, FlatTaskTree]
+)
 async def read_task(
-    task_id: int, session: AsyncSession = Depends(get_db_session)
+    task_id: int,
+    user_id: Optional[int] = owner_query(),
+    format: Literal["nested", "flat"] = Query(
+        "nested",
+        description="'flat' returns the subtree as a list of nodes with "
+        "their parent_id and depth, in depth-first order; faster to build "
+        "and to parse for big trees",
+    ),
+    include_archived: bool = include_archived_query(),
+    session: AsyncSession = Depends(get_db_session),
 ):
     """Retrieve a single task by its ID, including all its subtasks."""
+    # Archived tasks have no relationships to load, so trees that may
+    # include them are always read flat
+    if format == "flat" or include_archived:
+        rows = await crud.get_task_subtree_flat(
+            session=session,
+            task_id=task_id,
+            user_id=user_id,
+            include_archived=include_archived,
+        )
+        if not rows:
+            raise HTTPException(status_code=404, detail="Task not found")
+        nodes = []
+        for task, depth in rows:
+            node = TaskNode.model_validate(task)
+            node.depth = depth
+            nodes.append(node)
+        if format == "nested":
+            return build_task_tree(nodes)
+        return FlatTaskTree(nodes=nodes)
     # We will use the existing get_task_by_id, SQLAlchemy will handle loading
-    db_task = await crud.get_task_by_id(session=session, task_id=task_id)
+    db_task = await crud.get_task_by_id(
+        session=session, task_id=task_id, user_id=user_id
+    )
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     # print(repr(db_task), end="\n\n\n\n")
     return db_task
 
 
+@app.get("/tasks/{task_id}/progress", response_model=TaskProgress)
+async def read_task_progress(
+    task_id: int,
+    user_id: Optional[int] = owner_query(),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve the progress and effort of a task and its subtasks, without
+    reading the subtasks.
+    """
+    db_task = await crud.get_task_without_subtree(
+        session=session, task_id=task_id, user_id=user_id
+    )
+    if db_task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return db_task_to_progress(db_task)
+
+
+@app.get("/tasks/{task_id}/ancestors", response_model=List[Task])
+async def read_task_ancestors(
+    task_id: int,
+    user_id: Optional[int] = owner_query(),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve the parents of a task up to the root of its tree, root first.
+    Empty for a root task.
+    """
+    return await crud.get_task_ancestors(
+        session=session, task_id=task_id, user_id=user_id
+    )
+
+
 @app.patch("/tasks/{task_id}", response_model=Task)
 async def update_task(
     task_id: int,
     task_update: TaskUpdate,
+    user_id: Optional[int] = owner_query(),
     session: AsyncSession = Depends(get_db_session),
 ):
     """Partially update a task's attributes."""
     updated_task = await crud.update_task_in_db(
-        session=session, task_id=task_id, task_update=task_update
+        session=session,
+        task_id=task_id,
+        task_update=task_update,
+        user_id=user_id,
     )
     if updated_task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     return updated_task
 
 
+@app.post("/tasks/{task_id}/tree", response_model=TaskWithSubtasks)
+async def insert_task_subtree(
+    task_id: int,
+    tree: TaskTreeNode,
+    user_id: Optional[int] = owner_query(),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Update a task with the fields set on the root of the payload and insert
+    its subtasks under it, all in one transaction. A task that already has
+    subtasks is left as it is, with 409.
+    """
+    try:
+        db_task = await crud.insert_subtree_in_db(
+            session=session, task_id=task_id, tree=tree, user_id=user_id
+        )
+    except crud.SubtasksExistError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if db_task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return db_task
+
+
 @app.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_task(
-    task_id: int, session: AsyncSession = Depends(get_db_session)
+    task_id: int,
+    user_id: Optional[int] = owner_query(),
+    session: AsyncSession = Depends(get_db_session),
 ):
     """Delete a task by its ID."""
-    success = await crud.delete_task_in_db(session=session, task_id=task_id)
+    success = await crud.delete_task_in_db(
+        session=session, task_id=task_id, user_id=user_id
+    )
     if not success:
         raise HTTPException(status_code=404, detail="Task not found")
     return None
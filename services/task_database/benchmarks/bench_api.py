@@ -0,0 +1,371 @@
+"""
+Load test of the task_database API.
+
+Drives the FastAPI app in-process through httpx.ASGITransport, so the
+numbers include routing, validation, serialization and the database but
+no network. Every scenario sends requests from `--concurrency` workers for
+`--duration` seconds after a warmup, and its throughput, errors and
+latency percentiles are written to a JSON file which benchmarks.compare
+can diff against the results of another version.
+
+Write scenarios add and change rows: reload the data with
+benchmarks.datagen before runs that are meant to be compared.
+
+Usage (from services/task_database, with DATABASE_URL set to a database
+loaded by benchmarks.datagen):
+    python -m benchmarks.bench_api --scale 10k --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import asyncpg
+import httpx
+import numpy as np
+
+from app.db.session import engine
+from app.main import app
+from benchmarks.datagen import (
+    OBJECTS,
+    SCALES,
+    TAGS,
+    VERBS,
+    database_dsn,
+    random_description,
+    random_title,
+)
+from core_lib.models.task import MAX_TASK_LEVEL
+
+RESULTS_DIR = Path(__file__).parent / "results"
+# Ids sampled from the database for the scenarios to pick from
+SAMPLE_SIZE = 10_000
+
+
+@dataclass
+class Dataset:
+    """Ids of existing rows, sampled once before the scenarios run."""
+
+    task_ids: List[int]
+    root_ids: List[int]
+    user_ids: List[int]
+    # Last change feed cursor of every user that synced, see sync_changes
+    cursors: Dict[int, str] = field(default_factory=dict)
+
+
+async def sample_dataset() -> Dataset:
+    """
+    Samples ids with TABLESAMPLE, so that it takes as long at 10m tasks as
+    at 10k.
+    """
+    connection = await asyncpg.connect(database_dsn())
+    try:
+        estimate = await connection.fetchval(
+            "SELECT greatest(reltuples, 1) FROM pg_class WHERE relname = 'tasks'"
+        )
+        percent = min(100.0, 100.0 * SAMPLE_SIZE * 20 / estimate)
+        rows = await connection.fetch(
+            f"SELECT id, parent_id, user_id FROM tasks "
+            f"TABLESAMPLE BERNOULLI ({percent}) LIMIT {SAMPLE_SIZE * 20}"
+        )
+    finally:
+        await connection.close()
+    if not rows:
+        raise SystemExit("The tasks table is empty, run benchmarks.datagen")
+    return Dataset(
+        task_ids=[row["id"] for row in rows][:SAMPLE_SIZE],
+        root_ids=[row["id"] for row in rows if row["parent_id"] is None][
+            :SAMPLE_SIZE
+        ],
+        user_ids=sorted({row["user_id"] for row in rows}),
+    )
+
+
+# --- Scenarios ---
+Scenario = Callable[
+    [httpx.AsyncClient, random.Random, Dataset], Awaitable[httpx.Response]
+]
+
+
+def _new_task(rng: random.Random, user_id: Optional[int] = None) -> dict:
+    task = {
+        "title": random_title(rng),
+        "description": random_description(rng),
+        "priority": round(rng.random(), 2),
+        "tags": rng.sample(TAGS, rng.randint(0, 2)),
+        "estimated_duration": rng.choice([900, 1800, 3600]),
+    }
+    if user_id is not None:
+        task["user_id"] = user_id
+    return task
+
+
+def _new_tree(rng: random.Random, depth: int) -> dict:
+    node = _new_task(rng)
+    if depth:
+        node["subtasks"] = [
+            _new_tree(rng, depth - 1) for _ in range(rng.randint(1, 3))
+        ]
+    return node
+
+
+async def get_task(client, rng, data):
+    return await client.get(f"/tasks/{rng.choice(data.task_ids)}")
+
+
+async def get_tree(client, rng, data):
+    return await client.get(f"/tasks/{rng.choice(data.root_ids)}")
+
+
+async def list_user_tasks(client, rng, data):
+    return await client.get(
+        "/tasks/", params={"user_id": rng.choice(data.user_ids)}
+    )
+
+
+async def list_unscheduled(client, rng, data):
+    return await client.get(
+        "/tasks/unscheduled/", params={"user_id": rng.choice(data.user_ids)}
+    )
+
+
+async def search_similar(client, rng, data):
+    return await client.get(
+        "/tasks/search_similar/",
+        params={
+            "user_id": rng.choice(data.user_ids),
+            "query": f"{rng.choice(VERBS)} {rng.choice(OBJECTS)}",
+        },
+    )
+
+
+async def list_upcoming(client, rng, data):
+    start = datetime.now(timezone.utc) + timedelta(hours=rng.uniform(-24, 24))
+    return await client.get(
+        "/tasks/upcoming",
+        params={
+            "start": start.isoformat(),
+            "end": (start + timedelta(hours=1)).isoformat(),
+            "limit": 1000,
+        },
+    )
+
+
+async def list_changed(client, rng, data):
+    since = datetime.now(timezone.utc) - timedelta(days=rng.uniform(0, 90))
+    return await client.get(
+        "/tasks/changed", params={"since": since.isoformat(), "limit": 1000}
+    )
+
+
+async def sync_changes(client, rng, data):
+    # The first call of a user is a full sync, the next ones incremental
+    user_id = rng.choice(data.user_ids)
+    params = {"user_id": user_id}
+    if user_id in data.cursors:
+        params["since"] = data.cursors[user_id]
+    response = await client.get("/tasks/changes", params=params)
+    if response.status_code == 200:
+        data.cursors[user_id] = response.json()["cursor"]
+    return response
+
+
+async def create_task(client, rng, data):
+    return await client.post(
+        "/tasks/", json=_new_task(rng, rng.choice(data.user_ids))
+    )
+
+
+async def update_task(client, rng, data):
+    return await client.patch(
+        f"/tasks/{rng.choice(data.task_ids)}",
+        json={"priority": round(rng.random(), 2)},
+    )
+
+
+async def create_tree(client, rng, data):
+    tree = _new_tree(rng, min(2, MAX_TASK_LEVEL))
+    tree["user_id"] = rng.choice(data.user_ids)
+    return await client.post("/tasks/tree", json=tree)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "get_task": get_task,
+    "get_tree": get_tree,
+    "list_user_tasks": list_user_tasks,
+    "list_unscheduled": list_unscheduled,
+    "search_similar": search_similar,
+    "list_upcoming": list_upcoming,
+    "list_changed": list_changed,
+    "sync_changes": sync_changes,
+    "create_task": create_task,
+    "update_task": update_task,
+    "create_tree": create_tree,
+}
+
+
+# --- Runner ---
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    data: Dataset,
+    concurrency: int,
+    duration: float,
+    warmup: int,
+    seed: int,
+) -> dict:
+    """Runs one scenario and summarizes its latencies in milliseconds."""
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        await scenario(client, rng, data)
+
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_rng: random.Random):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await scenario(client, worker_rng, data)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(worker(random.Random(seed + i + 1)) for i in range(concurrency))
+    )
+    elapsed = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0, 0, 0)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(ms.mean()) if len(ms) else 0.0,
+        "max_ms": float(ms.max()) if len(ms) else 0.0,
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main(
+    scale: str,
+    scenarios: List[str],
+    concurrency: int,
+    duration: float,
+    warmup: int,
+    seed: int,
+    output: Optional[Path],
+) -> None:
+    data = await sample_dataset()
+    revision = _git_revision()
+    report = {
+        "meta": {
+            "revision": revision,
+            "scale": scale,
+            "tasks": SCALES[scale][0],
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "concurrency": concurrency,
+            "duration": duration,
+            "seed": seed,
+        },
+        "results": {},
+    }
+
+    print(
+        f"{'scenario':<18}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+        f"{'max':>9}{'errors':>8}"
+    )
+    # Errors of the app become 500 responses instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        for name in scenarios:
+            result = await run_scenario(
+                client,
+                SCENARIOS[name],
+                data,
+                concurrency,
+                duration,
+                warmup,
+                seed,
+            )
+            report["results"][name] = result
+            print(
+                f"{name:<18}{result['throughput']:>9.1f}"
+                f"{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}{result['max_ms']:>9.2f}"
+                f"{result['errors']:>8}"
+            )
+    await engine.dispose()
+
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{scale}-{revision}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scale",
+        choices=SCALES,
+        default="10k",
+        help="scale the database was loaded with, recorded in the results",
+    )
+    parser.add_argument(
+        "--scenario",
+        dest="scenarios",
+        action="append",
+        choices=SCENARIOS,
+        help="scenario to run, may be repeated (all by default)",
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="seconds per scenario"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=20, help="requests before measuring"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.scale,
+            args.scenarios or list(SCENARIOS),
+            args.concurrency,
+            args.duration,
+            args.warmup,
+            args.seed,
+            args.output,
+        )
+    )
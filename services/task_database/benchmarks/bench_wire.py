@@ -0,0 +1,138 @@
+"""
+Benchmark of the wire formats of task_database responses.
+
+Fetches a few real responses through the app (a big task tree, nested and
+flat, and a page of upcoming tasks), then measures for JSON and
+MessagePack, uncompressed and with each available compression, the bytes
+on the wire, the CPU time of the server to encode them and the CPU time of
+the client to decode them. The first row of each payload, JSON without
+compression, is the format every response used before negotiation.
+
+Usage (from services/task_database, with DATABASE_URL set to a database
+loaded by benchmarks.datagen):
+    python -m benchmarks.bench_wire
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Callable, Dict
+
+import asyncpg
+import httpx
+
+from app.db.session import engine
+from app.main import app
+from benchmarks.datagen import database_dsn
+from core_lib.wire import (
+    ENCODINGS,
+    JSON,
+    MSGPACK,
+    compress,
+    decode,
+    decompress,
+    encode,
+)
+
+
+def _seconds_per_call(function: Callable[[], object], budget: float) -> float:
+    """Runs `function` for about `budget` seconds, at least 3 times."""
+    calls, started = 0, time.perf_counter()
+    while calls < 3 or time.perf_counter() - started < budget:
+        function()
+        calls += 1
+    return (time.perf_counter() - started) / calls
+
+
+async def fetch_payloads() -> Dict[str, object]:
+    """Decoded bodies of typical responses, by name."""
+    connection = await asyncpg.connect(database_dsn())
+    try:
+        # The root with the most tasks below it among a sample of trees
+        root_id = await connection.fetchval(
+            "SELECT root FROM ("
+            "  SELECT id AS root FROM tasks"
+            "  WHERE parent_id IS NULL ORDER BY id LIMIT 1000"
+            ") roots JOIN LATERAL ("
+            "  WITH RECURSIVE sub AS ("
+            "    SELECT id FROM tasks WHERE id = root"
+            "    UNION ALL"
+            "    SELECT t.id FROM tasks t JOIN sub ON t.parent_id = sub.id"
+            "  ) SELECT count(*) AS size FROM sub"
+            ") sizes ON true ORDER BY size DESC LIMIT 1"
+        )
+    finally:
+        await connection.close()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        requests = {
+            "tree": (f"/tasks/{root_id}", {}),
+            "tree_flat": (f"/tasks/{root_id}", {"format": "flat"}),
+            "upcoming_page": (
+                "/tasks/upcoming",
+                {
+                    "start": "2000-01-01T00:00:00Z",
+                    "end": "2100-01-01T00:00:00Z",
+                    "limit": 1000,
+                },
+            ),
+        }
+        payloads = {}
+        for name, (path, params) in requests.items():
+            response = await client.get(
+                path, params=params, headers={"Accept-Encoding": "identity"}
+            )
+            response.raise_for_status()
+            payloads[name] = response.json()
+    await engine.dispose()
+    return payloads
+
+
+def main(budget: float) -> None:
+    payloads = asyncio.run(fetch_payloads())
+    print(
+        f"{'payload':<15}{'format':<10}{'encoding':<10}{'bytes':>10}"
+        f"{'ratio':>8}{'encode us':>12}{'decode us':>12}"
+    )
+    for name, content in payloads.items():
+        baseline = None
+        for media_type in (JSON, MSGPACK):
+            for encoding in ("identity",) + ENCODINGS:
+
+                def server(media_type=media_type, encoding=encoding):
+                    body = encode(content, media_type)
+                    if encoding != "identity":
+                        body = compress(body, encoding)
+                    return body
+
+                body = server()
+                baseline = baseline or len(body)
+
+                def client(media_type=media_type, encoding=encoding, body=body):
+                    if encoding != "identity":
+                        body = decompress(body, encoding)
+                    return decode(body, media_type)
+
+                assert client() == content
+                encode_us = _seconds_per_call(server, budget) * 1e6
+                decode_us = _seconds_per_call(client, budget) * 1e6
+                print(
+                    f"{name:<15}{media_type.split('/')[1]:<10}{encoding:<10}"
+                    f"{len(body):>10}{len(body) / baseline:>8.2f}"
+                    f"{encode_us:>12.0f}{decode_us:>12.0f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0.5,
+        help="seconds spent timing each combination",
+    )
+    args = parser.parse_args()
+    main(args.budget)
@@ -0,0 +1,89 @@
+"""
+Compares two result files of benchmarks.bench_api.
+
+Prints the change of throughput and latency of every scenario present in
+both files, and exits with status 1 when the p95 latency or the throughput
+of a scenario got worse by more than `--threshold`, so it can gate CI.
+
+Usage (from services/task_database):
+    python -m benchmarks.compare results/10k-abc1234.json results/10k-def5678.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List
+
+# Columns printed for every scenario, with whether higher is better
+METRICS = (
+    ("throughput", True),
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+)
+
+
+def _change(before: float, after: float) -> float:
+    """Relative change from `before` to `after`, e.g. 0.1 for +10%."""
+    if before == 0:
+        return 0.0 if after == 0 else float("inf")
+    return (after - before) / before
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> List[str]:
+    """
+    Prints the comparison and returns the regressions, as "scenario: metric"
+    descriptions.
+    """
+    regressions = []
+    for run, label in ((baseline, "baseline"), (candidate, "candidate")):
+        meta = run["meta"]
+        print(
+            f"{label}: {meta['revision']} at {meta['scale']}, "
+            f"concurrency {meta['concurrency']}, {meta['timestamp']}"
+        )
+    if baseline["meta"]["scale"] != candidate["meta"]["scale"]:
+        print("warning: the runs used different scales")
+
+    print(f"\n{'scenario':<18}" + "".join(f"{m:>20}" for m, _ in METRICS))
+    for name, before in baseline["results"].items():
+        after = candidate["results"].get(name)
+        if after is None:
+            continue
+        cells = []
+        for metric, higher_is_better in METRICS:
+            change = _change(before[metric], after[metric])
+            worse = -change if higher_is_better else change
+            flag = " "
+            if metric in ("throughput", "p95_ms") and worse > threshold:
+                regressions.append(f"{name}: {metric} {change:+.1%}")
+                flag = "!"
+            cells.append(f"{after[metric]:>10.1f} {change:>+7.1%}{flag}")
+        print(f"{name:<18}" + "".join(f"{cell:>20}" for cell in cells))
+        if after["errors"] > before["errors"]:
+            print(f"  errors: {before['errors']} -> {after['errors']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="largest tolerated relative regression (0.1 = 10%%)",
+    )
+    args = parser.parse_args()
+    regressions = compare(
+        json.loads(args.baseline.read_text()),
+        json.loads(args.candidate.read_text()),
+        args.threshold,
+    )
+    if regressions:
+        print("\nRegressions above the threshold:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
@@ -0,0 +1,300 @@
+"""
+Synthetic data for the task_database benchmarks.
+
+Generates users with task trees of realistic shape and text and bulk loads
+them with COPY, which is orders of magnitude faster than going through the
+API. Most trees are a goal with two to four levels of steps; a share of
+them are chains nested down to MAX_TASK_LEVEL. Embeddings are random unit
+vectors: the model is too slow for millions of rows, and similarity search
+costs the same whatever the vectors mean.
+
+Usage (from services/task_database, with DATABASE_URL set):
+    python -m benchmarks.datagen --scale 10k
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+
+import asyncpg
+import numpy as np
+from pgvector.asyncpg import register_vector
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.models import EMBEDDING_SIZE, Base
+from app.db.session import engine
+from core_lib.models.task import MAX_TASK_LEVEL
+
+# Number of tasks and users of each scale
+SCALES = {
+    "10k": (10_000, 100),
+    "1m": (1_000_000, 10_000),
+    "10m": (10_000_000, 100_000),
+}
+# Share of trees that are chains nested down to MAX_TASK_LEVEL
+DEEP_TREE_SHARE = 0.05
+# Rows sent per COPY
+BATCH_SIZE = 10_000
+
+COLUMNS = (
+    "id",
+    "title",
+    "description",
+    "status",
+    "parent_id",
+    "complexity",
+    "priority",
+    "tags",
+    "level",
+    "user_id",
+    "embedding",
+    "deadline",
+    "start_time_execution",
+    "estimated_duration",
+    "created_at",
+    "updated_at",
+    # Written here rather than by the tasks_rollup_inserts trigger, which
+    # is disabled during the load
+    "descendant_count",
+    "completed_descendant_count",
+    "descendant_estimated_duration",
+    "descendant_max_deadline",
+)
+
+VERBS = [
+    "Prepare",
+    "Review",
+    "Write",
+    "Plan",
+    "Research",
+    "Schedule",
+    "Clean up",
+    "Refactor",
+    "Call",
+    "Book",
+    "Draft",
+    "Practice",
+    "Organize",
+    "Buy",
+    "Fix",
+    "Learn",
+]
+OBJECTS = [
+    "the quarterly budget",
+    "a blog post",
+    "the onboarding checklist",
+    "flights to Lisbon",
+    "the garage",
+    "Spanish vocabulary",
+    "the database migration",
+    "a birthday party",
+    "the client presentation",
+    "groceries for the week",
+    "the running plan",
+    "tax documents",
+    "the API documentation",
+    "a dentist appointment",
+    "the photo archive",
+    "guitar scales",
+]
+CONTEXTS = [
+    "",
+    "for the marketing team",
+    "before Friday",
+    "with Anna",
+    "for the half marathon",
+    "after the release",
+    "for next month",
+    "at home",
+    "in the evening",
+]
+SENTENCES = [
+    "Collect everything that is needed first.",
+    "Keep it short and focus on the main points.",
+    "Ask for feedback once a first version is ready.",
+    "Check the previous notes to avoid repeating work.",
+    "Split it into sessions of at most an hour.",
+    "Make sure the deadline is realistic.",
+    "Write down open questions as they come up.",
+    "Use the template from last time.",
+]
+TAGS = ["work", "home", "health", "study", "finance", "travel", "hobby"]
+STATUSES = ["PENDING"] * 6 + ["IN_PROGRESS"] * 2 + ["COMPLETED"] * 2
+
+
+def random_title(rng: random.Random) -> str:
+    title = f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(CONTEXTS)}"
+    return title.strip()[:120]
+
+
+def random_description(rng: random.Random) -> str:
+    return " ".join(rng.sample(SENTENCES, rng.randint(1, 3)))
+
+
+def _tree_shape(rng: random.Random) -> List[Tuple[int, Optional[int]]]:
+    """(level, index of the parent) of each node of one tree, parents first."""
+    nodes: List[Tuple[int, Optional[int]]] = [(0, None)]
+    if rng.random() < DEEP_TREE_SHARE:
+        # A chain down to the deepest level, with a leaf next to each link
+        for level in range(1, MAX_TASK_LEVEL + 1):
+            parent = len(nodes) - 1 if level == 1 else len(nodes) - 2
+            nodes.append((level, parent))
+            if level < MAX_TASK_LEVEL:
+                nodes.append((level, parent))
+        return nodes
+
+    depth = rng.randint(1, 4)
+    frontier = [0]
+    for level in range(1, depth + 1):
+        next_frontier = []
+        for parent in frontier:
+            for _ in range(rng.randint(1, 4)):
+                next_frontier.append(len(nodes))
+                nodes.append((level, parent))
+        frontier = next_frontier
+    return nodes
+
+
+def _roll_up(rows: List[list], shape: List[Tuple[int, Optional[int]]]):
+    """Fills the rollup columns of the rows of one tree, as the trigger would."""
+    for index in range(len(rows) - 1, 0, -1):
+        row, parent = rows[index], rows[shape[index][1]]
+        parent[-4] += 1 + row[-4]
+        parent[-3] += (row[3] == "COMPLETED") + row[-3]
+        parent[-2] += row[13] + row[-2]
+        parent[-1] = max(
+            (
+                deadline
+                for deadline in (parent[-1], row[11], row[-1])
+                if deadline is not None
+            ),
+            default=None,
+        )
+
+
+def generate_tasks(
+    total: int, users: int, seed: int = 0
+) -> Iterator[Tuple[list, Optional[int]]]:
+    """
+    Yields the rows, without embedding, of `total` tasks spread over
+    `users` users, with ids from 1 and parents before their children.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    next_id = 1
+    while next_id <= total:
+        user_id = rng.randint(1, users)
+        shape = _tree_shape(rng)[: total - next_id + 1]
+        root_id = next_id
+        created_at = now - timedelta(days=rng.uniform(0, 90))
+        start = now + timedelta(days=rng.uniform(-30, 30))
+        rows = []
+        for level, parent in shape:
+            duration = timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 120]))
+            start += duration
+            updated_at = created_at + timedelta(minutes=rng.uniform(0, 600))
+            rows.append(
+                [
+                    next_id,
+                    random_title(rng),
+                    random_description(rng),
+                    rng.choice(STATUSES),
+                    None if parent is None else root_id + parent,
+                    round(rng.random(), 2),
+                    round(rng.random(), 2),
+                    json.dumps(rng.sample(TAGS, rng.randint(0, 2))),
+                    level,
+                    user_id,
+                    None,
+                    start + timedelta(days=rng.uniform(0, 14)),
+                    start,
+                    duration,
+                    created_at,
+                    updated_at,
+                    0,
+                    0,
+                    timedelta(),
+                    None,
+                ]
+            )
+            next_id += 1
+        _roll_up(rows, shape)
+        yield from rows
+
+
+def database_dsn() -> str:
+    return settings.DATABASE_URL.replace("+asyncpg", "")
+
+
+async def load(total: int, users: int, seed: int, embeddings: bool) -> None:
+    """Recreates the tasks table and fills it with generated tasks."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            text("ALTER TABLE tasks DISABLE TRIGGER tasks_rollup_inserts")
+        )
+    await engine.dispose()
+
+    connection = await asyncpg.connect(database_dsn())
+    await register_vector(connection)
+    vectors = np.random.default_rng(seed)
+    started = time.perf_counter()
+    batch = []
+
+    async def flush():
+        if embeddings:
+            matrix = vectors.standard_normal(
+                (len(batch), EMBEDDING_SIZE), dtype=np.float32
+            )
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            for row, vector in zip(batch, matrix):
+                row[10] = vector
+        await connection.copy_records_to_table(
+            "tasks", records=batch, columns=COLUMNS
+        )
+        batch.clear()
+
+    try:
+        for count, row in enumerate(generate_tasks(total, users, seed), 1):
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                await flush()
+                if count % (BATCH_SIZE * 10) == 0:
+                    rate = count / (time.perf_counter() - started)
+                    print(f"{count} tasks loaded ({rate:.0f}/s)")
+        if batch:
+            await flush()
+        await connection.execute(
+            "SELECT setval('tasks_id_seq', (SELECT max(id) FROM tasks))"
+        )
+        await connection.execute("ANALYZE tasks")
+    finally:
+        await connection.execute(
+            "ALTER TABLE tasks ENABLE TRIGGER tasks_rollup_inserts"
+        )
+        await connection.close()
+    print(
+        f"Loaded {total} tasks of {users} users in "
+        f"{time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-embeddings",
+        dest="embeddings",
+        action="store_false",
+        help="leave embeddings empty, e.g. to save space at 10m",
+    )
+    args = parser.parse_args()
+    total, users = SCALES[args.scale]
+    asyncio.run(load(total, users, args.seed, args.embeddings))
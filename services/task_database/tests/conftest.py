@@ -0,0 +1,54 @@
+import os
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# A Postgres database with pgvector, e.g.
+# postgresql+asyncpg://postgres@localhost/tasks_test; every test module
+# creates its tables in its own schema
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+# app.db creates its engine on import, without connecting; the tests that
+# need the database skip without TEST_DATABASE_URL
+os.environ.setdefault(
+    "DATABASE_URL", TEST_DATABASE_URL or "postgresql+asyncpg://localhost/test"
+)
+
+
+@pytest.fixture
+def db_schema():
+    """
+    Returns `schema(name)`, an async context manager that creates the
+    tables in a new schema `name` and yields an engine that uses it. The
+    schema is dropped on exit. Skips the test without TEST_DATABASE_URL.
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from app.db.models import Base
+
+    @asynccontextmanager
+    async def schema(name: str):
+        engine = create_async_engine(
+            TEST_DATABASE_URL,
+            connect_args={"server_settings": {"search_path": f"{name},public"}},
+        )
+        async with engine.begin() as connection:
+            await connection.execute(
+                text(f"DROP SCHEMA IF EXISTS {name} CASCADE")
+            )
+            await connection.execute(text(f"CREATE SCHEMA {name}"))
+            # Not checkfirst: tables of public would be found through the path
+            await connection.run_sync(
+                Base.metadata.create_all, checkfirst=False
+            )
+        try:
+            yield engine
+        finally:
+            async with engine.begin() as connection:
+                await connection.execute(text(f"DROP SCHEMA {name} CASCADE"))
+            await engine.dispose()
+
+    return schema
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.db import crud
+from app.db.models import ArchivedTask, TaskStatus
+from app.db.models import Task as DBTask
+
+SCHEMA = "test_archive"
+
+
+async def _archive(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        old = datetime.now(timezone.utc) - timedelta(days=100)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as session:
+            # A finished tree, and an active task with a finished subtask and
+            # a subtask finished recently
+            done = DBTask(
+                title="Move out", user_id=1, status=TaskStatus.COMPLETED
+            )
+            done.subtasks = [
+                DBTask(title="Pack", user_id=1, status=TaskStatus.COMPLETED),
+                DBTask(title="Clean", user_id=1, status=TaskStatus.CANCELLED),
+            ]
+            active = DBTask(title="Move in", user_id=1)
+            active.subtasks = [
+                DBTask(title="Unpack", user_id=1, status=TaskStatus.COMPLETED),
+                DBTask(title="Paint", user_id=1, status=TaskStatus.COMPLETED),
+            ]
+            session.add_all([done, active])
+            await session.commit()
+            await session.execute(
+                DBTask.__table__.update()
+                .where(DBTask.title != "Paint")
+                .values(updated_at=old)
+            )
+            await session.commit()
+
+            before = datetime.now(timezone.utc) - timedelta(days=90)
+            batches = []
+            while True:
+                batches.append(
+                    await crud.archive_finished_tasks(session, before, 2)
+                )
+                if batches[-1] == 0:
+                    break
+            archived = await session.scalar(
+                select(func.count()).select_from(ArchivedTask)
+            )
+            hot = (await session.scalars(select(DBTask.title))).all()
+            tree = await crud.get_task_subtree_flat(
+                session, done.id, user_id=1, include_archived=True
+            )
+            tasks = await crud.get_tasks_by_user(
+                session,
+                1,
+                statuses=[TaskStatus.COMPLETED],
+                include_archived=True,
+            )
+    return batches, archived, hot, tree, tasks
+
+
+def test_finished_tasks_are_archived_from_the_leaves_up(db_schema):
+    """Tests archive_finished_tasks and reading the archive back."""
+    batches, archived, hot, tree, tasks = asyncio.run(_archive(db_schema))
+
+    # The root of the finished tree only after its subtasks
+    assert batches == [2, 2, 0]
+    assert archived == 4
+    assert sorted(hot) == ["Move in", "Paint"]
+    assert [(task.title, depth) for task, depth in tree] == [
+        ("Move out", 0),
+        ("Pack", 1),
+        ("Clean", 1),
+    ]
+    assert sorted(task.title for task in tasks) == [
+        "Move out",
+        "Pack",
+        "Paint",
+        "Unpack",
+    ]
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+from app.core.batching import MicroBatcher
+
+
+def test_concurrent_calls_share_a_batch():
+    """Tests that calls within the window are computed in one batch."""
+    batches = []
+
+    def square(items):
+        batches.append(list(items))
+        return [item * item for item in items]
+
+    batcher = MicroBatcher(square, window=0.05)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit([1, 2]), batcher.submit([3]), batcher.submit([4, 5])
+        )
+
+    results = asyncio.run(main())
+
+    assert results == [[1, 4], [9], [16, 25]]
+    assert batches == [[1, 2, 3, 4, 5]]
+
+
+def test_full_batch_is_sent_without_waiting_for_the_window():
+    """Tests max_batch, and that the next batch is collected meanwhile."""
+    batches = []
+    release = threading.Event()
+
+    def identity(items):
+        batches.append(list(items))
+        release.wait(1)
+        return items
+
+    batcher = MicroBatcher(identity, window=10, max_batch=2)
+
+    async def main():
+        first = asyncio.gather(batcher.submit([1]), batcher.submit([2]))
+        await asyncio.sleep(0.05)
+        # Arrive while the first batch is computed
+        second = asyncio.gather(batcher.submit([3]), batcher.submit([4]))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(first, second), 5)
+
+    assert asyncio.run(main()) == [[[1], [2]], [[3], [4]]]
+    assert batches == [[1, 2], [3, 4]]
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    """Tests that a failed batch fails its calls but not the next batch."""
+    calls = []
+
+    def flaky(items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise RuntimeError("model crashed")
+        return items
+
+    batcher = MicroBatcher(flaky, window=0.01)
+
+    async def main():
+        failed = await asyncio.gather(
+            batcher.submit(["a"]), batcher.submit(["b"]), return_exceptions=True
+        )
+        return failed, await batcher.submit(["c"])
+
+    failed, result = asyncio.run(main())
+
+    assert all(isinstance(error, RuntimeError) for error in failed)
+    assert result == ["c"]
@@ -0,0 +1,127 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.events import RESYNC, EventBroker
+from app.db import crud
+from app.db.listener import TaskChangeListener
+from app.db.models import Task as DBTask
+
+SCHEMA = "test_changes"
+
+
+async def _feed(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        pages = {}
+
+        async def read(name, cursor, limit=10):
+            async with session_factory() as reader:
+                page = await crud.get_task_changes(reader, 1, cursor, limit)
+            # Only the titles are kept, to compare
+            pages[name] = page._replace(
+                tasks=[task.title for task in page.tasks]
+            )
+            return page
+
+        async with session_factory() as session:
+            tasks = [DBTask(title=f"Task {i}", user_id=1) for i in range(3)]
+            session.add_all(tasks + [DBTask(title="Other user", user_id=2)])
+            await session.commit()
+
+            first = await read("first", None, limit=2)
+            second = await read("second", first.cursor, limit=2)
+
+            tasks[0].title = "Task 0, renamed"
+            await session.delete(tasks[1])
+            await session.commit()
+            changes = await read("changes", second.cursor)
+
+            # A transaction that took its sequence value first, but commits
+            # after another one, is not skipped
+            async with session_factory() as slow:
+                await slow.execute(
+                    DBTask.__table__.update()
+                    .where(DBTask.id == tasks[2].id)
+                    .values(title="Task 2, slow")
+                )
+                session.add(DBTask(title="Fast", user_id=1))
+                await session.commit()
+                await read("while_running", changes.cursor)
+                await session.commit()
+                await slow.commit()
+            await read("after_commit", changes.cursor)
+    return pages
+
+
+async def _push(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        broker = EventBroker()
+        listener = TaskChangeListener(
+            engine.url.render_as_string(hide_password=False).replace(
+                "+asyncpg", ""
+            ),
+            broker,
+        )
+        events = []
+
+        async def next_event(queue):
+            events.append(await asyncio.wait_for(queue.get(), 5))
+
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        with broker.subscribe(1) as queue:
+            listener.start()
+            async with session_factory() as session:
+                # Wait for the listener with a write that nobody subscribed to
+                with broker.subscribe(2) as ready:
+                    while ready.empty():
+                        session.add(DBTask(title="Ready", user_id=2))
+                        await session.commit()
+                        await asyncio.sleep(0.05)
+
+                # Sent as one statement
+                tasks = [
+                    DBTask(title=title, user_id=1) for title in ("Pack", "Go")
+                ]
+                session.add_all(tasks)
+                await session.commit()
+                await next_event(queue)
+                tasks[0].title = "Pack the books"
+                await session.commit()
+                await next_event(queue)
+                await session.execute(
+                    DBTask.__table__.delete().where(DBTask.user_id == 1)
+                )
+                await session.commit()
+                await next_event(queue)
+            await listener.stop()
+    return [task.id for task in tasks], events
+
+
+def test_change_feed_returns_each_change_once_in_commit_safe_order(db_schema):
+    """Tests paging, updates, tombstones and in-flight transactions."""
+    pages = asyncio.run(_feed(db_schema))
+
+    assert pages["first"].tasks == ["Task 0", "Task 1"]
+    assert pages["first"].has_more
+    assert pages["second"].tasks == ["Task 2"]
+    assert not pages["second"].has_more
+
+    assert pages["changes"].tasks == ["Task 0, renamed"]
+    assert len(pages["changes"].deleted) == 1
+
+    assert pages["while_running"].tasks == []
+    assert pages["while_running"].cursor == pages["changes"].cursor
+    assert pages["after_commit"].tasks == ["Task 2, slow", "Fast"]
+
+
+def test_commits_are_pushed_to_the_subscribers_of_the_user(db_schema):
+    """Tests the notify triggers, the listener and the broker together."""
+    ids, events = asyncio.run(_push(db_schema))
+
+    assert RESYNC not in events
+    assert events == [
+        {"op": "INSERT", "user_id": 1, "count": 2, "ids": ids},
+        {"op": "UPDATE", "user_id": 1, "count": 1, "ids": ids[:1]},
+        {"op": "DELETE", "user_id": 1, "count": 2, "ids": ids},
+    ]
@@ -1 +1,141 @@
-# TODO
+import asyncio
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core_lib.models.task import TaskTreeNode
+
+from app.db import crud
+from app.db.models import Task as DBTask
+from app.db.session import get_db_session
+from app.main import app
+
+SCHEMA = "test_crud"
+
+
+async def _decompose_twice(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as session:
+            task = DBTask(title="Move out", user_id=1)
+            session.add(task)
+            await session.commit()
+
+        tree = TaskTreeNode(
+            title="Move out",
+            subtasks=[TaskTreeNode(title="Pack"), TaskTreeNode(title="Clean")],
+        )
+        async with session_factory() as session:
+            await crud.insert_subtree_in_db(session, task.id, tree, 1)
+        async with session_factory() as session:
+            with pytest.raises(crud.SubtasksExistError):
+                await crud.insert_subtree_in_db(session, task.id, tree, 1)
+        async with session_factory() as session:
+            return await crud.get_task_subtree_flat(session, task.id, 1)
+
+
+def test_task_is_decomposed_only_once(db_schema):
+    """Tests that a second subtree is rejected instead of appended."""
+    rows = asyncio.run(_decompose_twice(db_schema))
+
+    assert [(task.title, depth) for task, depth in rows] == [
+        ("Move out", 0),
+        ("Pack", 1),
+        ("Clean", 1),
+    ]
+
+
+async def _delete_and_page(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as session:
+            tasks = [
+                DBTask(title=title, user_id=user_id)
+                for title, user_id in (("Pack", 1), ("Clean", 2), ("Go", 1))
+            ]
+            session.add_all(tasks)
+            await session.commit()
+            await session.delete(tasks[0])
+            await session.delete(tasks[1])
+            await session.commit()
+
+        pages = []
+        since, after_id = datetime(2000, 1, 1, tzinfo=timezone.utc), None
+        async with session_factory() as session:
+            while True:
+                page = await crud.get_deleted_tasks(session, since, 1, after_id)
+                if not page:
+                    break
+                pages.append([(task.id, task.user_id) for task in page])
+                since, after_id = page[-1].deleted_at, page[-1].id
+    return [(task.id, task.user_id) for task in tasks[:2]], pages
+
+
+def test_deleted_tasks_of_all_users_are_paged(db_schema):
+    """Tests the tombstones read by the notifier, one page at a time."""
+    deleted, pages = asyncio.run(_delete_and_page(db_schema))
+
+    assert pages == [[task] for task in sorted(deleted)]
+
+
+async def _read_tree(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as session:
+            task = DBTask(title="Move out", user_id=1)
+            session.add(task)
+            await session.commit()
+        tree = TaskTreeNode(
+            title="Move out",
+            subtasks=[
+                TaskTreeNode(
+                    title="Pack", subtasks=[TaskTreeNode(title="Tape")]
+                ),
+                TaskTreeNode(title="Clean"),
+            ],
+        )
+        async with session_factory() as session:
+            await crud.insert_subtree_in_db(session, task.id, tree, 1)
+
+        async def db_session():
+            async with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_db_session] = db_session
+        try:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://tasks"
+            ) as client:
+                flat = await client.get(
+                    f"/tasks/{task.id}", params={"format": "flat"}
+                )
+                nested = await client.get(
+                    f"/tasks/{task.id}",
+                    params={"format": "nested", "include_archived": True},
+                )
+                missing = await client.get(
+                    "/tasks/0", params={"format": "flat"}
+                )
+        finally:
+            app.dependency_overrides.clear()
+    return flat, nested, missing
+
+
+def test_read_task_flat_and_nested(db_schema):
+    """Tests both formats of GET /tasks/{id} built from the flat subtree."""
+    flat, nested, missing = asyncio.run(_read_tree(db_schema))
+
+    assert flat.status_code == 200
+    assert [
+        (node["title"], node["depth"]) for node in flat.json()["nodes"]
+    ] == [("Move out", 0), ("Pack", 1), ("Tape", 2), ("Clean", 1)]
+    assert nested.status_code == 200
+    root = nested.json()
+    assert root["title"] == "Move out"
+    assert [task["title"] for task in root["subtasks"]] == ["Pack", "Clean"]
+    assert [task["title"] for task in root["subtasks"][0]["subtasks"]] == [
+        "Tape"
+    ]
+    assert missing.status_code == 404
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from app.db import embedding
+
+
+class Model:
+    def encode(self, texts, batch_size, convert_to_numpy):
+        return np.ones((len(texts), embedding.EMBEDDING_SIZE))
+
+
+def test_local_model_is_loaded_once_off_the_event_loop(monkeypatch):
+    """Tests that concurrent first requests wait for one load in a thread."""
+    loads = []
+
+    def load_model():
+        loads.append(threading.current_thread())
+        return Model()
+
+    monkeypatch.setattr(embedding, "load_model", load_model)
+    monkeypatch.setattr(embedding, "_local_batcher", None)
+    monkeypatch.setattr(embedding, "_local_lock", asyncio.Lock())
+    monkeypatch.setattr(embedding.settings, "EMBEDDING_SERVICE_URL", "")
+
+    async def main():
+        return await asyncio.gather(
+            embedding.generate_embeddings(["Pack"]),
+            embedding.generate_embeddings(["Clean", "Tape"]),
+        )
+
+    first, second = asyncio.run(main())
+
+    assert len(first) == 1 and len(second) == 2
+    assert len(loads) == 1
+    assert loads[0] is not threading.main_thread()
@@ -0,0 +1,47 @@
+import asyncio
+
+from app.core.events import RESYNC, EventBroker
+
+
+def test_events_reach_the_subscribers_of_their_user():
+    """Tests fan-out by user and unsubscribing."""
+    broker = EventBroker()
+
+    with broker.subscribe(1) as first, broker.subscribe(1) as second:
+        with broker.subscribe(2) as other:
+            broker.publish(1, {"op": "INSERT", "ids": [7]})
+            broker.publish(3, {"op": "DELETE", "ids": [8]})
+            assert broker.subscribers == 3
+        assert first.get_nowait() == second.get_nowait()
+        assert other.empty() and first.empty()
+        broker.publish_all(RESYNC)
+        assert first.get_nowait() == RESYNC
+    assert broker.subscribers == 0
+
+
+def test_slow_subscriber_is_told_to_resync():
+    """Tests that a full queue is replaced by a single RESYNC."""
+    broker = EventBroker(max_queued=2)
+
+    with broker.subscribe(1) as queue:
+        for i in range(3):
+            broker.publish(1, {"op": "UPDATE", "ids": [i]})
+        broker.publish(1, {"op": "UPDATE", "ids": [3]})
+
+        events = [queue.get_nowait() for _ in range(queue.qsize())]
+
+    assert events == [RESYNC, {"op": "UPDATE", "ids": [3]}]
+
+
+def test_subscriber_waits_for_events():
+    """Tests that a queue can be awaited from another task."""
+    broker = EventBroker()
+
+    async def main():
+        with broker.subscribe(1) as queue:
+            asyncio.get_running_loop().call_soon(
+                broker.publish, 1, {"op": "INSERT"}
+            )
+            return await asyncio.wait_for(queue.get(), 1)
+
+    assert asyncio.run(main()) == {"op": "INSERT"}
@@ -0,0 +1,146 @@
+import asyncio
+import re
+from contextlib import contextmanager
+
+from core_lib.models.task import TaskUpdate
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.db import crud
+from app.db.models import Task as DBTask
+
+SCHEMA = "test_partitioning"
+
+
+async def _scanned_partitions(db_schema, monkeypatch):
+    async def generate_embedding(text):
+        return [0.5] * 384
+
+    monkeypatch.setattr(crud, "generate_embedding", generate_embedding)
+
+    async with db_schema(SCHEMA) as engine:
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as session:
+            # Two users with the same tree, so that each partition is not
+            # empty
+            for user_id in (1, 2):
+                root = DBTask(title="Move out", user_id=user_id)
+                root.subtasks = [
+                    DBTask(
+                        title=title,
+                        user_id=user_id,
+                        level=1,
+                        embedding=[float(i + 1)] * 384,
+                    )
+                    for i, title in enumerate(("Pack", "Clean"))
+                ]
+                session.add(root)
+            await session.commit()
+            root_id = root.id
+            leaf_id = root.subtasks[0].id
+            other_leaf_id = root.subtasks[1].id
+
+        # Statements by the call that sent them
+        statements = {}
+
+        @contextmanager
+        def capture(name):
+            sent = statements.setdefault(name, [])
+
+            def before(
+                connection, cursor, statement, parameters, context, many
+            ):
+                sent.append((statement, parameters))
+
+            event.listen(engine.sync_engine, "before_cursor_execute", before)
+            try:
+                yield
+            finally:
+                event.remove(
+                    engine.sync_engine, "before_cursor_execute", before
+                )
+
+        async with session_factory() as session:
+            with capture("get_task_by_id"):
+                task = await crud.get_task_by_id(session, root_id, user_id=2)
+            with capture("get_task_subtree_flat"):
+                flat = await crud.get_task_subtree_flat(
+                    session, root_id, user_id=2
+                )
+            with capture("get_task_ancestors"):
+                parents = await crud.get_task_ancestors(
+                    session, leaf_id, user_id=2
+                )
+            with capture("get_tasks_by_user"):
+                await crud.get_tasks_by_user(session, user_id=2)
+            with capture("get_root_tasks"):
+                await crud.get_root_tasks(session, user_id=2)
+            with capture("get_unscheduled_tasks"):
+                await crud.get_unscheduled_tasks(session, user_id=2)
+            with capture("search_similar_tasks"):
+                similar = await crud.search_similar_tasks(
+                    session, user_id=2, query="Pack", limit=1
+                )
+            with capture("get_task_changes"):
+                await crud.get_task_changes(session, 2, after=None, limit=10)
+        async with session_factory() as session:
+            with capture("update_task_in_db"):
+                await crud.update_task_in_db(
+                    session, leaf_id, TaskUpdate(title="Pack up"), user_id=2
+                )
+        async with session_factory() as session:
+            with capture("delete_task_in_db"):
+                assert await crud.delete_task_in_db(
+                    session, other_leaf_id, user_id=2
+                )
+        assert len(task.subtasks) == 2
+        assert len(flat) == 3
+        assert [parent.id for parent in parents] == [root_id]
+        assert [task.title for task in similar] == ["Pack"]
+
+        scanned = {}
+        async with engine.connect() as connection:
+            raw = (await connection.get_raw_connection()).driver_connection
+            # Tables are tiny, so without this every plan is a sequential
+            # scan and nothing tells if an index of the partition is usable
+            await raw.execute("SET enable_seqscan = off")
+            for name, sent in statements.items():
+                for statement, parameters in sent:
+                    scanned.setdefault(name, []).append(
+                        await _explain(raw, statement, parameters)
+                    )
+            # On tiny partitions an index on user_id and a sort always win;
+            # the ordered scan of the HNSW index is the plan without a sort
+            await raw.execute("SET enable_sort = off")
+            (statement, parameters), *_ = statements["search_similar_tasks"]
+            hnsw_search = await _explain(raw, statement, parameters)
+    return scanned, hnsw_search
+
+
+async def _explain(raw, statement, parameters) -> str:
+    plan = await raw.fetch(f"EXPLAIN {statement}", *parameters)
+    return "\n".join(row[0] for row in plan)
+
+
+def _partitions(plan: str) -> set:
+    return set(re.findall(r"\btasks_p\d+\b", plan))
+
+
+def test_queries_of_a_user_read_one_partition(db_schema, monkeypatch):
+    """Tests partition pruning of the queries given the user_id."""
+    scanned, hnsw_search = asyncio.run(
+        _scanned_partitions(db_schema, monkeypatch)
+    )
+
+    partitions = set()
+    for name, plans in scanned.items():
+        read = [_partitions(plan) for plan in plans if _partitions(plan)]
+        assert read, f"{name} read no partition"
+        assert all(len(names) == 1 for names in read), (name, plans)
+        partitions |= set.union(*read)
+    assert len(partitions) == 1
+
+    # The HNSW index is built for every partition, so a search reads the
+    # index of the user's partition only
+    assert _partitions(hnsw_search) == partitions
+    assert re.search(r"Index Scan using tasks_p\d+_embedding_idx", hnsw_search)
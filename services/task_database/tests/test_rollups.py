@@ -0,0 +1,164 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core_lib.models.task import TaskUpdate
+
+from app.db import crud
+from app.db.mappers import db_roots_to_dashboard, db_task_to_progress
+from app.db.models import TaskStatus
+from app.db.models import Task as DBTask
+
+SCHEMA = "test_rollups"
+
+NOW = datetime(2026, 10, 1, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+async def _rollups(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        progress = {}
+
+        async def read(name, task):
+            # A new session each time, so that the rollups are read again
+            async with session_factory() as reader:
+                db_task = await crud.get_task_without_subtree(
+                    reader, task.id, 1
+                )
+                progress[name] = db_task_to_progress(db_task)
+
+        async with session_factory() as session:
+            move = DBTask(
+                title="Move", user_id=1, estimated_duration=HOUR, deadline=NOW
+            )
+            transport = DBTask(
+                title="Transport",
+                user_id=1,
+                estimated_duration=3 * HOUR,
+                deadline=NOW + timedelta(days=9),
+            )
+            van = DBTask(
+                title="Rent a van",
+                user_id=1,
+                estimated_duration=HOUR / 2,
+                deadline=NOW + timedelta(days=2),
+            )
+            transport.subtasks = [van]
+            move.subtasks = [
+                DBTask(
+                    title="Pack",
+                    user_id=1,
+                    status=TaskStatus.COMPLETED,
+                    estimated_duration=2 * HOUR,
+                    deadline=NOW + timedelta(days=3),
+                ),
+                transport,
+            ]
+            paint = DBTask(
+                title="Paint", user_id=1, deadline=NOW + timedelta(days=1)
+            )
+            session.add_all([move, paint])
+            await session.commit()
+            await read("created", move)
+
+            await crud.update_task_in_db(
+                session, van.id, TaskUpdate(status=TaskStatus.COMPLETED), 1
+            )
+            await read("completed", move)
+
+            await crud.update_task_in_db(
+                session, transport.id, TaskUpdate(parent_id=paint.id), 1
+            )
+            await read("moved_from", move)
+            await read("moved_to", paint)
+
+            # Archived subtasks keep counting
+            await session.execute(
+                DBTask.__table__.update()
+                .where(DBTask.title == "Pack")
+                .values(updated_at=NOW - timedelta(days=100))
+            )
+            await session.commit()
+            await crud.archive_finished_tasks(session, NOW, 10)
+            await read("archived", move)
+
+            await crud.delete_task_in_db(session, transport.id, 1)
+            await read("deleted", paint)
+
+        async with session_factory() as reader:
+            dashboard = db_roots_to_dashboard(
+                1, await crud.get_root_tasks(reader, 1)
+            )
+    return progress, dashboard
+
+
+def test_rollups_follow_inserts_updates_moves_and_deletes(db_schema):
+    """Tests the rollup triggers through the progress of two trees."""
+    progress, dashboard = asyncio.run(_rollups(db_schema))
+
+    def summary(name):
+        p = progress[name]
+        return (
+            p.total_tasks,
+            p.completed_tasks,
+            p.estimated_duration / HOUR,
+            (p.deadline - NOW).days,
+        )
+
+    assert summary("created") == (4, 1, 6.5, 9)
+    assert progress["created"].completion == 0.25
+    assert summary("completed") == (4, 2, 6.5, 9)
+    # The latest deadline left with the moved subtree
+    assert summary("moved_from") == (2, 1, 3, 3)
+    assert summary("moved_to") == (3, 1, 3.5, 9)
+    assert summary("archived") == summary("moved_from")
+    assert summary("deleted") == (1, 0, 0, 1)
+
+    assert [tree.title for tree in dashboard.trees] == ["Paint", "Move"]
+    assert dashboard.total_tasks == 3
+    assert dashboard.completed_tasks == 1
+    assert dashboard.estimated_duration == 3 * HOUR
+
+
+async def _notifications(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        received = []
+        async with engine.connect() as connection:
+            raw = (await connection.get_raw_connection()).driver_connection
+            await raw.add_listener(
+                "task_changes",
+                lambda *args: received.append(json.loads(args[-1])),
+            )
+            async with session_factory() as session:
+                move = DBTask(title="Move", user_id=1)
+                session.add(move)
+                await session.commit()
+                pack = DBTask(
+                    title="Pack", user_id=1, parent_id=move.id, level=1
+                )
+                session.add(pack)
+                await session.commit()
+                await crud.update_task_in_db(
+                    session,
+                    pack.id,
+                    TaskUpdate(status=TaskStatus.COMPLETED),
+                    1,
+                )
+            # Notifications arrive once the listening connection is idle
+            await asyncio.sleep(0.2)
+    return move.id, pack.id, received
+
+
+def test_rollup_updates_are_not_notified(db_schema):
+    """Tests that writing a subtask notifies it alone, not its parent."""
+    move_id, pack_id, received = asyncio.run(_notifications(db_schema))
+
+    assert [(event["op"], event["ids"]) for event in received] == [
+        ("INSERT", [move_id]),
+        ("INSERT", [pack_id]),
+        ("UPDATE", [pack_id]),
+    ]
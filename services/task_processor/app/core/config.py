@@ -0,0 +1,79 @@
+from datetime import timedelta
+from typing import List, Optional
+
+from pydantic import BaseModel
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class LLMBackendConfig(BaseModel):
+    """One OpenAI-compatible chat endpoint the model router can use."""
+
+    name: str
+    model: str
+    base_url: str
+    # Name of the environment variable holding the API key
+    api_key_env: Optional[str] = None
+    # Literal key for endpoints that do not check it (e.g. Ollama)
+    api_key: str = "not-needed"
+    temperature: float = 0.7
+    timeout: float = 60.0
+
+
+class Settings(BaseSettings):
+    """
+    Application settings loaded from environment variables.
+    """
+
+    # model_config allows loading from a .env file
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", extra="ignore"
+    )
+
+    # Base URL of the task_database service
+    DATABASE_SERVICE_URL: str = "http://localhost:8100"
+
+    # Base URL of the user_database service
+    USER_SERVICE_URL: str = "http://localhost:8200"
+    # User profiles are served from a local cache for this many seconds
+    # before they are revalidated against user_database
+    USER_PROFILE_TTL_SECONDS: float = 5.0
+    USER_PROFILE_CACHE_SIZE: int = 10_000
+
+    # The prompt context of a task (profile, parent tasks, similar tasks) is
+    # fetched concurrently; sources slower than this are left out
+    CONTEXT_DEADLINE_MS: int = 300
+    # Number of similar tasks of the user shown to the model
+    CONTEXT_SIMILAR_TASKS: int = 3
+
+    # Maximum number of tokens a rendered decomposition prompt may take.
+    # Optional context sections are dropped first, then the goal is cut.
+    PROMPT_TOKEN_BUDGET: int = 1500
+
+    # Steps of a decomposed task are placed into the free slots of the
+    # user's schedule within this horizon, this far apart
+    SCHEDULE_HORIZON: timedelta = timedelta(weeks=4)
+    SCHEDULE_GAP: timedelta = timedelta(minutes=15)
+
+    # Chat backends for the model router, as a JSON list in the environment,
+    # e.g. LLM_BACKENDS='[{"name": "ollama", "model": "llama3",
+    #                      "base_url": "http://localhost:11434/v1"}]'
+    LLM_BACKENDS: List[LLMBackendConfig] = [
+        LLMBackendConfig(
+            name="openrouter-deepseek",
+            model="deepseek/deepseek-chat:free",
+            base_url="https://openrouter.ai/api/v1",
+            api_key_env="DEEPSEEK_API_KEY",
+        )
+    ]
+    # A backend whose error EWMA is above this rate is skipped for
+    # LLM_UNHEALTHY_COOLDOWN seconds
+    LLM_MAX_ERROR_RATE: float = 0.5
+    LLM_UNHEALTHY_COOLDOWN: float = 30.0
+    # Fire a second request at the next backend once the first one is
+    # slower than its LLM_HEDGE_QUANTILE latency (at least LLM_HEDGE_MIN_DELAY)
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_MIN_DELAY: float = 1.0
+
+
+settings = Settings()
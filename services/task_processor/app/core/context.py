@@ -0,0 +1,128 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import httpx
+
+from core_lib.models.task import Task
+from core_lib.tracing import TracingTransport
+from core_lib.wire import ACCEPT_HEADERS, decode_response
+
+from .config import settings
+from .logging_config import logger
+from .user_profiles import UserProfileCache
+
+
+class ContextAssembler:
+    """
+    Gathers the prompt context of a task from the other services.
+
+    The profile of the owner, the parents of the task and similar tasks of
+    the same user are fetched concurrently, under one deadline of `deadline`
+    seconds. A source that fails or misses the deadline is left out of the
+    context, so a richer prompt costs at most the deadline, however slow
+    one of the services is.
+    """
+
+    def __init__(
+        self,
+        profiles: UserProfileCache,
+        base_url: str,
+        deadline: float = settings.CONTEXT_DEADLINE_MS / 1000,
+        similar_tasks: int = settings.CONTEXT_SIMILAR_TASKS,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.profiles = profiles
+        self.deadline = deadline
+        self.similar_tasks = similar_tasks
+        self._client = client or httpx.AsyncClient(
+            base_url=base_url, transport=TracingTransport()
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def assemble(self, task: Task) -> Dict[str, str]:
+        """
+        Builds the prompt context sections of `task`, most important first,
+        as PromptBuilder takes them. Empty sections are left out.
+        """
+        sources = {
+            "about the user": self._about_user(task),
+            "parent tasks": self._parent_tasks(task),
+            "similar tasks": self._similar_tasks(task),
+        }
+        # All sources start together, so each one's timeout is the deadline
+        # of the whole context. A profile that is too slow is still cached
+        # once it arrives: UserProfileCache shields its requests.
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(source, self.deadline)
+                for source in sources.values()
+            ),
+            return_exceptions=True,
+        )
+
+        context = {}
+        for name, result in zip(sources, results):
+            if isinstance(result, TimeoutError):
+                logger.warning(
+                    "Context '%s' of task %s missed the deadline of %.0f ms",
+                    name,
+                    task.id,
+                    self.deadline * 1000,
+                )
+            elif isinstance(result, BaseException):
+                logger.warning(
+                    "Could not load context '%s' of task %s: %s",
+                    name,
+                    task.id,
+                    result,
+                )
+            elif result:
+                context[name] = result
+        return context
+
+    async def _get_tasks(self, url: str, params: dict) -> List[Task]:
+        response = await self._client.get(
+            url, params=params, headers=ACCEPT_HEADERS
+        )
+        response.raise_for_status()
+        return [Task.model_validate(item) for item in decode_response(response)]
+
+    async def _about_user(self, task: Task) -> Optional[str]:
+        user = await self.profiles.get(task.user_id)
+        return user.description_for_llm if user is not None else None
+
+    async def _parent_tasks(self, task: Task) -> Optional[str]:
+        if task.parent_id is None:
+            return None
+        parents = await self._get_tasks(
+            f"/tasks/{task.id}/ancestors", {"user_id": task.user_id}
+        )
+        return " > ".join(parent.title for parent in parents)
+
+    async def _similar_tasks(self, task: Task) -> Optional[str]:
+        if self.similar_tasks <= 0:
+            return None
+        # One more, since the task itself is usually the closest match
+        similar = await self._get_tasks(
+            "/tasks/search_similar/",
+            {
+                "user_id": task.user_id,
+                "query": f"{task.title}\n{task.description or ''}",
+                "limit": self.similar_tasks + 1,
+            },
+        )
+        similar = [other for other in similar if other.id != task.id]
+        return "\n".join(
+            _describe(other) for other in similar[: self.similar_tasks]
+        )
+
+
+def _describe(task: Task) -> str:
+    """One line about a similar task: its title, status and effort."""
+    details = [task.status.value]
+    if task.estimated_duration is not None:
+        minutes = task.estimated_duration.total_seconds() // 60
+        details.append(f"{minutes:.0f} min")
+    return f"- {task.title} ({', '.join(details)})"
@@ -0,0 +1,43 @@
+from datetime import timedelta
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from core_lib.models.task import TaskTreeNode
+
+# Compact description of DecompositionNode for the prompt. The full JSON
+# schema of the model is several times longer and costs tokens on every call.
+FORMAT_INSTRUCTIONS = """Reply with a single JSON object and nothing else:
+{"title": str, "description": str, "complexity": 0..1, "priority": 0..1, \
+"minutes": int, "subtasks": [<objects of the same shape>]}"""
+
+
+class DecompositionNode(BaseModel):
+    """
+    Minimal task tree the LLM is asked to produce. It only holds the fields
+    the model should generate; DB fields are filled in by task_database.
+    """
+
+    title: str = Field(..., min_length=3, max_length=120)
+    description: Optional[str] = None
+    complexity: float = Field(default=0.0, ge=0.0, le=1.0)
+    priority: float = Field(default=0.0, ge=0.0, le=1.0)
+    minutes: Optional[int] = Field(default=None, ge=1)
+    subtasks: List["DecompositionNode"] = []
+
+    def to_task_tree(self) -> TaskTreeNode:
+        """
+        Converts the node to a TaskTreeNode. Only the fields the model
+        actually returned are set, so they do not overwrite stored values
+        when the tree is sent with `exclude_unset`.
+        """
+        data = self.model_dump(
+            include=self.model_fields_set - {"minutes", "subtasks"}
+        )
+        if self.minutes is not None:
+            data["estimated_duration"] = timedelta(minutes=self.minutes)
+        data["subtasks"] = [subtask.to_task_tree() for subtask in self.subtasks]
+        return TaskTreeNode(**data)
+
+
+DecompositionNode.model_rebuild()
@@ -1,66 +1,30 @@
+from collections import Counter
+from typing import Dict, Optional
+
 from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.exceptions import OutputParserException
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import ChatPromptTemplate
+
+from core_lib.instrumentation import counter
 
 # We will get the task model from our shared library
-from core_lib.models.task import Task
+from core_lib.models.task import Task, TaskTreeNode
 
+from .decomposition import DecompositionNode
 from .logging_config import logger
+from .prompt import BuiltPrompt, PromptBuilder
+from .repair import OutputRepairError, repair_output
 
-# --- System Prompt ---
-# This is the core instruction for our AI assistant.
-PROMPT_TEMPLATE = """
-You are TaskMaster AI, an expert in hierarchical task decomposition and time-based planning.
-Transform high-level goals into detailed daily action plans with atomic subtasks.
-
-
-RULES FOR SUBTASK DECOMPOSITION:
-1. ATOMIC TASKS:
-   - Each subtask must be executable without further breakdown
-   - Maximum 1 core action per subtask
-   - Clear completion criteria for every subtask
-
-2. TIME MANAGEMENT:
-   - Calculate duration from explicit time markers (e.g., "[15 min]")
-   - Default scheduling:
-     * Weekdays: First task at 19:00
-     * Weekends: First task at 10:00
-   - Minimum 10min buffer between subtasks
-
-3. REQUIRED FIELDS PER SUBTASK:
-   - title: Action-oriented verb phrase ("Practice scales", "Write API endpoints")
-   - description: Numbered steps with time allocations per step
-   - time_required: Total minutes (sum of step times)
-   - resources: Any needed tools/materials
-   - dependencies: Previous subtask IDs if required
-   - metrics: Quantifiable success criteria
-
-4. HIERARCHY PRINCIPLES:
-   - 3-5 subtasks per day
-   - Progressive difficulty: Foundation → Application → Mastery
-   - Weekly themes: Week 1: Basics, Week 2: Integration, etc.
-
-5. CONTENT REQUIREMENTS:
-   - Include time estimates for EVERY step (e.g., "1. Warm-up [10 min]: ...")
-   - Add pedagogical elements:
-     * Theory + practice balance
-     * Progressive overload
-     * Spaced repetition
-   - Domain-specific details (technical terms, best practices)
-
-6. DEFAULTS:
-   - Start date: Tomorrow (2025-06-23)
-   - Subtask duration: 25-50min (learning), 30-90min (projects)
-   - Complexity/Priority:
-        Skill acquisition: 0.8/0.7
-        Project delivery: 0.9/0.9
-        Habit building: 0.5/0.6
-
-USER'S GOAL:
-{goal}
-
-{format_instructions}
-"""
+# Longest part of a failed error message that is sent back to the model
+REASK_ERROR_MAX_CHARS = 500
+
+PARSE_OUTCOMES = counter(
+    "llm_output_parse_total",
+    "LLM responses by how they were parsed: clean, repaired locally, "
+    "re-asked, or failed.",
+    ["outcome"],
+)
 
 
 # TODO tags from user tags storage
@@ -69,30 +33,84 @@ class TaskProcessor:
     Encapsulates the logic for processing a goal using an LLM chain.
     """
 
-    def __init__(self, model: BaseChatModel):
-        # 1. Create a Pydantic parser for our Task model
-        self.parser = PydanticOutputParser(pydantic_object=Task)
-
-        # 2. Create a prompt template with format instructions
-        self.prompt = ChatPromptTemplate.from_template(
-            template=PROMPT_TEMPLATE,
-            partial_variables={
-                "format_instructions": self.parser.get_format_instructions()
-            },
+    def __init__(
+        self,
+        model: BaseChatModel,
+        prompt_builder: Optional[PromptBuilder] = None,
+    ):
+        self.model = model
+        # Parser for the minimal decomposition schema the LLM produces
+        self.parser = PydanticOutputParser(pydantic_object=DecompositionNode)
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        # How often each parsing path is taken:
+        # clean, repaired (locally), reasked (extra LLM call) and failed
+        self.parse_stats = Counter()
+
+    def _count_parse(self, outcome: str) -> None:
+        self.parse_stats[outcome] += 1
+        PARSE_OUTCOMES.labels(outcome).inc()
+
+    def _log_usage(self, prompt: BuiltPrompt, message: BaseMessage) -> None:
+        """Logs prompt and completion token counts of one LLM call."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        logger.info(
+            "LLM call tokens: prompt=%s completion=%s (estimated prompt=%d)",
+            usage.get("input_tokens", prompt.tokens),
+            usage.get("output_tokens", "n/a"),
+            prompt.tokens,
         )
-        print(self.parser.get_format_instructions())
 
-        # 3. Create the processing chain
-        self.chain = self.prompt | model | self.parser
+    async def _parse(self, output: str) -> DecompositionNode:
+        """
+        Parses an LLM response. Malformed output is first repaired locally;
+        the model is only asked again when that fails.
+        """
+        try:
+            node = self.parser.parse(output)
+            self._count_parse("clean")
+            return node
+        except OutputParserException as e:
+            error = e
 
-    async def process_goal(self, goal: str) -> Task:
+        try:
+            node = repair_output(output)
+            self._count_parse("repaired")
+            logger.info(f"Repaired malformed LLM output locally: {error}")
+            return node
+        except OutputRepairError as e:
+            error = e
+
+        logger.warning(f"Local repair failed, re-asking the model: {error}")
+        prompt = self.prompt_builder.build_reask(
+            output=output, error=str(error)[:REASK_ERROR_MAX_CHARS]
+        )
+        message = await self.model.ainvoke(prompt.text)
+        self._log_usage(prompt, message)
+        try:
+            node = repair_output(message.content)
+        except OutputRepairError:
+            self._count_parse("failed")
+            raise
+        self._count_parse("reasked")
+        return node
+
+    async def _decompose(
+        self, goal: str, context: Optional[Dict[str, str]] = None
+    ) -> TaskTreeNode:
+        """Runs one LLM call for `goal` and parses the decomposition."""
+        prompt = self.prompt_builder.build(goal, context)
+        message = await self.model.ainvoke(prompt.text)
+        self._log_usage(prompt, message)
+        node = await self._parse(message.content)
+        return node.to_task_tree()
+
+    async def process_goal(self, goal: str) -> TaskTreeNode:
         """
-        Processes the user's goal and returns a structured Task object.
+        Processes the user's goal and returns a structured task tree.
         """
         logger.info(f"Starting to process goal: '{goal[:50]}...'")
         try:
-            # The .ainvoke method runs the chain asynchronously
-            response = await self.chain.ainvoke({"goal": goal})
+            response = await self._decompose(goal)
             logger.info(
                 f"Successfully parsed LLM response for goal: '{goal[:50]}...'"
             )
@@ -104,18 +122,18 @@ class TaskProcessor:
             )
             raise
 
-    async def process_task(self, task: Task) -> Task:
+    async def process_task(
+        self, task: Task, context: Optional[Dict[str, str]] = None
+    ) -> TaskTreeNode:
         """
-        Processes the user's task and returns new Task object.
+        Processes the user's task and returns it decomposed into a task tree.
+        `context` holds optional prompt sections, most important first.
         """
         goal = f" - {task.title} - \n{task.description}"
-        logger.info(f"Starting to process goal: '{repr(task)[:50]}...'")
+        logger.info("Starting to process task %s: '%.50s...'", task.id, goal)
         try:
-            # The .ainvoke method runs the chain asynchronously
-            response = await self.chain.ainvoke({"goal": goal})
-            logger.info(
-                f"Successfully parsed LLM response for goal: '{goal[:50]}...'"
-            )
+            response = await self._decompose(goal, context)
+            logger.info("Successfully parsed LLM response for task %s", task.id)
             return response
         except Exception as e:
             logger.error(
@@ -0,0 +1,148 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .config import settings
+from .decomposition import FORMAT_INSTRUCTIONS
+from .logging_config import logger
+
+# --- System Prompt ---
+# This is the core instruction for our AI assistant. It is kept short on
+# purpose: every token here is paid for on every call.
+PROMPT_TEMPLATE = """You are TaskMaster AI, an expert in hierarchical task decomposition.
+Break the user's goal down into a tree of atomic, action-oriented subtasks.
+
+Rules:
+- A leaf is one concrete action with a clear completion criterion.
+- 3-7 subtasks per node; nest only when a step needs further breakdown.
+- title: verb phrase; description: short numbered steps.
+- minutes: realistic effort (25-50 for learning, 30-90 for project work).
+- complexity/priority: skill 0.8/0.7, project 0.9/0.9, habit 0.5/0.6.
+{context}
+USER'S GOAL:
+{goal}
+
+{format_instructions}
+"""
+
+# Targeted re-ask used when a response can not be repaired locally. It only
+# carries the broken output and the error, not the goal and context.
+REASK_TEMPLATE = """Your previous reply could not be parsed.
+Error: {error}
+
+Fix it and reply with the corrected JSON only.
+{format_instructions}
+
+PREVIOUS REPLY:
+{output}
+"""
+
+# Rough number of characters per token, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+
+def _load_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(
+            f"Tokenizer unavailable, falling back to an estimate: {e}"
+        )
+        return None
+
+
+_encoding = _load_encoding()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens in `text`. Uses the cl100k tokenizer when available
+    and an estimate of CHARS_PER_TOKEN characters per token otherwise.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class BuiltPrompt:
+    """A rendered prompt together with its measured size."""
+
+    text: str
+    tokens: int
+    dropped_sections: List[str] = field(default_factory=list)
+
+
+class PromptBuilder:
+    """
+    Renders the decomposition prompt and keeps it within a token budget.
+
+    Context sections are passed in order of importance. When the prompt is
+    over budget the least important sections are dropped first; if it still
+    does not fit, the goal text is shortened.
+    """
+
+    def __init__(
+        self,
+        template: str = PROMPT_TEMPLATE,
+        format_instructions: str = FORMAT_INSTRUCTIONS,
+        token_budget: int = settings.PROMPT_TOKEN_BUDGET,
+    ):
+        self.template = template
+        self.format_instructions = format_instructions
+        self.token_budget = token_budget
+
+    def _render(self, goal: str, sections: Dict[str, str]) -> str:
+        context = "".join(
+            f"\n{name.upper()}:\n{text}\n" for name, text in sections.items()
+        )
+        return self.template.format(
+            context=context,
+            goal=goal,
+            format_instructions=self.format_instructions,
+        )
+
+    def build(
+        self, goal: str, context: Optional[Dict[str, str]] = None
+    ) -> BuiltPrompt:
+        """
+        Builds a prompt for `goal` with as many `context` sections as the
+        token budget allows.
+        """
+        sections = dict(context or {})
+        dropped = []
+        text = self._render(goal, sections)
+        tokens = count_tokens(text)
+
+        while tokens > self.token_budget and sections:
+            name = list(sections)[-1]
+            del sections[name]
+            dropped.append(name)
+            text = self._render(goal, sections)
+            tokens = count_tokens(text)
+
+        if tokens > self.token_budget:
+            # Cut the goal until the prompt fits
+            while tokens > self.token_budget and goal:
+                excess = tokens - self.token_budget
+                goal = goal[: max(len(goal) - excess * CHARS_PER_TOKEN, 0)]
+                text = self._render(goal, sections)
+                tokens = count_tokens(text)
+            logger.warning(
+                f"Prompt exceeded the budget of {self.token_budget} tokens, "
+                f"the goal was shortened to {len(goal)} characters."
+            )
+
+        if dropped:
+            logger.info(f"Dropped context sections over budget: {dropped}")
+        return BuiltPrompt(text=text, tokens=tokens, dropped_sections=dropped)
+
+    def build_reask(self, output: str, error: str) -> BuiltPrompt:
+        """Builds the targeted re-ask prompt for a response that failed."""
+        text = REASK_TEMPLATE.format(
+            error=error,
+            format_instructions=self.format_instructions,
+            output=output,
+        )
+        return BuiltPrompt(text=text, tokens=count_tokens(text))
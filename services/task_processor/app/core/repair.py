@@ -0,0 +1,163 @@
+import ast
+import json
+import re
+from typing import Any
+
+from pydantic import ValidationError
+
+from .decomposition import DecompositionNode
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_JSON_LITERALS = {"true": "True", "false": "False", "null": "None"}
+_JSON_LITERAL_RE = re.compile(r"\b(true|false|null)\b")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+# Quoted strings, with either quote and escapes, to leave them untouched
+_STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+
+TITLE_MAX_LENGTH = 120
+
+
+class OutputRepairError(ValueError):
+    """Raised when an LLM response can not be turned into a decomposition."""
+
+
+def extract_json(text: str) -> str:
+    """
+    Extracts the JSON object from an LLM response: the content of a
+    markdown fence if there is one, otherwise the outermost {...} block.
+    """
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        raise OutputRepairError("No JSON object found in the response")
+    return text[start : end + 1]
+
+
+def _sub_outside_strings(pattern: re.Pattern, repl, payload: str) -> str:
+    """Applies `pattern.sub` to the parts of `payload` outside strings."""
+    parts = []
+    last = 0
+    for string in _STRING_RE.finditer(payload):
+        parts.append(pattern.sub(repl, payload[last : string.start()]))
+        parts.append(string.group())
+        last = string.end()
+    parts.append(pattern.sub(repl, payload[last:]))
+    return "".join(parts)
+
+
+def loads_lenient(payload: str) -> Any:
+    """
+    Parses almost-JSON: trailing commas, single quotes, smart quotes and
+    Python-style literals are accepted. Text inside strings is kept as is.
+    """
+    try:
+        return json.loads(payload)
+    except json.JSONDecodeError:
+        pass
+    # Smart quotes are taken for JSON quotes only if the payload does not
+    # parse with them, since valid JSON may use them inside strings
+    error = None
+    for candidate in (payload, payload.translate(_SMART_QUOTES)):
+        try:
+            return json.loads(
+                _sub_outside_strings(_TRAILING_COMMA_RE, r"\1", candidate)
+            )
+        except json.JSONDecodeError:
+            pass
+        # A Python literal covers single quotes and trailing commas at once
+        try:
+            return ast.literal_eval(
+                _sub_outside_strings(
+                    _JSON_LITERAL_RE,
+                    lambda m: _JSON_LITERALS[m.group(1)],
+                    candidate,
+                )
+            )
+        except (ValueError, TypeError, SyntaxError) as e:
+            error = e
+    raise OutputRepairError(f"Response is not valid JSON: {error}") from error
+
+
+def _coerce_unit_interval(value: Any) -> float:
+    """
+    Coerces a score to [0, 1]. Scores out of 10 (e.g. 7) and percentages
+    (e.g. 80) are scaled down, anything else is clamped.
+    """
+    if isinstance(value, str):
+        match = _NUMBER_RE.search(value)
+        if not match:
+            raise OutputRepairError(f"Expected a score, got {value!r}")
+        value = float(match.group())
+    try:
+        value = float(value)
+    except (TypeError, ValueError) as e:
+        raise OutputRepairError(f"Expected a score, got {value!r}") from e
+    if 1.0 < value <= 10.0:
+        value /= 10.0
+    elif 10.0 < value <= 100.0:
+        value /= 100.0
+    return min(max(value, 0.0), 1.0)
+
+
+def _coerce_minutes(value: Any) -> int | None:
+    if isinstance(value, str):
+        match = _NUMBER_RE.search(value)
+        value = match.group() if match else None
+    if value is None:
+        return None
+    try:
+        minutes = int(float(value))
+    except (TypeError, ValueError, OverflowError) as e:
+        raise OutputRepairError(f"Expected minutes, got {value!r}") from e
+    return minutes if minutes > 0 else None
+
+
+def coerce_node(data: Any) -> dict:
+    """
+    Coerces a parsed node and its subtree to the DecompositionNode shape:
+    out-of-range complexity/priority are clamped, durations given as text
+    are parsed and over-long titles are cut.
+    """
+    if not isinstance(data, dict):
+        raise OutputRepairError(f"Expected a JSON object, got {type(data)}")
+
+    # Walk the tree iteratively; nodes are coerced in place
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        for key in ("complexity", "priority"):
+            if node.get(key) is not None:
+                node[key] = _coerce_unit_interval(node[key])
+        if "minutes" in node:
+            node["minutes"] = _coerce_minutes(node["minutes"])
+        if isinstance(node.get("title"), str):
+            node["title"] = node["title"].strip()[:TITLE_MAX_LENGTH]
+
+        subtasks = node.get("subtasks")
+        if subtasks is None:
+            subtasks = []
+        elif isinstance(subtasks, dict):
+            subtasks = [subtasks]
+        node["subtasks"] = [sub for sub in subtasks if isinstance(sub, dict)]
+        stack.extend(node["subtasks"])
+    return data
+
+
+def repair_output(text: str) -> DecompositionNode:
+    """
+    Tries to turn a malformed LLM response into a DecompositionNode without
+    calling the model again.
+
+    Raises:
+        OutputRepairError: If the response can not be repaired locally.
+    """
+    data = coerce_node(loads_lenient(extract_json(text)))
+    try:
+        return DecompositionNode.model_validate(data)
+    except ValidationError as e:
+        raise OutputRepairError(f"Repaired output is still invalid: {e}") from e
@@ -0,0 +1,254 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core_lib.models.task import TaskTreeNode
+from core_lib.models.user_shedule import (
+    SLOT,
+    UserShedule,
+    as_utc,
+    slot_ceil,
+    slot_floor,
+)
+
+# Duration assumed for tasks without an estimate
+DEFAULT_DURATION = timedelta(minutes=30)
+DEFAULT_HORIZON = timedelta(weeks=4)
+
+
+@dataclass
+class Allocation:
+    """Result of allocate_slots, aligned with the input tasks."""
+
+    # First slot of each task, -1 if it did not fit within the horizon
+    start_slot: np.ndarray
+    # Placed, but ends after its own deadline
+    late: np.ndarray
+
+
+def availability_matrix(
+    shedules: Sequence[UserShedule],
+    start: datetime,
+    horizon: timedelta = DEFAULT_HORIZON,
+) -> Tuple[np.ndarray, datetime]:
+    """
+    Expands user schedules into a (users, slots) boolean matrix of free
+    slots. Column 0 is the returned first slot, slot_ceil(start).
+    """
+    first = slot_ceil(start)
+    slots = max((slot_floor(start + horizon) - first) // SLOT, 0)
+    nbytes = (slots + 7) // 8
+    packed = np.frombuffer(
+        b"".join(
+            shedule.availability_mask(start, start + horizon).to_bytes(
+                nbytes, "little"
+            )
+            for shedule in shedules
+        ),
+        dtype=np.uint8,
+    ).reshape(len(shedules), nbytes)
+    matrix = np.unpackbits(packed, axis=1, bitorder="little")[:, :slots]
+    return matrix.astype(bool), first
+
+
+def _free_run_lengths(availability: np.ndarray) -> np.ndarray:
+    """
+    For every user and slot, the number of consecutive free slots starting
+    there (0 for a busy slot).
+    """
+    users, slots = availability.shape
+    dtype = np.int16 if slots < np.iinfo(np.int16).max else np.int32
+    index = np.arange(slots, dtype=dtype)
+    # Position of the next busy slot at or after each slot
+    busy_at = np.where(availability, slots, index).astype(dtype)
+    next_busy = np.minimum.accumulate(busy_at[:, ::-1], axis=1)[:, ::-1]
+    return next_busy - index
+
+
+def _chain_reverse_cummin(
+    values: np.ndarray, chain: np.ndarray, order: np.ndarray
+) -> np.ndarray:
+    """
+    Within each chain, replaces every value by the minimum of itself and
+    all values later in the chain order. Used to make deadlines
+    non-decreasing along a plan, so that deadline order keeps plan order.
+    """
+    by_chain = np.lexsort((order, chain))[::-1]
+    chain_sorted = chain[by_chain]
+    group = np.concatenate(
+        ([0], np.cumsum(chain_sorted[1:] != chain_sorted[:-1]))
+    )
+    # Offsets decrease from group to group, so a running minimum never
+    # carries a value over into the next group
+    spread = int(values.max() - values.min()) + 1
+    offset = (group[-1] - group).astype(np.int64) * spread
+    result = np.empty_like(values)
+    result[by_chain] = np.minimum.accumulate(values[by_chain] + offset) - offset
+    return result
+
+
+def allocate_slots(
+    user_index: np.ndarray,
+    duration_slots: np.ndarray,
+    deadline_slot: np.ndarray,
+    priority: np.ndarray,
+    chain: np.ndarray,
+    order: np.ndarray,
+    availability: np.ndarray,
+    gap_slots: int = 0,
+) -> Allocation:
+    """
+    Packs tasks into the free slots of their users, earliest deadline first.
+
+    Each user's tasks are sorted by effective deadline, then by the priority
+    of their chain, then by position in the chain, and placed one after the
+    other into the first free run that is long enough. The effective
+    deadline of a task is the earliest deadline of it and everything after
+    it in its chain, so steps of a plan keep their order. All users are
+    handled at once: round r places the r-th task of every user with one
+    vectorized search, so the number of rounds is the largest number of
+    tasks of a single user.
+
+    Args:
+        user_index (np.ndarray): Row of `availability` for each task.
+        duration_slots (np.ndarray): Length of each task in slots (>= 1).
+        deadline_slot (np.ndarray): Slot by which each task should be done;
+            use the horizon length for tasks without a deadline.
+        priority (np.ndarray): Priority of each task in [0, 1].
+        chain (np.ndarray): Id of the ordered plan each task belongs to.
+        order (np.ndarray): Position of each task within its chain.
+        availability (np.ndarray): (users, slots) boolean matrix of free
+            slots, see availability_matrix.
+        gap_slots (int): Free slots to leave between consecutive tasks.
+
+    Returns:
+        Allocation: Start slot and lateness of every task, in input order.
+    """
+    count = len(user_index)
+    start_slot = np.full(count, -1, dtype=np.int64)
+    if count == 0:
+        return Allocation(start_slot=start_slot, late=np.zeros(0, dtype=bool))
+
+    deadline_slot = np.asarray(deadline_slot, dtype=np.int64)
+    effective_deadline = _chain_reverse_cummin(deadline_slot, chain, order)
+    chain_ids, chain_of_task = np.unique(chain, return_inverse=True)
+    chain_priority = np.zeros(len(chain_ids))
+    np.maximum.at(chain_priority, chain_of_task, priority)
+
+    placement = np.lexsort(
+        (
+            order,
+            chain,
+            -chain_priority[chain_of_task],
+            effective_deadline,
+            user_index,
+        )
+    )
+    users_sorted = user_index[placement]
+    # Rank of each task among the tasks of its user
+    user_first = np.searchsorted(users_sorted, users_sorted, side="left")
+    rank = np.arange(count) - user_first
+    by_rank = np.argsort(rank, kind="stable")
+    round_bounds = np.searchsorted(rank[by_rank], np.arange(rank.max() + 2))
+
+    runs = _free_run_lengths(availability)
+    columns = np.arange(availability.shape[1])
+    cursor = np.zeros(availability.shape[0], dtype=np.int64)
+
+    for r in range(len(round_bounds) - 1):
+        tasks = placement[by_rank[round_bounds[r] : round_bounds[r + 1]]]
+        users = user_index[tasks]
+        durations = duration_slots[tasks]
+        fits = (runs[users] >= durations[:, None]) & (
+            columns[None, :] >= cursor[users][:, None]
+        )
+        placed = fits.any(axis=1)
+        starts = fits.argmax(axis=1)
+
+        tasks, users = tasks[placed], users[placed]
+        starts = starts[placed]
+        start_slot[tasks] = starts
+        cursor[users] = starts + durations[placed] + gap_slots
+
+    late = (start_slot >= 0) & (start_slot + duration_slots > deadline_slot)
+    return Allocation(start_slot=start_slot, late=late)
+
+
+def _earliest(*moments: Optional[datetime]) -> Optional[datetime]:
+    """The earliest of the given moments, in UTC, or None."""
+    present = [as_utc(moment) for moment in moments if moment is not None]
+    return min(present) if present else None
+
+
+def _leaves_with_deadlines(
+    tree: TaskTreeNode, deadline: Optional[datetime] = None
+) -> List[Tuple[TaskTreeNode, Optional[datetime]]]:
+    """
+    Leaves of a tree in plan (depth-first) order, each with the earliest
+    deadline of itself and its ancestors.
+    """
+    leaves = []
+    stack = [(tree, _earliest(deadline, tree.deadline))]
+    while stack:
+        node, deadline = stack.pop()
+        if node.subtasks:
+            for child in reversed(node.subtasks):
+                stack.append((child, _earliest(deadline, child.deadline)))
+        else:
+            leaves.append((node, deadline))
+    return leaves
+
+
+def schedule_task_tree(
+    tree: TaskTreeNode,
+    shedule: UserShedule,
+    start: datetime,
+    deadline: Optional[datetime] = None,
+    horizon: timedelta = DEFAULT_HORIZON,
+    gap: timedelta = timedelta(0),
+) -> int:
+    """
+    Sets `start_time_execution` of the leaves of a decomposed task to free
+    slots of the user's schedule, in plan order and within deadlines where
+    possible. Leaves that do not fit within the horizon are left as is.
+    `deadline` applies to the whole tree on top of the deadlines it carries.
+
+    Returns:
+        int: The number of leaves that were scheduled.
+    """
+    leaves = _leaves_with_deadlines(tree, deadline)
+    availability, first = availability_matrix([shedule], start, horizon)
+    slots = availability.shape[1]
+    utc_first = as_utc(first)
+
+    durations = np.array(
+        [
+            -(-(leaf.estimated_duration or DEFAULT_DURATION) // SLOT)
+            for leaf, _ in leaves
+        ],
+        dtype=np.int64,
+    )
+    deadlines = np.array(
+        [
+            slots if deadline is None else -(-(deadline - utc_first) // SLOT)
+            for _, deadline in leaves
+        ],
+        dtype=np.int64,
+    ).clip(0, slots)
+    allocation = allocate_slots(
+        user_index=np.zeros(len(leaves), dtype=np.int64),
+        duration_slots=np.maximum(durations, 1),
+        deadline_slot=deadlines,
+        priority=np.array([leaf.priority for leaf, _ in leaves]),
+        chain=np.zeros(len(leaves), dtype=np.int64),
+        order=np.arange(len(leaves)),
+        availability=availability,
+        gap_slots=-(-gap // SLOT),
+    )
+
+    for (leaf, _), slot in zip(leaves, allocation.start_slot.tolist()):
+        if slot >= 0:
+            leaf.start_time_execution = first + slot * SLOT
+    return int((allocation.start_slot >= 0).sum())
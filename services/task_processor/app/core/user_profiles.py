@@ -0,0 +1,107 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+from core_lib.models.user import User
+from core_lib.tracing import TracingTransport
+
+from .logging_config import logger
+from .singleflight import SingleFlight
+
+
+@dataclass
+class _CachedProfile:
+    user: User
+    etag: Optional[str]
+    checked_at: float
+
+
+class UserProfileCache:
+    """
+    TTL + LRU cache of user profiles fetched from user_database.
+
+    A profile younger than `ttl` seconds is served without any request. An
+    older one is revalidated with If-None-Match against the user's ETag, so
+    an unchanged profile costs a 304 without a body and an edited one shows
+    up within `ttl` seconds. Concurrent misses for the same user share one
+    request, and a stale profile is served if user_database is unreachable.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        ttl: float = 5.0,
+        max_size: int = 10_000,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._client = client or httpx.AsyncClient(
+            base_url=base_url, transport=TracingTransport()
+        )
+        self._entries: "OrderedDict[int, _CachedProfile]" = OrderedDict()
+        self._in_flight = SingleFlight()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def _store(self, user_id: int, entry: _CachedProfile) -> None:
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, user_id: int) -> Optional[User]:
+        """Returns the profile of a user, or None if the user does not exist."""
+        entry = self._entries.get(user_id)
+        if entry is not None and time.monotonic() - entry.checked_at < self.ttl:
+            self._entries.move_to_end(user_id)
+            return entry.user
+        return await self._in_flight.do(user_id, lambda: self._fetch(user_id))
+
+    async def _fetch(self, user_id: int) -> Optional[User]:
+        entry = self._entries.get(user_id)
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+
+        try:
+            response = await self._client.get(
+                f"/users/{user_id}", headers=headers
+            )
+            if response.status_code == 404:
+                self.invalidate(user_id)
+                return None
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            if entry is None:
+                raise
+            logger.warning(
+                f"Could not revalidate profile of user {user_id}, "
+                f"serving the cached one: {e}"
+            )
+            return entry.user
+
+        now = time.monotonic()
+        if response.status_code == 304 and entry is not None:
+            entry.checked_at = now
+            self._store(user_id, entry)
+            return entry.user
+
+        user = User.model_validate(response.json())
+        self._store(
+            user_id,
+            _CachedProfile(
+                user=user, etag=response.headers.get("ETag"), checked_at=now
+            ),
+        )
+        return user
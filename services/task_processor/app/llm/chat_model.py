@@ -4,36 +4,58 @@ from dotenv import load_dotenv
 from langchain_core.language_models import BaseChatModel
 from langchain_openai import ChatOpenAI
 
+from ..core.config import LLMBackendConfig, settings
+from ..core.logging_config import logger
+from .router import Backend, RoutedChatModel
+
 # Load environment variables from a .env file
 load_dotenv()
 
 
-def get_chat_model() -> BaseChatModel:
-    """
-    Factory function to get an instance of the chat model.
-    This approach allows for easy swapping of models in the future.
-    """
-    # Ensure the API key is set
-    api_key = os.getenv("DEEPSEEK_API_KEY")
-    if not api_key:
-        raise ValueError("DEEPSEEK_API_KEY environment variable not set.")
+def _make_backend(config: LLMBackendConfig) -> Backend | None:
+    """Creates a router backend, or None if its API key is not set."""
+    api_key = config.api_key
+    if config.api_key_env:
+        api_key = os.getenv(config.api_key_env)
+        if not api_key:
+            logger.warning(
+                f"Skipping LLM backend '{config.name}': "
+                f"{config.api_key_env} environment variable not set."
+            )
+            return None
 
-    # Using the standard ChatOpenAI class with OpenRouter's configuration
-    # This is the recommended approach for OpenAI-compatible APIs.
+    # Using the standard ChatOpenAI class for every OpenAI-compatible API
+    # (OpenRouter, DeepSeek, a local Ollama, ...). Retries are left to the
+    # router, which moves on to the next backend instead.
     model = ChatOpenAI(
-        model="deepseek/deepseek-chat:free",
+        model=config.model,
         api_key=api_key,
-        base_url="https://openrouter.ai/api/v1",
-        temperature=0.7,
-        # max_tokens=2048, # Increased token limit for complex JSON output
+        base_url=config.base_url,
+        temperature=config.temperature,
+        timeout=config.timeout,
+        max_retries=0,
     )
+    return Backend(name=config.name, model=model)
 
-    # To switch to a different model (e.g., local one with Ollama):
-    # model = ChatOpenAI(
-    #     model="llama3",
-    #     api_key="ollama", # The key can be anything for Ollama
-    #     base_url="http://localhost:11434/v1",
-    #     temperature=0.7
-    # )
 
-    return model
+def get_chat_model() -> BaseChatModel:
+    """
+    Factory function to get an instance of the chat model.
+    Returns a router over all configured backends, see `LLM_BACKENDS`.
+    """
+    backends = [
+        backend
+        for backend in map(_make_backend, settings.LLM_BACKENDS)
+        if backend is not None
+    ]
+    if not backends:
+        raise ValueError("No LLM backend is configured with an API key.")
+
+    return RoutedChatModel(
+        backends=backends,
+        max_error_rate=settings.LLM_MAX_ERROR_RATE,
+        cooldown=settings.LLM_UNHEALTHY_COOLDOWN,
+        hedge=settings.LLM_HEDGE_ENABLED,
+        hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+        hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+    )
@@ -0,0 +1,243 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+from core_lib.instrumentation import counter, histogram
+from core_lib.tracing import current_span, start_span
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Minimum number of latency samples before a hedge delay is derived
+MIN_HEDGE_SAMPLES = 20
+
+LLM_SECONDS = histogram(
+    "llm_request_duration_seconds",
+    "Latency of chat completions by backend and outcome.",
+    ["backend", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128),
+)
+LLM_TOKENS = counter(
+    "llm_tokens_total",
+    "Tokens used by chat completions by backend and kind (input/output).",
+    ["backend", "kind"],
+)
+
+
+@dataclass
+class BackendStats:
+    """Latency and error statistics of one backend, kept as EWMAs."""
+
+    alpha: float = 0.2
+    window: int = 200
+    latency_ewma: Optional[float] = None
+    error_ewma: float = 0.0
+    last_error_at: Optional[float] = None
+    latencies: deque = field(default_factory=deque)
+
+    def record_success(self, latency: float) -> None:
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += self.alpha * (latency - self.latency_ewma)
+        self.error_ewma *= 1 - self.alpha
+        self.latencies.append(latency)
+        if len(self.latencies) > self.window:
+            self.latencies.popleft()
+
+    def record_error(self) -> None:
+        self.error_ewma += self.alpha * (1 - self.error_ewma)
+        self.last_error_at = time.monotonic()
+
+    def expected_latency(self) -> float:
+        """
+        Latency EWMA inflated by the error EWMA, i.e. the expected time to a
+        successful answer. Unknown backends score 0 so they get probed,
+        unless they have only failed so far.
+        """
+        if self.latency_ewma is None:
+            return 0.0 if self.error_ewma == 0 else float("inf")
+        return self.latency_ewma / max(1.0 - self.error_ewma, 0.05)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Returns the `q` quantile of recent latencies, if enough samples."""
+        if len(self.latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+@dataclass
+class Backend:
+    """One OpenAI-compatible endpoint the router can send requests to."""
+
+    name: str
+    model: BaseChatModel
+    stats: BackendStats = field(default_factory=BackendStats)
+
+    def record_success(self, started: float, message: BaseMessage) -> None:
+        latency = time.perf_counter() - started
+        self.stats.record_success(latency)
+        LLM_SECONDS.labels(self.name, "ok").observe(latency)
+        usage = getattr(message, "usage_metadata", None) or {}
+        span = current_span()
+        for kind in ("input", "output"):
+            tokens = usage.get(f"{kind}_tokens")
+            if tokens is not None:
+                LLM_TOKENS.labels(self.name, kind).inc(tokens)
+                if span is not None:
+                    span.set(**{f"llm.{kind}_tokens": tokens})
+
+    def record_error(self, started: float) -> None:
+        self.stats.record_error()
+        LLM_SECONDS.labels(self.name, "error").observe(
+            time.perf_counter() - started
+        )
+
+
+class RoutedChatModel(BaseChatModel):
+    """
+    Chat model that routes every call to the fastest healthy backend.
+
+    Backends are ranked by their latency EWMA, inflated by their error EWMA;
+    a backend whose error EWMA is above `max_error_rate` is only retried
+    after `cooldown` seconds.
+    When the chosen backend fails, the next one is tried. With `hedge`
+    enabled a second request is fired at the next backend once the first
+    one runs longer than its `hedge_quantile` latency, and the first answer
+    wins.
+    """
+
+    backends: List[Backend]
+    max_error_rate: float = 0.5
+    cooldown: float = 30.0
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_delay: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-chat-model"
+
+    def _is_healthy(self, backend: Backend, now: float) -> bool:
+        stats = backend.stats
+        return (
+            stats.error_ewma <= self.max_error_rate
+            or stats.last_error_at is None
+            or now - stats.last_error_at >= self.cooldown
+        )
+
+    def ranked_backends(self) -> List[Backend]:
+        """
+        Returns the backends, best first: healthy before unhealthy, then by
+        expected latency.
+        """
+        now = time.monotonic()
+        return sorted(
+            self.backends,
+            key=lambda b: (
+                not self._is_healthy(b, now),
+                b.stats.expected_latency(),
+            ),
+        )
+
+    def _hedge_delay(self, backend: Backend) -> Optional[float]:
+        if not self.hedge:
+            return None
+        delay = backend.stats.quantile(self.hedge_quantile)
+        if delay is None:
+            return None
+        return max(delay, self.hedge_min_delay)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        error = None
+        for backend in self.ranked_backends():
+            started = time.perf_counter()
+            try:
+                with start_span(f"llm {backend.name}", require_parent=True):
+                    message = backend.model.invoke(
+                        messages, stop=stop, **kwargs
+                    )
+                    backend.record_success(started, message)
+            except Exception as e:
+                backend.record_error(started)
+                error = e
+                continue
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        raise error
+
+    async def _call(
+        self,
+        backend: Backend,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        **kwargs: Any,
+    ) -> BaseMessage:
+        started = time.perf_counter()
+        with start_span(f"llm {backend.name}", require_parent=True):
+            try:
+                message = await backend.model.ainvoke(
+                    messages, stop=stop, **kwargs
+                )
+            except asyncio.CancelledError:
+                # A hedged request lost the race; that says nothing about
+                # health
+                raise
+            except Exception:
+                backend.record_error(started)
+                raise
+            backend.record_success(started, message)
+        return message
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        candidates = iter(self.ranked_backends())
+        first = next(candidates)
+        hedge_delay = self._hedge_delay(first)
+        pending = {
+            asyncio.create_task(self._call(first, messages, stop, **kwargs))
+        }
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                # Hedge only once, either on timeout or on failure
+                hedge_delay = None
+                for task in done:
+                    if task.exception() is None:
+                        message = task.result()
+                        return ChatResult(
+                            generations=[ChatGeneration(message=message)]
+                        )
+                    error = task.exception()
+                if done and pending:
+                    # The hedged request is still running, wait for it
+                    continue
+                backend = next(candidates, None)
+                if backend is not None:
+                    pending.add(
+                        asyncio.create_task(
+                            self._call(backend, messages, stop, **kwargs)
+                        )
+                    )
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
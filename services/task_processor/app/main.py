@@ -1,16 +1,28 @@
+from datetime import datetime, timezone
+from typing import Optional
+
 import httpx
 from fastapi import FastAPI, HTTPException, status
 from pydantic import BaseModel
 
 # Import our core components
-from core_lib.models.task import Task, TaskUpdate
+from core_lib.instrumentation import instrument_app
+from core_lib.tracing import TracingTransport, trace_app
+from core_lib.models.task import Task, TaskTreeNode, TaskWithSubtasks
+from core_lib.models.user import User
+from core_lib.wire import ACCEPT_HEADERS, decode_response
 
+from .core.config import settings
+from .core.context import ContextAssembler
 from .core.logging_config import logger
 from .core.processor import TaskProcessor
+from .core.scheduler import schedule_task_tree
+from .core.singleflight import SingleFlight
+from .core.user_profiles import UserProfileCache
 from .llm.chat_model import get_chat_model
 
 # --- Configuration ---
-DATABASE_SERVICE_URL = "http://localhost:8100"
+DATABASE_SERVICE_URL = settings.DATABASE_SERVICE_URL
 
 
 # --- API Data Models ---
@@ -27,6 +39,8 @@ app = FastAPI(
     description="Decomposes high-level goals into actionable tasks.",
     version="0.1.0",
 )
+instrument_app(app)
+trace_app(app, "task_processor")
 
 # Initialize the processor once at startup
 try:
@@ -36,23 +50,54 @@ except ValueError as e:
     # This will prevent the app from starting if the API key is missing
     raise RuntimeError(f"Configuration error: {e}") from e
 
+# Processing runs that are currently in flight, keyed by task version
+in_flight = SingleFlight()
+
+# Profiles of task owners, used as context for the LLM
+user_profiles = UserProfileCache(
+    base_url=settings.USER_SERVICE_URL,
+    ttl=settings.USER_PROFILE_TTL_SECONDS,
+    max_size=settings.USER_PROFILE_CACHE_SIZE,
+)
+
+# Prompt context of a task, gathered from the other services
+context_assembler = ContextAssembler(
+    profiles=user_profiles, base_url=DATABASE_SERVICE_URL
+)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await context_assembler.aclose()
+    await user_profiles.aclose()
+
+
+async def _load_user(user_id: int) -> Optional[User]:
+    """Loads the owner of a task; decomposition works without it."""
+    try:
+        return await user_profiles.get(user_id)
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not load profile of user {user_id}: {e}")
+        return None
+
 
 @app.post(
     "/tasks/process",
-    response_model=Task,  # We now return the full Task object
+    response_model=TaskWithSubtasks,  # The task with its decomposition
     status_code=status.HTTP_200_OK,  # Changed to OK as it's now synchronous
     summary="Process a high-level goal into a structured task",
 )
 async def process_and_update_task(request: int):
-    logger.info(f"Processing task_id: '{request}'")
+    logger.info("Processing task_id: '%s'", request)
     # Get task
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(transport=TracingTransport()) as client:
         try:
             response = await client.get(
-                f"{DATABASE_SERVICE_URL}/tasks/{request}"
+                f"{DATABASE_SERVICE_URL}/tasks/{request}",
+                headers=ACCEPT_HEADERS,
             )
             response.raise_for_status()
-            task = Task.model_validate(response.json())
+            task = Task.model_validate(decode_response(response))
         except httpx.RequestError as e:
             logger.error(f"Could not connect to database service: {e}")
             raise HTTPException(
@@ -65,30 +110,74 @@ async def process_and_update_task(request: int):
             raise HTTPException(
                 status_code=e.response.status_code, detail=e.response.json()
             )
-        logger.info(f"Get task: {repr(task)}")
+        logger.debug("Get task: %r", task)
+    # Concurrent requests for the same version of a task (double taps,
+    # client retries) share one LLM call and one write
+    return await in_flight.do(
+        (task.id, task.updated_at),
+        lambda: _decompose_and_persist(request, task),
+    )
+
+
+def _schedule(processed_task: TaskTreeNode, task: Task, user: User) -> None:
+    """
+    Places the steps of a decomposed task into the free time of its owner.
+    Scheduling is optional: if it fails, the decomposition is stored as is.
+    """
+    try:
+        scheduled = schedule_task_tree(
+            processed_task,
+            user.shedule,
+            start=datetime.now(timezone.utc),
+            deadline=task.deadline,
+            horizon=settings.SCHEDULE_HORIZON,
+            gap=settings.SCHEDULE_GAP,
+        )
+    except Exception as e:
+        logger.error(
+            "Could not schedule task %s, storing it unscheduled: %s",
+            task.id,
+            e,
+            exc_info=True,
+        )
+        return
+    logger.info("Scheduled %d steps of task %s", scheduled, task.id)
+
+
+async def _decompose_and_persist(task_id: int, task: Task) -> TaskWithSubtasks:
+    """Decomposes a task with the LLM and stores the resulting tree."""
     # Process task in agent
-    logger.info(f"Process task: {repr(task)}")
+    logger.debug("Process task: %r", task)
+    context = await context_assembler.assemble(task)
     try:
-        processed_task = await task_processor.process_task(task=task)
+        processed_task = await task_processor.process_task(
+            task=task, context=context
+        )
     except Exception as e:
         # Handle potential errors from the LLM or parsing
-        print(f"Error processing task: {e}")
+        logger.error("Error processing task %s: %s", task_id, e)
         raise HTTPException(
             status_code=500,
             detail="Failed to process the goal with the language model.",
         )
-    # Update in db
-    # TODO subtasks
-    logger.info(f"Update task {response}")
-    update_data_task = TaskUpdate(**processed_task.model_dump())
-    async with httpx.AsyncClient() as client:
+    # Usually cached by now, see ContextAssembler
+    user = await _load_user(task.user_id)
+    if user is not None and user.shedule is not None:
+        _schedule(processed_task, task, user)
+    # Update in db: the root fields and the whole subtree in one call
+    logger.info("Persist decomposition of task %s", task_id)
+    async with httpx.AsyncClient(transport=TracingTransport()) as client:
         try:
-            response = await client.patch(
-                f"{DATABASE_SERVICE_URL}/tasks/{request}",
-                json=processed_task.model_dump(mode="json"),
+            response = await client.post(
+                f"{DATABASE_SERVICE_URL}/tasks/{task_id}/tree",
+                params={"user_id": task.user_id},
+                json=processed_task.model_dump(mode="json", exclude_unset=True),
+                headers=ACCEPT_HEADERS,
             )
             response.raise_for_status()
-            updated_task = Task.model_validate(response.json())
+            updated_task = TaskWithSubtasks.model_validate(
+                decode_response(response)
+            )
         except httpx.RequestError as e:
             logger.error(f"Could not connect to database service: {e}")
             raise HTTPException(
@@ -101,10 +190,19 @@ async def process_and_update_task(request: int):
             raise HTTPException(
                 status_code=e.response.status_code, detail=e.response.json()
             )
-        logger.info(f"Get task: {repr(task)}")
+        logger.debug("Stored decomposition: %r", updated_task)
     return updated_task
 
 
+@app.get(
+    "/stats/parsing",
+    status_code=status.HTTP_200_OK,
+    summary="How often LLM output was parsed cleanly, repaired or re-asked",
+)
+def parsing_stats():
+    return dict(task_processor.parse_stats)
+
+
 @app.get("/health", status_code=status.HTTP_200_OK, summary="Health Check")
 def health_check():
     return {"status": "ok"}
@@ -0,0 +1,100 @@
+"""
+Benchmark of the slot allocator on a synthetic workload.
+
+Users get one of a few typical weekly patterns with random days off, and
+tasks come in plans of several steps with random durations, priorities and
+deadlines. The time to expand the schedules and the time to place all tasks
+are reported separately.
+
+Usage (from services/task_processor):
+    python -m benchmarks.bench_scheduler --users 10000 --tasks 100000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, time as day_time, timedelta
+
+import numpy as np
+
+from app.core.scheduler import (
+    DEFAULT_HORIZON,
+    allocate_slots,
+    availability_matrix,
+)
+from core_lib.models.user_shedule import SheduleException, UserShedule
+
+PATTERNS = [
+    # Evenings on weekdays, afternoons at the weekend
+    [(d, day_time(18), day_time(22)) for d in range(5)]
+    + [(d, day_time(13), day_time(18)) for d in (5, 6)],
+    # Office hours
+    [(d, day_time(9), day_time(17, 30)) for d in range(5)],
+    # Mornings every day
+    [(d, day_time(7), day_time(11)) for d in range(7)],
+]
+
+
+def _shedules(users: int, start: datetime, rng: random.Random) -> list:
+    patterns = [UserShedule.from_weekly_ranges(ranges) for ranges in PATTERNS]
+    shedules = []
+    for _ in range(users):
+        shedule = rng.choice(patterns).model_copy()
+        day_off = start + timedelta(days=rng.randrange(28))
+        shedule.exceptions = [
+            SheduleException(start=day_off, end=day_off + timedelta(days=1))
+        ]
+        shedules.append(shedule)
+    return shedules
+
+
+def main(users: int, tasks: int, chain_length: int, seed: int) -> None:
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 6, 8, 0)
+    shedules = _shedules(users, start, rng)
+
+    started = time.perf_counter()
+    availability, _ = availability_matrix(shedules, start, DEFAULT_HORIZON)
+    expanded = time.perf_counter() - started
+
+    slots = availability.shape[1]
+    chain = np.arange(tasks) // chain_length
+    deadline = np_rng.integers(slots // 4, slots + 1, size=tasks)
+    deadline[np_rng.random(tasks) < 0.3] = slots
+
+    started = time.perf_counter()
+    allocation = allocate_slots(
+        user_index=np_rng.integers(0, users, size=chain.max() + 1)[chain],
+        duration_slots=np_rng.integers(1, 7, size=tasks),
+        deadline_slot=deadline,
+        priority=np_rng.random(tasks),
+        chain=chain,
+        order=np.arange(tasks) % chain_length,
+        availability=availability,
+    )
+    allocated = time.perf_counter() - started
+
+    placed = allocation.start_slot >= 0
+    print(
+        {
+            "users": users,
+            "tasks": tasks,
+            "horizon_slots": slots,
+            "expand_seconds": round(expanded, 3),
+            "allocate_seconds": round(allocated, 3),
+            "tasks_per_second": round(tasks / allocated),
+            "placed": int(placed.sum()),
+            "late": int(allocation.late.sum()),
+        }
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--chain-length", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args.users, args.tasks, args.chain_length, args.seed)
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import httpx
+
+from core_lib.models.task import Task
+
+from app.core.context import ContextAssembler
+from app.core.user_profiles import UserProfileCache
+
+# As GET /users/{id} of user_database returns it
+USER = {
+    "email": "alice@example.com",
+    "username": "alice",
+    "description_for_llm": "Night owl, learns guitar",
+    "shedule": None,
+    "tg_username": None,
+    "tg_chat_id": None,
+    "id": 1,
+    "created_at": "2025-06-29T14:21:21.832893",
+    "updated_at": "2025-06-29T14:21:21.832898",
+}
+
+TASK = Task(
+    id=3,
+    user_id=1,
+    parent_id=2,
+    title="Rent a van",
+    created_at="2025-06-29T14:21:21",
+    updated_at="2025-06-29T14:21:21",
+)
+
+
+def task(id: int, title: str, **fields) -> dict:
+    return {
+        "id": id,
+        "user_id": 1,
+        "title": title,
+        "created_at": "2025-06-29T14:21:21",
+        "updated_at": "2025-06-29T14:21:21",
+        **fields,
+    }
+
+
+def make_assembler(
+    delays: dict = None, failing: str = "", user: dict = USER
+) -> ContextAssembler:
+    """
+    Creates an assembler backed by stub services, where `user` is the
+    profile of every user. Requests whose path contains a key of `delays`
+    are answered that many seconds late, those containing `failing` with an
+    error.
+    """
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        for part, delay in (delays or {}).items():
+            if part in path:
+                await asyncio.sleep(delay)
+        if failing and failing in path:
+            return httpx.Response(500)
+        if path.startswith("/users/"):
+            return httpx.Response(200, json=user)
+        if path.endswith("/ancestors"):
+            return httpx.Response(
+                200, json=[task(1, "Move out"), task(2, "Transport")]
+            )
+        return httpx.Response(
+            200,
+            json=[
+                task(3, "Rent a van"),
+                task(
+                    7, "Rent a car", status="completed", estimated_duration=1800
+                ),
+                task(8, "Book movers"),
+            ],
+        )
+
+    transport = httpx.MockTransport(handler)
+    profiles = UserProfileCache(
+        base_url="http://users",
+        client=httpx.AsyncClient(transport=transport, base_url="http://users"),
+    )
+    return ContextAssembler(
+        profiles,
+        base_url="http://tasks",
+        deadline=0.2,
+        client=httpx.AsyncClient(transport=transport, base_url="http://tasks"),
+    )
+
+
+def test_context_has_every_source_in_order_of_importance():
+    """Tests the sections built from the profile, parents and similar tasks."""
+    context = asyncio.run(make_assembler().assemble(TASK))
+
+    assert context == {
+        "about the user": "Night owl, learns guitar",
+        "parent tasks": "Move out > Transport",
+        "similar tasks": "- Rent a car (completed, 30 min)\n"
+        "- Book movers (pending)",
+    }
+
+
+def test_sources_that_miss_the_deadline_are_dropped():
+    """Tests that a slow source costs no more than the deadline."""
+    assembler = make_assembler(delays={"search_similar": 5, "ancestors": 0.1})
+
+    started = time.monotonic()
+    context = asyncio.run(assembler.assemble(TASK))
+    elapsed = time.monotonic() - started
+
+    assert list(context) == ["about the user", "parent tasks"]
+    assert elapsed < 1
+
+
+def test_failing_source_is_dropped():
+    """Tests that an error of one service does not fail the context."""
+    context = asyncio.run(make_assembler(failing="/users/").assemble(TASK))
+
+    assert list(context) == ["parent tasks", "similar tasks"]
+
+
+def test_user_without_description_is_left_out():
+    """Tests that an empty profile adds no section."""
+    assembler = make_assembler(user={**USER, "description_for_llm": None})
+    context = asyncio.run(assembler.assemble(TASK))
+
+    assert list(context) == ["parent tasks", "similar tasks"]
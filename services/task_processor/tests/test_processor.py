@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.core.processor import TaskProcessor
+from app.core.repair import OutputRepairError
+
+CLEAN = '{"title": "Learn guitar", "subtasks": [{"title": "Buy strings"}]}'
+MALFORMED = "{'title': 'Learn guitar', 'priority': 7,}"
+BROKEN = "Sure! Here is the plan: learn guitar."
+
+
+def process(*responses: str):
+    """Processes a goal with a model that gives `responses` in order."""
+    processor = TaskProcessor(FakeListChatModel(responses=list(responses)))
+    try:
+        return asyncio.run(processor.process_goal("Learn guitar")), processor
+    except OutputRepairError:
+        return None, processor
+
+
+@pytest.mark.parametrize(
+    "responses, outcome",
+    [
+        ([CLEAN], "clean"),
+        ([MALFORMED], "repaired"),
+        ([BROKEN, CLEAN], "reasked"),
+        ([BROKEN, BROKEN], "failed"),
+    ],
+)
+def test_output_is_parsed_on_the_cheapest_path(responses, outcome):
+    """Tests when the model is asked again, and only then."""
+    tree, processor = process(*responses)
+
+    assert dict(processor.parse_stats) == {outcome: 1}
+    assert (tree is None) == (outcome == "failed")
+    if tree is not None:
+        assert tree.title == "Learn guitar"
+
+
+def test_repaired_output_keeps_the_coerced_values():
+    """Tests that a locally repaired response needs no second call."""
+    tree, _ = process(MALFORMED)
+
+    assert tree.priority == 0.7
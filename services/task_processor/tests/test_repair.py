@@ -0,0 +1,56 @@
+import pytest
+
+from app.core.repair import OutputRepairError, repair_output
+
+
+def test_repair_extracts_json_from_markdown_fence():
+    """Tests that JSON wrapped in prose and a markdown fence is extracted."""
+    output = (
+        'Here is your plan:\n```json\n{"title": "Learn guitar"}\n```\nEnjoy!'
+    )
+    node = repair_output(output)
+
+    assert node.title == "Learn guitar"
+
+
+def test_repair_fixes_trailing_commas_and_quotes():
+    """Tests that trailing commas, single quotes and literals are accepted."""
+    output = "{'title': 'Learn guitar', 'subtasks': [{'title': 'Buy strings',},], 'tags': null,}"
+    node = repair_output(output)
+
+    assert node.subtasks[0].title == "Buy strings"
+
+
+def test_repair_coerces_out_of_range_scores():
+    """Tests that percentages and out-of-range scores are coerced to [0, 1]."""
+    output = '{"title": "Learn guitar", "complexity": 80, "priority": 7, "minutes": "30 min"}'
+    node = repair_output(output)
+
+    assert node.complexity == 0.8
+    assert node.priority == 0.7
+    assert node.minutes == 30
+
+
+def test_repair_fails_without_json():
+    """Tests that a response without any JSON object can not be repaired."""
+    with pytest.raises(OutputRepairError):
+        repair_output("Sorry, I can not help with that.")
+
+
+def test_repair_keeps_quotes_and_literals_inside_strings():
+    """Tests that smart quotes and true/null in text are left as they are."""
+    quoted = repair_output('{"title": "Read “War and Peace”"}')
+    literal = repair_output("{'title': 'Decide: true or null?',}")
+
+    assert quoted.title == "Read “War and Peace”"
+    assert literal.title == "Decide: true or null?"
+
+
+def test_repair_fails_on_scores_that_are_not_numbers():
+    """Tests that a word, list or object as a score is a repair error."""
+    with pytest.raises(OutputRepairError):
+        repair_output('{"title": "Learn guitar", "priority": "high"}')
+    with pytest.raises(OutputRepairError):
+        repair_output('{"title": "Learn guitar", "priority": [1]}')
+    with pytest.raises(OutputRepairError):
+        repair_output('{"title": "Learn guitar", "minutes": {"min": 30}}')
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_openai import ChatOpenAI
+
+from app.llm.router import Backend, RoutedChatModel
+
+
+def start_stub_server(content: str, delay: float = 0.0, status: int = 200):
+    """Starts a local OpenAI-compatible chat endpoint in a thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(delay)
+            body = json.dumps(
+                {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": "stub",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": content,
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 1,
+                        "completion_tokens": 1,
+                        "total_tokens": 2,
+                    },
+                }
+            ).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_backend(name: str, server) -> Backend:
+    model = ChatOpenAI(
+        model="stub",
+        api_key="stub",
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        max_retries=0,
+    )
+    return Backend(name=name, model=model)
+
+
+@pytest.fixture
+def servers():
+    started = {}
+
+    def start(name, **kwargs):
+        started[name] = start_stub_server(content=name, **kwargs)
+        return started[name]
+
+    yield start
+    for server in started.values():
+        server.shutdown()
+
+
+def test_router_falls_back_when_backend_fails(servers):
+    """Tests that a failing backend is skipped and its error is recorded."""
+    broken = make_backend("broken", servers("broken", status=500))
+    healthy = make_backend("healthy", servers("healthy"))
+    router = RoutedChatModel(backends=[broken, healthy])
+
+    message = asyncio.run(router.ainvoke("hello"))
+
+    assert message.content == "healthy"
+    assert broken.stats.error_ewma > 0
+    assert router.ranked_backends()[0] is healthy
+
+
+def test_router_prefers_fastest_backend(servers):
+    """Tests that the backend with the lowest latency EWMA is used first."""
+    slow = make_backend("slow", servers("slow"))
+    fast = make_backend("fast", servers("fast"))
+    slow.stats.record_success(2.0)
+    fast.stats.record_success(0.1)
+    router = RoutedChatModel(backends=[slow, fast])
+
+    message = asyncio.run(router.ainvoke("hello"))
+
+    assert message.content == "fast"
+
+
+def test_router_hedges_slow_request(servers):
+    """Tests that a hedged request to the next backend wins over a slow one."""
+    primary = make_backend("primary", servers("primary", delay=2.0))
+    secondary = make_backend("secondary", servers("secondary"))
+    for _ in range(20):
+        primary.stats.record_success(0.05)
+    secondary.stats.record_success(0.5)
+    router = RoutedChatModel(
+        backends=[primary, secondary], hedge=True, hedge_min_delay=0.1
+    )
+
+    started = time.perf_counter()
+    message = asyncio.run(router.ainvoke("hello"))
+
+    assert message.content == "secondary"
+    assert time.perf_counter() - started < 1.5
@@ -0,0 +1,106 @@
+from datetime import datetime, time, timedelta, timezone
+
+import numpy as np
+
+from app.core.scheduler import allocate_slots, schedule_task_tree
+from core_lib.models.task import TaskTreeNode
+from core_lib.models.user_shedule import SheduleException, UserShedule
+
+
+def _allocate(availability, **tasks):
+    count = len(tasks["duration_slots"])
+    defaults = {
+        "user_index": np.zeros(count, dtype=np.int64),
+        "deadline_slot": np.full(count, availability.shape[1]),
+        "priority": np.zeros(count),
+        "chain": np.arange(count),
+        "order": np.zeros(count, dtype=np.int64),
+    }
+    defaults.update({k: np.asarray(v) for k, v in tasks.items()})
+    return allocate_slots(availability=availability, **defaults)
+
+
+def test_tasks_fill_free_runs_in_deadline_order():
+    """Tests that tasks go into long enough free runs, earliest deadline first."""
+    availability = np.array([[1, 0, 1, 1, 0, 1, 1, 1]], dtype=bool)
+
+    allocation = _allocate(
+        availability, duration_slots=[2, 1, 3], deadline_slot=[8, 2, 8]
+    )
+
+    assert allocation.start_slot.tolist() == [2, 0, 5]
+    assert not allocation.late.any()
+
+
+def test_chain_keeps_its_order_and_flags_late_tasks():
+    """Tests that a later step's deadline pulls earlier steps forward."""
+    availability = np.ones((2, 6), dtype=bool)
+
+    allocation = _allocate(
+        availability,
+        user_index=[0, 0, 0, 1],
+        duration_slots=[2, 2, 2, 7],
+        deadline_slot=[6, 3, 6, 6],
+        chain=[1, 1, 2, 3],
+        order=[0, 1, 0, 0],
+    )
+
+    # Task 0 comes before task 1 in its chain, which is due at slot 3
+    assert allocation.start_slot.tolist() == [0, 2, 4, -1]
+    assert allocation.late.tolist() == [False, True, False, False]
+
+
+def test_schedule_task_tree_sets_start_of_leaves():
+    """Tests that the steps of a decomposition land in free evening slots."""
+    shedule = UserShedule.from_weekly_ranges(
+        [(d, time(18), time(20)) for d in range(7)]
+    )
+    tree = TaskTreeNode(
+        title="Write a report",
+        subtasks=[
+            TaskTreeNode(
+                title="Research", estimated_duration=timedelta(hours=1)
+            ),
+            TaskTreeNode(title="Draft", estimated_duration=timedelta(hours=2)),
+        ],
+    )
+
+    scheduled = schedule_task_tree(tree, shedule, start=datetime(2025, 1, 6, 9))
+
+    assert scheduled == 2
+    assert tree.start_time_execution is None
+    assert [t.start_time_execution for t in tree.subtasks] == [
+        datetime(2025, 1, 6, 18),
+        datetime(2025, 1, 7, 18),
+    ]
+
+
+def test_schedule_task_tree_with_aware_deadline_and_exceptions():
+    """Tests a deadline in UTC, as read from the database, with exceptions."""
+    shedule = UserShedule.from_weekly_ranges(
+        [(d, time(18), time(20)) for d in range(7)]
+    )
+    # Busy on the first evening, given as naive datetimes
+    shedule.exceptions.append(
+        SheduleException(
+            start=datetime(2025, 1, 6, 18), end=datetime(2025, 1, 6, 20)
+        )
+    )
+    tree = TaskTreeNode(
+        title="Write a report",
+        subtasks=[
+            TaskTreeNode(
+                title="Research", estimated_duration=timedelta(hours=1)
+            ),
+        ],
+    )
+    start = datetime(2025, 1, 6, 9, tzinfo=timezone.utc)
+
+    scheduled = schedule_task_tree(
+        tree, shedule, start=start, deadline=start + timedelta(days=3)
+    )
+
+    assert scheduled == 1
+    assert tree.subtasks[0].start_time_execution == datetime(
+        2025, 1, 7, 18, tzinfo=timezone.utc
+    )
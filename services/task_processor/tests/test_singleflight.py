@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    """Tests that concurrent calls with the same key run the work once."""
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "decomposed"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(
+            *(flight.do(("task", 1), work) for _ in range(5))
+        )
+        return flight, results
+
+    flight, results = asyncio.run(main())
+
+    assert calls == [1]
+    assert results == ["decomposed"] * 5
+    assert len(flight) == 0
+
+
+def test_errors_are_shared_and_key_is_released():
+    """Tests that all waiters see the error and a later call runs again."""
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("LLM failed")
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(
+            flight.do(1, fail), flight.do(1, fail), return_exceptions=True
+        )
+        with pytest.raises(RuntimeError):
+            await flight.do(1, fail)
+        return results
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
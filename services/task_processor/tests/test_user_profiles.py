@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+
+from app.core.user_profiles import UserProfileCache
+
+USER = {
+    "id": 1,
+    "email": "alice@example.com",
+    "username": "alice",
+    "description_for_llm": "Night owl, learns guitar",
+    "created_at": "2025-06-29T14:21:21",
+    "updated_at": "2025-06-29T14:21:21",
+}
+
+
+def make_cache(requests: list, ttl: float) -> UserProfileCache:
+    """Creates a cache backed by a stub user_database that logs requests."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, json=USER, headers={"ETag": '"v1"'})
+
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), base_url="http://users"
+    )
+    return UserProfileCache(base_url="http://users", ttl=ttl, client=client)
+
+
+def test_fresh_profile_is_served_without_request():
+    """Tests that a profile within its TTL costs no network round trip."""
+    requests = []
+    cache = make_cache(requests, ttl=60)
+
+    async def main():
+        await cache.get(1)
+        return await cache.get(1)
+
+    user = asyncio.run(main())
+
+    assert user.username == "alice"
+    assert len(requests) == 1
+
+
+def test_expired_profile_is_revalidated_with_etag():
+    """Tests that an expired profile is revalidated with If-None-Match."""
+    requests = []
+    cache = make_cache(requests, ttl=0)
+
+    async def main():
+        await cache.get(1)
+        return await cache.get(1)
+
+    user = asyncio.run(main())
+
+    assert user.username == "alice"
+    assert requests[1].headers["If-None-Match"] == '"v1"'
+
+
+def test_least_recently_used_profile_is_evicted():
+    """Tests that the cache does not grow beyond its maximum size."""
+    requests = []
+    cache = make_cache(requests, ttl=60)
+    cache.max_size = 2
+
+    async def main():
+        for user_id in (1, 2, 1, 3):
+            await cache.get(user_id)
+
+    asyncio.run(main())
+
+    assert len(cache) == 2
+    assert 2 not in cache._entries
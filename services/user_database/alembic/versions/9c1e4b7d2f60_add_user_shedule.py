@@ -0,0 +1,33 @@
+"""Add user shedule
+
+Revision ID: 9c1e4b7d2f60
+Revises: 5a0603a3b173
+Create Date: 2025-07-14 18:02:11.431907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1e4b7d2f60'
+down_revision: Union[str, Sequence[str], None] = '5a0603a3b173'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'users',
+        sa.Column(
+            'shedule', postgresql.JSONB(astext_type=sa.Text()), nullable=True
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'shedule')
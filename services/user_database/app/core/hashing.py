@@ -0,0 +1,119 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from core_lib.instrumentation import histogram
+from core_lib.tracing import start_span
+from passlib.context import CryptContext
+
+# Default bcrypt cost factor, overridden by init_hash_pool
+DEFAULT_BCRYPT_ROUNDS = 12
+
+# Includes the wait for a free worker, i.e. what a request experiences
+HASH_SECONDS = histogram(
+    "password_hash_duration_seconds",
+    "Time to hash or verify a password in the process pool.",
+    ["operation"],
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_rounds = DEFAULT_BCRYPT_ROUNDS
+
+
+@lru_cache
+def _crypt_context(rounds: int) -> CryptContext:
+    """
+    Password hashing context (bcrypt) with a fixed cost factor. Hashes made
+    with any other cost are reported as needing an update.
+    """
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+# --- Functions executed in the worker processes ---
+def _hash(password: str, rounds: int) -> str:
+    return _crypt_context(rounds).hash(password)
+
+
+def _verify_and_update(
+    password: str, hashed_password: str, rounds: int
+) -> Tuple[bool, Optional[str]]:
+    return _crypt_context(rounds).verify_and_update(password, hashed_password)
+
+
+# --- Pool management ---
+def init_hash_pool(
+    workers: Optional[int] = None, rounds: int = DEFAULT_BCRYPT_ROUNDS
+) -> None:
+    """
+    Starts the process pool used for hashing. bcrypt is CPU bound and holds
+    the GIL, so it has to run in other processes to keep the event loop
+    responsive. By default the pool is sized to the number of cores.
+
+    Workers are spawned rather than forked: the service runs threads (log
+    listener, span exporter) whose locks a fork could copy while held.
+    """
+    global _pool, _rounds
+    shutdown_hash_pool()
+    _rounds = rounds
+    _pool = ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def shutdown_hash_pool() -> None:
+    """Stops the hashing process pool, if it was started."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    if _pool is None:
+        init_hash_pool(rounds=_rounds)
+    return _pool
+
+
+# --- Async API ---
+async def hash_password(password: str) -> str:
+    """Hashes a plain text password using bcrypt, off the event loop."""
+    loop = asyncio.get_running_loop()
+    with (
+        HASH_SECONDS.labels("hash").time(),
+        start_span("bcrypt hash", require_parent=True, rounds=_rounds),
+    ):
+        return await loop.run_in_executor(_get_pool(), _hash, password, _rounds)
+
+
+async def verify_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verifies a plain text password against a hashed one, off the event loop.
+
+    Returns:
+        Tuple[bool, Optional[str]]: Whether the password matches, and a new
+        hash to store if the stored one was made with a different cost.
+    """
+    loop = asyncio.get_running_loop()
+    with (
+        HASH_SECONDS.labels("verify").time(),
+        start_span("bcrypt verify", require_parent=True, rounds=_rounds),
+    ):
+        return await loop.run_in_executor(
+            _get_pool(),
+            _verify_and_update,
+            plain_password,
+            hashed_password,
+            _rounds,
+        )
@@ -1,27 +1,59 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
 from core_lib.models.user import (  # Import Pydantic models
     UserCreate,
     UserUpdate,
 )
-from passlib.context import CryptContext  # Required for password hashing
-from sqlalchemy import delete, select
+from core_lib.models.user_shedule import UserShedule
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.hashing import hash_password, verify_password
+
 from .models import User as DBUser  # Import SQLAlchemy model
 
-# Initialize password hashing context (using bcrypt for strong hashing)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Unique indexes of the users table and the field each one protects
+UNIQUE_INDEX_FIELDS = {
+    "ix_users_email": "email",
+    "ix_users_username": "username",
+}
+
+
+class DuplicateUserError(Exception):
+    """Raised when an email or username is already used by another user."""
 
+    def __init__(self, field: str):
+        super().__init__(f"{field} is already taken")
+        self.field = field
 
-def get_password_hash(password: str) -> str:
-    """Hashes a plain text password using bcrypt."""
-    return pwd_context.hash(password)
 
+def _duplicate_field(error: IntegrityError) -> str | None:
+    """Returns the field whose unique index was violated, if any."""
+    message = str(error.orig)
+    for index_name, field in UNIQUE_INDEX_FIELDS.items():
+        if index_name in message:
+            return field
+    return None
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifies a plain text password against a hashed one."""
-    return pwd_context.verify(plain_password, hashed_password)
+
+async def _execute_returning_user(session: AsyncSession, stmt) -> DBUser | None:
+    """
+    Executes an INSERT/UPDATE ... RETURNING statement for a user and commits.
+    Unique index violations are raised as DuplicateUserError.
+    """
+    try:
+        result = await session.execute(stmt)
+        db_user = result.scalars().first()
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        field = _duplicate_field(e)
+        if field is None:
+            raise
+        raise DuplicateUserError(field) from e
+    return db_user
 
 
 async def create_user_in_db(
@@ -30,20 +62,26 @@ async def create_user_in_db(
     """
     Creates a new user in the database from a Pydantic UserCreate model.
     The password will be hashed before storage.
+    A single INSERT ... RETURNING is issued; the unique indexes detect
+    duplicates, which are raised as DuplicateUserError.
     """
-    hashed_password = get_password_hash(user_in.password)
-    db_user = DBUser(
-        email=user_in.email,
-        username=user_in.username,
-        hashed_password=hashed_password,
-        description=user_in.description_for_llm,
+    hashed_password = await hash_password(user_in.password)
+    stmt = (
+        insert(DBUser)
+        .values(
+            email=user_in.email,
+            username=user_in.username,
+            hashed_password=hashed_password,
+            description=user_in.description_for_llm,
+            shedule=(
+                user_in.shedule.model_dump(mode="json")
+                if user_in.shedule
+                else None
+            ),
+        )
+        .returning(DBUser)
     )
-    session.add(db_user)
-    await session.commit()  # Commit the transaction to save the user
-    await session.refresh(
-        db_user
-    )  # Refresh to get auto-generated fields like ID and timestamps
-    return db_user
+    return await _execute_returning_user(session, stmt)
 
 
 async def get_user_by_id(session: AsyncSession, user_id: int) -> DBUser | None:
@@ -54,6 +92,36 @@ async def get_user_by_id(session: AsyncSession, user_id: int) -> DBUser | None:
     return result.scalars().first()
 
 
+async def get_user_updated_at(
+    session: AsyncSession, user_id: int
+) -> datetime | None:
+    """
+    Fetches only the last update time of a user, which serves as its version.
+    """
+    result = await session.execute(
+        select(DBUser.updated_at).filter(DBUser.id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_user_shedule(
+    session: AsyncSession, user_id: int
+) -> tuple[bool, UserShedule | None]:
+    """
+    Fetches only the schedule of a user.
+    Returns whether the user exists and the schedule, if it is set.
+    """
+    result = await session.execute(
+        select(DBUser.shedule).filter(DBUser.id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        return False, None
+    if row.shedule is None:
+        return True, None
+    return True, UserShedule.model_validate(row.shedule)
+
+
 async def get_user_by_email(session: AsyncSession, email: str) -> DBUser | None:
     """
     Fetches a single user by their email address.
@@ -74,22 +142,74 @@ async def get_user_by_username(
     return result.scalars().first()
 
 
+async def authenticate_user(
+    session: AsyncSession, login: str, password: str
+) -> DBUser | None:
+    """
+    Fetches a user by username or email and checks the password.
+    Returns None if the user does not exist or the password is wrong.
+    If the stored hash was made with another cost factor, it is replaced.
+    """
+    result = await session.execute(
+        select(DBUser).filter(
+            or_(DBUser.username == login, DBUser.email == login)
+        )
+    )
+    db_user = result.scalars().first()
+    if db_user is None:
+        return None
+
+    valid, new_hash = await verify_password(password, db_user.hashed_password)
+    if not valid:
+        return None
+    if new_hash is not None:
+        db_user.hashed_password = new_hash
+        await session.commit()
+    return db_user
+
+
 async def get_all_users(
-    session: AsyncSession, skip: int = 0, limit: int = 100
+    session: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+) -> List[DBUser]:
+    """
+    Fetches a list of all users ordered by ID with optional pagination.
+    When `after_id` is given, keyset pagination is used: the page starts
+    right after that ID via the primary key index, so every page costs the
+    same no matter how deep it is. `skip` (OFFSET) is kept for old clients.
+    """
+    stmt = select(DBUser).order_by(DBUser.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(DBUser.id > after_id)
+    else:
+        stmt = stmt.offset(skip)
+    result = await session.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def get_users_by_ids(
+    session: AsyncSession, user_ids: List[int]
 ) -> List[DBUser]:
     """
-    Fetches a list of all users with optional pagination.
+    Fetches many users by their IDs in one indexed query.
+    Unknown IDs are skipped; the result is ordered by ID.
     """
-    result = await session.execute(select(DBUser).offset(skip).limit(limit))
+    result = await session.execute(
+        select(DBUser).where(DBUser.id.in_(user_ids)).order_by(DBUser.id)
+    )
     return list(result.scalars().all())
 
 
 async def update_user_in_db(
-    session: AsyncSession, db_user: DBUser, user_update: UserUpdate
-) -> DBUser:
+    session: AsyncSession, user_id: int, user_update: UserUpdate
+) -> DBUser | None:
     """
     Updates an existing user in the database with data from a Pydantic UserUpdate model.
     Only provided fields in user_update will be modified. Password will be re-hashed if provided.
+    A single UPDATE ... RETURNING is issued. Returns None if the user does not exist;
+    a taken email or username is raised as DuplicateUserError.
     """
     update_data = user_update.model_dump(
         exclude_unset=True
@@ -97,24 +217,32 @@ async def update_user_in_db(
 
     # Handle password update: hash if a new password is provided
     if "password" in update_data and update_data["password"] is not None:
-        update_data["hashed_password"] = get_password_hash(
+        update_data["hashed_password"] = await hash_password(
             update_data["password"]
         )
         del update_data[
             "password"
         ]  # Remove the plain password from update_data
 
-    # Apply updates to the SQLAlchemy DBUser object
-    for key, value in update_data.items():
-        if hasattr(db_user, key):  # Ensure the attribute exists on the DB model
-            setattr(db_user, key, value)
+    if update_data.get("shedule") is not None:
+        update_data["shedule"] = user_update.shedule.model_dump(mode="json")
+
+    # Keep only the attributes that exist on the DB model
+    values = {
+        key: value for key, value in update_data.items() if hasattr(DBUser, key)
+    }
+    if not values:
+        return await get_user_by_id(session, user_id)
 
     # SQLAlchemy's onupdate will automatically handle the 'updated_at' timestamp
-    await session.commit()
-    await session.refresh(
-        db_user
-    )  # Refresh to get latest state from DB, including updated_at
-    return db_user
+    stmt = (
+        update(DBUser)
+        .where(DBUser.id == user_id)
+        .values(**values)
+        .returning(DBUser)
+        .execution_options(populate_existing=True)
+    )
+    return await _execute_returning_user(session, stmt)
 
 
 async def delete_user_from_db(session: AsyncSession, user_id: int) -> bool:
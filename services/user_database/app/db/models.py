@@ -3,7 +3,8 @@
 from datetime import datetime
 
 from sqlalchemy import Column, DateTime, Integer, String, Text
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import declarative_base, synonym
 
 # Base class for SQLAlchemy declarative models
 Base = declarative_base()
@@ -30,8 +31,12 @@ class User(Base):
     )
 
     description = Column(Text, nullable=True)
+    # Name of the field in core_lib's User models, for reads and updates
+    description_for_llm = synonym("description")
 
-    # shedule: Optional[UserShedule] = None TODO
+    # Serialized core_lib UserShedule: weekly availability bitmap (hex)
+    # plus exceptions
+    shedule = Column(JSONB, nullable=True)
 
     def __repr__(self):
         return f"<User(id={self.id}, username='{self.username}', email='{self.email}')>"
@@ -1,22 +1,61 @@
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 
+from core_lib.instrumentation import instrument_app
+from core_lib.tracing import trace_app
 from core_lib.models.user import User as PydanticUser
 from core_lib.models.user import UserCreate as PydanticUserCreate
+from core_lib.models.user import UserLogin as PydanticUserLogin
+from core_lib.models.user_shedule import TimeSlot
 from core_lib.models.user import UserUpdate as PydanticUserUpdate
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    status,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .core.config import settings
+from .core.hashing import init_hash_pool, shutdown_hash_pool
 from .core.logging_config import (
     logger,  # Adjust import based on your actual path
 )
 from .db import crud
 from .db.session import get_db_session, init_db
 
+# Maximum number of IDs accepted by the batch lookup
+MAX_BATCH_IDS = 1000
+
+# Longest window accepted by the schedule queries
+MAX_SHEDULE_WINDOW = timedelta(days=366)
+
+# Response details for a taken email or username
+DUPLICATE_USER_DETAILS = {
+    "email": "Email already registered",
+    "username": "Username already taken",
+}
+
+
+def user_etag(user_id: int, updated_at: datetime) -> str:
+    """ETag of a user; it changes whenever the user is updated."""
+    # updated_at is stored as naive UTC; timestamp() would take it for
+    # local time, so the tag would depend on the timezone of the host
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return f'"{user_id}-{int(updated_at.timestamp() * 1_000_000)}"'
+
+
 app = FastAPI(
     title="User Database Service",
     description="Provides a data access API for user-related operations, including authentication.",
     version="0.0.1",
 )
+instrument_app(app)
+trace_app(app, "user_database")
 
 
 @app.on_event("startup")
@@ -29,6 +68,17 @@ async def on_startup():
         init_db()
     )  # Call the init_db function to create tables if they don't exist
     logger.info("User database initialized.")
+    init_hash_pool(
+        workers=settings.PASSWORD_HASH_WORKERS, rounds=settings.BCRYPT_ROUNDS
+    )
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """
+    Stops the password hashing process pool.
+    """
+    shutdown_hash_pool()
 
 
 # --- API Endpoints ---
@@ -42,38 +92,26 @@ async def create_user(
 ):
     """
     Register a new user in the database.
-    Checks for existing email or username before creation.
+    A taken email or username is detected by the insert itself.
     """
-    logger.info(f"Received request to create user: {user.username}")
+    logger.info("Received request to create user: %s", user.username)
 
-    # Check if user with this email already exists
-    db_user_email = await crud.get_user_by_email(session, user.email)
-    if db_user_email:
-        logger.warning(
-            f"User creation failed: Email '{user.email}' already registered."
-        )
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered",
+    try:
+        db_user = await crud.create_user_in_db(session=session, user_in=user)
+        logger.info(
+            "User created successfully with ID: %s, Username: %s",
+            db_user.id,
+            db_user.username,
         )
-
-    # Check if user with this username already exists
-    db_user_username = await crud.get_user_by_username(session, user.username)
-    if db_user_username:
+        return PydanticUser.model_validate(db_user)
+    except crud.DuplicateUserError as e:
         logger.warning(
-            f"User creation failed: Username '{user.username}' already taken."
+            f"User creation failed: {e.field} of '{user.username}' already taken."
         )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already taken",
-        )
-
-    try:
-        db_user = await crud.create_user_in_db(session=session, user_in=user)
-        logger.info(
-            f"User created successfully with ID: {db_user.id}, Username: {db_user.username}"
+            detail=DUPLICATE_USER_DETAILS[e.field],
         )
-        return PydanticUser.model_validate(db_user)
     except Exception as e:
         logger.error(f"Error creating user: {e}", exc_info=True)
         raise HTTPException(
@@ -82,40 +120,174 @@ async def create_user(
         )
 
 
-@app.get("/users/{user_id}", response_model=PydanticUser)
+@app.post("/users/authenticate", response_model=PydanticUser)
+async def authenticate_user(
+    credentials: PydanticUserLogin,
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Check a user's credentials and return the user if they are valid.
+    """
+    db_user = await crud.authenticate_user(
+        session=session,
+        login=credentials.login,
+        password=credentials.password,
+    )
+    if db_user is None:
+        logger.warning(f"Authentication failed for '{credentials.login}'.")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+        )
+    return PydanticUser.model_validate(db_user)
+
+
+@app.get("/users/batch", response_model=List[PydanticUser])
+async def get_users_batch(
+    ids: List[int] = Query(..., description="IDs of the users to fetch"),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve many users by their IDs in one query.
+    Unknown IDs are skipped.
+    """
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IDS} IDs can be requested at once",
+        )
+    logger.debug("Received request to retrieve %d users by ID.", len(ids))
+    db_users = await crud.get_users_by_ids(session=session, user_ids=ids)
+    return [PydanticUser.model_validate(user) for user in db_users]
+
+
+@app.get(
+    "/users/{user_id}",
+    response_model=PydanticUser,
+    responses={304: {"description": "The user did not change"}},
+)
 async def get_user(
-    user_id: int, session: AsyncSession = Depends(get_db_session)
+    user_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_db_session),
 ):
     """
     Retrieve a single user by their ID.
+    The response carries an ETag; a request whose If-None-Match still matches
+    gets an empty 304 after a lookup of the update time only.
     """
-    logger.info(f"Received request to retrieve user with ID: {user_id}")
+    logger.debug("Received request to retrieve user with ID: %s", user_id)
+    if if_none_match is not None:
+        updated_at = await crud.get_user_updated_at(
+            session=session, user_id=user_id
+        )
+        if updated_at is not None:
+            etag = user_etag(user_id, updated_at)
+            if etag == if_none_match:
+                return Response(
+                    status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={"ETag": etag},
+                )
+
     db_user = await crud.get_user_by_id(session=session, user_id=user_id)
     if db_user is None:
         logger.warning(f"User with ID {user_id} not found.")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-    logger.info(
-        f"Successfully retrieved user with ID: {user_id}, Username: {db_user.username}"
+    logger.debug(
+        "Successfully retrieved user with ID: %s, Username: %s",
+        user_id,
+        db_user.username,
     )
+    response.headers["ETag"] = user_etag(user_id, db_user.updated_at)
     return PydanticUser.model_validate(db_user)
 
 
+async def _load_shedule(session: AsyncSession, user_id: int):
+    exists, shedule = await crud.get_user_shedule(
+        session=session, user_id=user_id
+    )
+    if not exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+    return shedule
+
+
+@app.get("/users/{user_id}/free-slots", response_model=List[TimeSlot])
+async def get_user_free_slots(
+    user_id: int,
+    start: datetime,
+    end: datetime,
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve the free intervals of a user between `start` and `end`.
+    A user without a schedule has no free time.
+    """
+    if not timedelta(0) <= end - start <= MAX_SHEDULE_WINDOW:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The window must be between 0 and {MAX_SHEDULE_WINDOW}",
+        )
+    shedule = await _load_shedule(session, user_id)
+    if shedule is None:
+        return []
+    return shedule.free_slots(start, end)
+
+
+@app.get("/users/{user_id}/first-free-slot", response_model=Optional[TimeSlot])
+async def get_user_first_free_slot(
+    user_id: int,
+    after: datetime,
+    duration_minutes: int = Query(..., ge=1),
+    horizon_days: int = Query(28, ge=1, le=MAX_SHEDULE_WINDOW.days),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Retrieve the first free interval of `duration_minutes` that starts at or
+    after `after` within `horizon_days`, or null if there is none.
+    """
+    shedule = await _load_shedule(session, user_id)
+    if shedule is None:
+        return None
+    return shedule.first_free_slot(
+        after,
+        timedelta(minutes=duration_minutes),
+        horizon=timedelta(days=horizon_days),
+    )
+
+
 @app.get("/users/", response_model=List[PydanticUser])
 async def get_users(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
+    after_id: Optional[int] = Query(
+        None,
+        description="Return users with an ID greater than this (keyset cursor)",
+    ),
     session: AsyncSession = Depends(get_db_session),
 ):
     """
     Retrieve a list of all users with pagination.
+    Prefer `after_id` over `skip`: pass the `X-Next-Cursor` header of a page
+    as `after_id` to get the next one.
     """
-    logger.info(
-        f"Received request to retrieve users (skip: {skip}, limit: {limit})."
+    logger.debug(
+        "Received request to retrieve users (skip: %s, after_id: %s, limit: %s).",
+        skip,
+        after_id,
+        limit,
+    )
+    db_users = await crud.get_all_users(
+        session=session, skip=skip, limit=limit, after_id=after_id
     )
-    db_users = await crud.get_all_users(session=session, skip=skip, limit=limit)
-    logger.info(f"Retrieved {len(db_users)} users.")
+    logger.debug("Retrieved %d users.", len(db_users))
+    if len(db_users) == limit:
+        response.headers["X-Next-Cursor"] = str(db_users[-1].id)
     return [PydanticUser.model_validate(user) for user in db_users]
 
 
@@ -129,50 +301,20 @@ async def update_user(
     Update an existing user by their ID.
     Only provided fields will be updated. Password will be re-hashed if updated.
     """
-    logger.info(f"Received request to update user with ID: {user_id}")
-
-    db_user = await crud.get_user_by_id(session=session, user_id=user_id)
-    if db_user is None:
-        logger.warning(
-            f"Attempted to update non-existent user with ID: {user_id}"
-        )
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
-
-    # Check for email/username conflicts if they are being updated
-    if user_update.email and user_update.email != db_user.email:
-        existing_user = await crud.get_user_by_email(session, user_update.email)
-        if existing_user and existing_user.id != user_id:
-            logger.warning(
-                f"Update failed: Email '{user_update.email}' already registered by another user."
-            )
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered",
-            )
-
-    if user_update.username and user_update.username != db_user.username:
-        existing_user = await crud.get_user_by_username(
-            session, user_update.username
-        )
-        if existing_user and existing_user.id != user_id:
-            logger.warning(
-                f"Update failed: Username '{user_update.username}' already taken by another user."
-            )
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already taken",
-            )
+    logger.info("Received request to update user with ID: %s", user_id)
 
     try:
         updated_user = await crud.update_user_in_db(
-            session=session, db_user=db_user, user_update=user_update
+            session=session, user_id=user_id, user_update=user_update
         )
-        logger.info(
-            f"User with ID: {user_id} updated successfully. Username: {updated_user.username}"
+    except crud.DuplicateUserError as e:
+        logger.warning(
+            f"Update failed: {e.field} already taken by another user."
+        )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=DUPLICATE_USER_DETAILS[e.field],
         )
-        return PydanticUser.model_validate(updated_user)
     except Exception as e:
         logger.error(
             f"Error updating user with ID {user_id}: {e}", exc_info=True
@@ -182,6 +324,20 @@ async def update_user(
             detail="Failed to update user.",
         )
 
+    if updated_user is None:
+        logger.warning(
+            f"Attempted to update non-existent user with ID: {user_id}"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+    logger.info(
+        "User with ID: %s updated successfully. Username: %s",
+        user_id,
+        updated_user.username,
+    )
+    return PydanticUser.model_validate(updated_user)
+
 
 @app.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
@@ -191,7 +347,7 @@ async def delete_user(
     Delete a user by their ID.
     Returns 204 No Content on successful deletion.
     """
-    logger.info(f"Received request to delete user with ID: {user_id}")
+    logger.info("Received request to delete user with ID: %s", user_id)
     try:
         success = await crud.delete_user_from_db(
             session=session, user_id=user_id
@@ -203,7 +359,7 @@ async def delete_user(
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
             )
-        logger.info(f"User with ID: {user_id} deleted successfully.")
+        logger.info("User with ID: %s deleted successfully.", user_id)
         return {}  # Return empty dict for 204 No Content
     except Exception as e:
         logger.error(
@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core_lib.models.user import UserCreate
+
+from app.core import hashing
+from app.db import crud
+from app.db.models import User as DBUser
+from app.db.session import get_db_session
+from app.main import app
+
+SCHEMA = "test_hashing"
+
+# Cheapest bcrypt costs, to keep the tests fast
+OLD_ROUNDS = 4
+NEW_ROUNDS = 5
+
+
+def _cost(hashed_password: str) -> int:
+    return int(hashed_password.split("$")[2])
+
+
+def test_hash_with_another_cost_is_rehashed():
+    """Tests that verify_password returns a new hash for an old cost."""
+
+    async def main():
+        hashing.init_hash_pool(workers=1, rounds=OLD_ROUNDS)
+        old = await hashing.hash_password("correct horse")
+        hashing.init_hash_pool(workers=1, rounds=NEW_ROUNDS)
+        current = await hashing.hash_password("correct horse")
+        return (
+            await hashing.verify_password("correct horse", old),
+            await hashing.verify_password("correct horse", current),
+            await hashing.verify_password("wrong horse", old),
+        )
+
+    try:
+        rehashed, current, wrong = asyncio.run(main())
+    finally:
+        hashing.shutdown_hash_pool()
+
+    valid, new_hash = rehashed
+    assert valid and _cost(new_hash) == NEW_ROUNDS
+    assert current == (True, None)
+    assert wrong == (False, None)
+
+
+async def _authenticate(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        async def db_session():
+            async with session_factory() as session:
+                yield session
+
+        hashing.init_hash_pool(workers=1, rounds=OLD_ROUNDS)
+        async with session_factory() as session:
+            await crud.create_user_in_db(
+                session,
+                UserCreate(
+                    email="alice@example.com",
+                    username="alice",
+                    password="correct horse",
+                ),
+            )
+        hashing.init_hash_pool(workers=1, rounds=NEW_ROUNDS)
+
+        app.dependency_overrides[get_db_session] = db_session
+        try:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://users"
+            ) as client:
+                response = await client.post(
+                    "/users/authenticate",
+                    json={"login": "alice", "password": "correct horse"},
+                )
+        finally:
+            app.dependency_overrides.clear()
+        async with session_factory() as session:
+            stored = await session.scalar(select(DBUser.hashed_password))
+    return response, stored
+
+
+def test_authentication_stores_the_rehash(db_schema):
+    """Tests that a login with an old cost replaces the stored hash."""
+    try:
+        response, stored = asyncio.run(_authenticate(db_schema))
+    finally:
+        hashing.shutdown_hash_pool()
+
+    assert response.status_code == 200
+    assert response.json()["username"] == "alice"
+    assert _cost(stored) == NEW_ROUNDS
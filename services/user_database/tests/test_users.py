@@ -0,0 +1,73 @@
+import asyncio
+import time
+from datetime import datetime
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core import hashing
+from app.db.session import get_db_session
+from app.main import app, user_etag
+
+SCHEMA = "test_users"
+
+
+def test_etag_does_not_depend_on_the_local_timezone(monkeypatch):
+    """Tests that naive update times are taken as UTC."""
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        etag = user_etag(1, datetime(2025, 6, 29, 14, 21, 21))
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    # 2025-06-29T14:21:21Z in microseconds
+    assert etag == '"1-1751206881000000"'
+
+
+async def _round_trip(db_schema):
+    async with db_schema(SCHEMA) as engine:
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        async def db_session():
+            async with session_factory() as session:
+                yield session
+
+        hashing.init_hash_pool(workers=1, rounds=4)
+        app.dependency_overrides[get_db_session] = db_session
+        try:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://users"
+            ) as client:
+                created = await client.post(
+                    "/users/",
+                    json={
+                        "email": "alice@example.com",
+                        "username": "alice",
+                        "password": "correct horse",
+                        "description_for_llm": "Night owl",
+                    },
+                )
+                user_id = created.json()["id"]
+                read = await client.get(f"/users/{user_id}")
+                await client.put(
+                    f"/users/{user_id}",
+                    json={"description_for_llm": "Early bird"},
+                )
+                updated = await client.get(f"/users/{user_id}")
+        finally:
+            app.dependency_overrides.clear()
+    return created.json(), read.json(), updated.json()
+
+
+def test_description_for_llm_round_trips(db_schema):
+    """Tests that the description is stored, read back and updated."""
+    try:
+        created, read, updated = asyncio.run(_round_trip(db_schema))
+    finally:
+        hashing.shutdown_hash_pool()
+
+    assert created["description_for_llm"] == "Night owl"
+    assert read["description_for_llm"] == "Night owl"
+    assert updated["description_for_llm"] == "Early bird"